@@ -0,0 +1,57 @@
+"""
+Times matching a saved workspace's windows against live ones after every window id
+has changed, as after a reboot.
+
+$ PYTHONPATH=. python benchmarks/bench_matching.py
+"""
+
+import json
+import random
+import timeit
+
+from bench_parsing import make_windows
+
+from yabai_workspaces.matching import match_windows
+from yabai_workspaces.models import Window
+
+WINDOW_COUNTS = (50, 200, 1000)
+
+
+def make_pair(count: int) -> tuple[list[Window], list[Window]]:
+    """Saved windows, and the same windows relaunched with new ids and some edits."""
+    rng = random.Random(count)
+    saved = json.loads(make_windows(count))
+    live = [
+        {
+            **w,
+            "id": w["id"] + 100_000,
+            "pid": w["pid"] + 1,
+            "title": w["title"] + (" (edited)" if rng.random() < 0.3 else ""),
+        }
+        for w in saved
+    ]
+    rng.shuffle(live)
+    return [Window.model_validate(w) for w in saved], [
+        Window.model_validate(w) for w in live[: int(count * 0.9)]
+    ]
+
+
+def run(number: int = 3) -> dict[int, float]:
+    """Best-of-5 milliseconds per match, by window count."""
+    results: dict[int, float] = {}
+    for count in WINDOW_COUNTS:
+        saved, live = make_pair(count)
+        best = min(
+            timeit.repeat(lambda: match_windows(saved, live), number=number, repeat=5)
+        )
+        results[count] = best / number * 1000
+    return results
+
+
+def main():
+    for count, ms in run().items():
+        print(f"{count:>6} windows {ms:>10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
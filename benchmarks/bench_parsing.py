@@ -0,0 +1,99 @@
+"""
+Compares ways of turning a `query --windows` response into Window models.
+
+$ PYTHONPATH=. python benchmarks/bench_parsing.py
+"""
+
+import json
+import timeit
+
+from yabai_workspaces.models import Frame, Window
+from yabai_workspaces.parsing import parse_many
+
+WINDOW_COUNTS = (50, 200, 1000)
+
+
+def make_windows(count: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "id": 1000 + i,
+                "pid": 500 + i % 20,
+                "app": ("Code", "Google Chrome", "iTerm2", "Slack")[i % 4],
+                "title": f"Window {i} — 日本語のタイトル",
+                "frame": {"x": 0.0, "y": 25.0, "w": 1280.0, "h": 775.0},
+                "role": "AXWindow",
+                "subrole": "AXStandardWindow",
+                "root-window": True,
+                "display": 1,
+                "space": 1 + i % 8,
+                "level": 0,
+                "sub-level": 0,
+                "layer": "normal",
+                "sub-layer": "normal",
+                "opacity": 1.0,
+                "split-type": "vertical",
+                "split-child": "first_child",
+                "stack-index": 0,
+                "can-move": True,
+                "can-resize": True,
+                "has-focus": i == 0,
+                "has-shadow": True,
+                "has-parent-zoom": False,
+                "has-fullscreen-zoom": False,
+                "has-ax-reference": True,
+                "is-native-fullscreen": False,
+                "is-visible": True,
+                "is-minimized": False,
+                "is-hidden": False,
+                "is-floating": False,
+                "is-sticky": False,
+                "is-grabbed": False,
+            }
+            for i in range(count)
+        ],
+        ensure_ascii=False,
+    ).encode()
+
+
+def parse_obj_per_dict(data: bytes) -> list[Window]:
+    # What Yabai.windows() did before parsing.parse_many (parse_obj is an alias)
+    return [Window.model_validate(w) for w in json.loads(data)]
+
+
+def construct_per_dict(data: bytes) -> list[Window]:
+    # Skipping validation looks like it should win, but model_construct runs in
+    # Python and loses to pydantic-core validating the whole response in Rust.
+    return [
+        Window.model_construct(**{**w, "frame": Frame.model_construct(**w["frame"])})
+        for w in json.loads(data)
+    ]
+
+
+CASES = {
+    "json.loads + parse_obj": parse_obj_per_dict,
+    "json.loads + model_construct": construct_per_dict,
+    "TypeAdapter.validate_json": lambda data: parse_many(Window, data),
+}
+
+
+def run(number: int = 20) -> dict[str, dict[int, float]]:
+    """Best-of-5 milliseconds per parse, by case and window count."""
+    results: dict[str, dict[int, float]] = {}
+    for count in WINDOW_COUNTS:
+        data = make_windows(count)
+        for name, parse in CASES.items():
+            best = min(timeit.repeat(lambda: parse(data), number=number, repeat=5))
+            results.setdefault(name, {})[count] = best / number * 1000
+    return results
+
+
+def main():
+    results = run()
+    print(f"{'':28}" + "".join(f"{c:>12} windows" for c in WINDOW_COUNTS))
+    for name, by_count in results.items():
+        print(f"{name:28}" + "".join(f"{by_count[c]:>17.3f}ms" for c in WINDOW_COUNTS))
+
+
+if __name__ == "__main__":
+    main()
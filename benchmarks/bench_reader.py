@@ -0,0 +1,87 @@
+"""
+Compares ways of reading a large `query --windows` response off the yabai socket,
+against a fake yabai that answers with a canned response.
+
+$ PYTHONPATH=. python benchmarks/bench_reader.py
+"""
+
+import asyncio
+import os
+import socket
+import tempfile
+import timeit
+
+from bench_parsing import make_windows
+
+from yabai_workspaces.framing import encode_command
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.yabai import Yabai
+
+WINDOW_COUNTS = (200, 1000, 5000)
+COMMAND = ["query", "--windows"]
+
+
+class Canned:
+    def __init__(self, response: bytes):
+        self.response = response
+
+    def handle(self, args: list[str]) -> bytes:
+        return self.response
+
+
+def recv_and_join(path: str) -> bytes:
+    # What Yabai.using_socket_raw did before framing.ResponseBuffer
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.send(encode_command(COMMAND))
+        sock.shutdown(socket.SHUT_WR)
+        resp = []
+        while len(recv := sock.recv(4096)) > 0:
+            resp.append(recv)
+    return b"".join(resp)
+
+
+async def stream_read_all(path: str) -> bytes:
+    # What Yabai.ausing_socket_raw did before framing.ResponseBuffer
+    reader, writer = await asyncio.open_unix_connection(path=path)
+    writer.write(encode_command(COMMAND))
+    await writer.drain()
+    resp = await reader.read(-1)
+    writer.close()
+    return resp
+
+
+def run(number: int = 20) -> dict[str, dict[int, float]]:
+    """Best-of-5 milliseconds per read, by case and window count."""
+    results: dict[str, dict[int, float]] = {}
+    for count in WINDOW_COUNTS:
+        path = os.path.join(tempfile.mkdtemp(), "yabai-bench.socket")
+        with FakeYabai(path, state=Canned(make_windows(count))):
+            yabai = Yabai(socket_path=path)
+            loop = asyncio.new_event_loop()
+            cases = {
+                "recv(4096) + join": lambda: recv_and_join(path),
+                "ResponseBuffer.recv": lambda: yabai.call_raw(COMMAND),
+                "StreamReader.read(-1)": lambda: loop.run_until_complete(
+                    stream_read_all(path)
+                ),
+                "ResponseBuffer.arecv": lambda: loop.run_until_complete(
+                    yabai.acall_raw(COMMAND)
+                ),
+            }
+            for name, read in cases.items():
+                best = min(timeit.repeat(read, number=number, repeat=5))
+                results.setdefault(name, {})[count] = best / number * 1000
+            loop.close()
+    return results
+
+
+def main():
+    results = run()
+    print(f"{'':24}" + "".join(f"{c:>12} windows" for c in WINDOW_COUNTS))
+    for name, by_count in results.items():
+        print(f"{name:24}" + "".join(f"{by_count[c]:>17.3f}ms" for c in WINDOW_COUNTS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Times the hot paths against a fake yabai daemon, and saves or compares results.
+
+$ PYTHONPATH=. python benchmarks/suite.py --save benchmarks/results/baseline.json
+$ PYTHONPATH=. python benchmarks/suite.py --compare benchmarks/results/baseline.json
+
+Pass --latency to add a delay (in milliseconds) to every fake yabai response, which
+shows how much each path's run time is spent waiting on yabai.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from yabai_workspaces.api.state import to_workspace_display, to_workspace_space
+from yabai_workspaces.layouts.layout_handler import WINDOW_FIELDS, LayoutHandler
+from yabai_workspaces.models import (
+    ColumnsLayout,
+    Layout,
+    Space,
+    StackBesideRowsLayout,
+    Window,
+    Workspace,
+    YabaiManagedLayout,
+)
+from yabai_workspaces.parsing import parse_many
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.workspace_manager import WorkspaceManager
+from yabai_workspaces.yabai import Yabai
+
+# By default a result this much slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.2
+
+LAYOUTS: dict[str, Layout] = {
+    "columns": ColumnsLayout(col_count=3),
+    "stack_beside_rows": StackBesideRowsLayout(
+        app_stack_priority=["Code"], secondary_row_count=2
+    ),
+    "yabai_managed": YabaiManagedLayout(),
+}
+
+
+class Suite:
+    def __init__(self, fake: FakeYabai, repeat: int):
+        self.fake = fake
+        self.repeat = repeat
+        self.yabai = Yabai(socket_path=fake.path)
+        self.results: dict[str, dict[str, float]] = {}
+
+    def time(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        setup: Callable[[], Any] = lambda: None,
+    ) -> None:
+        """Milliseconds per call of fn, with setup run untimed before each call."""
+        samples = []
+        for _ in range(self.repeat):
+            setup()
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        self._record(name, samples)
+
+    def atime(self, name: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        async def run() -> list[float]:
+            samples = []
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                await fn()
+                samples.append((time.perf_counter() - start) * 1000)
+            return samples
+
+        self._record(name, asyncio.run(run()))
+
+    def _record(self, name: str, samples: list[float]) -> None:
+        samples.sort()
+        self.results[name] = {
+            "median_ms": statistics.median(samples),
+            "p95_ms": samples[int(len(samples) * 0.95) - 1],
+            "min_ms": samples[0],
+        }
+        print(f"{name:40} {self.results[name]['median_ms']:>10.3f}ms", file=sys.stderr)
+
+
+def run(suite: Suite) -> None:
+    yabai = suite.yabai
+    noop = ["space", "1", "--balance"]
+
+    suite.time("call (sync)", lambda: yabai.call(noop))
+    suite.atime("call (async)", lambda: yabai.acall(noop))
+    suite.time("call_many x20", lambda: yabai.call_many([noop] * 20))
+
+    raw = yabai.call_raw(["query", "--windows"])
+    suite.time("parse windows", lambda: parse_many(Window, raw))
+    suite.time("query windows (sync)", yabai.windows)
+    suite.atime("query windows (async)", yabai.awindows)
+    suite.time(
+        "query windows (layout fields)", lambda: yabai.windows(fields=WINDOW_FIELDS)
+    )
+
+    # Imported here so main's module-level Yabai() picks up the fake's socket
+    os.environ["YWS_YABAI_SOCKET"] = suite.fake.path
+    from yabai_workspaces.api.main import refresh_workspace
+
+    suite.atime("refresh_workspace", refresh_workspace)
+
+    space = max(yabai.spaces(), key=lambda s: len(s.windows))
+    for name, layout in LAYOUTS.items():
+        # A fresh handler each time, so its cache doesn't turn every run after the
+        # first into a no-op
+        suite.time(
+            f"LayoutHandler.apply {name}",
+            lambda: LayoutHandler(yabai).apply(layout, space),
+        )
+        suite.atime(
+            f"LayoutHandler.aapply {name}",
+            lambda: LayoutHandler(yabai).aapply(layout, space),
+        )
+
+    workspace = Workspace(
+        displays=[to_workspace_display(d) for d in yabai.displays()],
+        spaces=[to_workspace_space(s) for s in yabai.spaces()],
+        windows=yabai.windows(),
+    )
+    manager = WorkspaceManager(yabai)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        suite.time("restore (unchanged)", lambda: manager.restore(workspace))
+        suite.time(
+            "restore (windows shuffled)",
+            lambda: manager.restore(workspace),
+            setup=lambda: shuffle_windows(yabai, workspace.spaces),
+        )
+
+
+def shuffle_windows(yabai: Yabai, spaces: list[Space]) -> None:
+    """Move every window one space along, so restore has to move all of them back."""
+    commands = [
+        ["window", str(w), "--space", str(spaces[(i + 1) % len(spaces)].index)]
+        for i, space in enumerate(spaces)
+        for w in space.windows
+    ]
+    yabai.call_many(commands)
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float = REGRESSION_RATIO,
+) -> bool:
+    """Print each result against the baseline, returning whether any regressed."""
+    regressed = False
+    print(f"{'':40} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:40} {'-':>12} {result['median_ms']:>10.3f}ms")
+            continue
+        before = baseline["results"][name]["median_ms"]
+        ratio = result["median_ms"] / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressed |= bool(flag)
+        print(
+            f"{name:40} {before:>10.3f}ms {result['median_ms']:>10.3f}ms"
+            f" {ratio:>7.2f}x{flag}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--displays", type=int, default=2)
+    parser.add_argument("--spaces", type=int, default=8)
+    parser.add_argument("--windows", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.0, help="Milliseconds")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--save", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_RATIO,
+        help="Slowdown ratio that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "yabai-bench.socket")
+    with FakeYabai(
+        socket_path,
+        displays=args.displays,
+        spaces=args.spaces,
+        windows=args.windows,
+        latency=args.latency / 1000,
+    ) as fake:
+        suite = Suite(fake, args.repeat)
+        run(suite)
+
+    results = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **{
+                k: getattr(args, k)
+                for k in ("displays", "spaces", "windows", "latency", "repeat")
+            },
+        },
+        "results": suite.results,
+    }
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Test data shared across test modules."""
+
+from yabai_workspaces.api.state import to_workspace_display, to_workspace_space
+from yabai_workspaces.models import Display, Space, Window, Workspace
+from yabai_workspaces.parsing import parse_many
+from yabai_workspaces.testing.fake_yabai import FakeYabaiState
+
+
+def fake_workspace(**kwargs) -> Workspace:
+    """A workspace as the server would publish it for FakeYabaiState(**kwargs)."""
+    state = FakeYabaiState(**kwargs)
+    return Workspace(
+        displays=[
+            to_workspace_display(d)
+            for d in parse_many(Display, state.handle(["query", "--displays"]))
+        ],
+        spaces=[
+            to_workspace_space(s)
+            for s in parse_many(Space, state.handle(["query", "--spaces"]))
+        ],
+        windows=parse_many(Window, state.handle(["query", "--windows"])),
+    )
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+
+
+@pytest.fixture(scope="module")
+def fake():
+    with FakeYabai(f"/tmp/yws-test-api-{os.getpid()}.socket", spaces=2, windows=6) as f:
+        yield f
+
+
+@pytest.fixture(scope="module")
+def client(fake):
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("YWS_YABAI_SOCKET", fake.path)
+        # Signals are POSTed by the tests rather than registered with yabai
+        env.setenv("YWS_REGISTER_SIGNALS", "0")
+        env.setenv("YWS_SIGNAL_TRANSPORT", "http")
+        from yabai_workspaces.api.main import app
+
+        with TestClient(app) as client:
+            yield client
+
+
+def test_setting_a_layout_publishes_a_patch(client):
+    seq = int(client.get("/workspace").headers["X-Workspace-Seq"])
+    space_id = client.get("/workspace").json()["spaces"][0]["id"]
+    layout = {"layout_type": "columns", "col_count": 2}
+
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["seq"] == seq
+        response = client.put(f"/spaces/{space_id}/layout", json=layout)
+        assert response.status_code == 200
+        assert response.json()["layout"] == layout
+        # Checked before reading the socket, which would wait forever for a patch
+        response = client.get(f"/workspace?since={seq}")
+        assert response.headers["X-Workspace-Seq"] == str(seq + 1)
+
+        patched = ws.receive_json()
+        assert patched["type"] == "SPACES_PATCHED"
+        assert patched["seq"] == seq + 1
+        (space,) = patched["patch"]["spaces"]["changed"]
+        assert (space["id"], space["layout"]) == (space_id, layout)
+
+    client.put(f"/spaces/{space_id}/layout", json={"layout_type": "no_layout"})
+
+
+def test_setting_a_layout_on_an_unknown_space_is_404(client):
+    layout = {"layout_type": "columns", "col_count": 2}
+    assert client.put("/spaces/999/layout", json=layout).status_code == 404
+
+
+def test_matching_if_none_match_is_304(client):
+    response = client.get("/workspace")
+    etag = response.headers["ETag"]
+
+    response = client.get("/workspace", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    def status(if_none_match: str) -> int:
+        headers = {"If-None-Match": if_none_match}
+        return client.get("/workspace", headers=headers).status_code
+
+    assert status(f'"stale", W/{etag}') == 304
+    assert status("*") == 304
+    assert status('"stale"') == 200
+
+
+def test_long_poll_times_out_with_304_without_querying_yabai(client, fake):
+    seq = client.get("/workspace").headers["X-Workspace-Seq"]
+    fake.log.clear()
+
+    started = time.monotonic()
+    response = client.get(f"/workspace?since={seq}&wait=200")
+    assert response.status_code == 304
+    assert time.monotonic() - started >= 0.2
+    assert fake.log == []
+
+
+def test_long_poll_is_woken_by_an_update(client, fake):
+    seq = int(client.get("/workspace").headers["X-Workspace-Seq"])
+    window_id = None
+
+    def create_window():
+        nonlocal window_id
+        time.sleep(0.1)
+        window_id = fake.state.add_window()["id"]
+        client.post(
+            "/signal",
+            json={"event_name": "window_created", "yabai_window_id": window_id},
+        )
+
+    thread = threading.Thread(target=create_window)
+    thread.start()
+    started = time.monotonic()
+    response = client.get(f"/workspace?since={seq}&wait=5000")
+    thread.join()
+
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5
+    assert int(response.headers["X-Workspace-Seq"]) > seq
+    assert window_id in {w["id"] for w in response.json()["windows"]}
+
+
+def test_signal_stats_count_absorbed_signals(client, fake, monkeypatch):
+    from yabai_workspaces.api.main import coalescer
+
+    # Long enough that every POST lands in the same burst
+    monkeypatch.setattr(coalescer, "window", 0.5)
+    monkeypatch.setattr(coalescer, "max_latency", 0.5)
+    before = client.get("/signal/stats").json()
+    window_id = fake.state.windows[0]["id"]
+    for _ in range(5):
+        client.post(
+            "/signal",
+            json={"event_name": "window_moved", "yabai_window_id": window_id},
+        )
+
+    stats = client.get("/signal/stats").json()
+    assert stats["received"] - before["received"] == 5
+    assert stats["absorbed"] - before["absorbed"] == 4
+    deadline = time.monotonic() + 2
+    while stats["flushes"] == before["flushes"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+        stats = client.get("/signal/stats").json()
+    assert stats["flushes"] - before["flushes"] == 1
+
+
+def test_metrics_are_served_in_exposition_format(client, fake):
+    window_id = fake.state.windows[0]["id"]
+    client.post(
+        "/signal", json={"event_name": "window_focused", "yabai_window_id": window_id}
+    )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    lines = response.text.splitlines()
+    assert "# TYPE yws_signals_total counter" in lines
+    assert any(
+        l.startswith('yws_signals_total{event="window_focused"} ') for l in lines
+    )
+    assert (
+        "# HELP yws_yabai_call_seconds Round trip time of yabai socket commands"
+        in lines
+    )
+    assert "# TYPE yws_yabai_call_seconds histogram" in lines
+
+    def sample(prefix: str) -> float:
+        (line,) = [l for l in lines if l.startswith(prefix)]
+        return float(line.rsplit(" ", 1)[1])
+
+    query = 'verb="query --spaces"'
+    buckets = [
+        l for l in lines if l.startswith(f"yws_yabai_call_seconds_bucket{{{query},")
+    ]
+    counts = [int(l.rsplit(" ", 1)[1]) for l in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1].startswith(
+        f'yws_yabai_call_seconds_bucket{{{query},le="+Inf"}} '
+    )
+    assert counts[-1] == sample(f"yws_yabai_call_seconds_count{{{query}}} ") > 0
+    assert sample(f"yws_yabai_call_seconds_sum{{{query}}} ") > 0
@@ -0,0 +1,68 @@
+import asyncio
+
+from yabai_workspaces.api.coalescer import SignalCoalescer
+from yabai_workspaces.api.yabai_events import (
+    WindowCreated,
+    WindowFocused,
+    WindowMoved,
+)
+
+
+class Recorder:
+    def __init__(self):
+        self.flushes: list[list] = []
+
+    async def __call__(self, signals):
+        self.flushes.append(signals)
+
+
+def test_merges_signals_per_entity_and_event():
+    async def run():
+        recorder = Recorder()
+        coalescer = SignalCoalescer(recorder, window=0.02)
+        for _ in range(30):
+            coalescer.submit(WindowMoved(yabai_window_id=1))
+        coalescer.submit(WindowMoved(yabai_window_id=2))
+        coalescer.submit(WindowFocused(yabai_window_id=1))
+        coalescer.submit(WindowCreated(yabai_window_id=3))
+        coalescer.submit(WindowMoved(yabai_window_id=2))
+        await asyncio.sleep(0.1)
+        return recorder, coalescer.stats
+
+    recorder, stats = asyncio.run(run())
+    assert recorder.flushes == [
+        [
+            WindowMoved(yabai_window_id=1),
+            WindowMoved(yabai_window_id=2),
+            WindowFocused(yabai_window_id=1),
+            WindowCreated(yabai_window_id=3),
+        ]
+    ]
+    assert (stats.received, stats.absorbed, stats.flushes) == (34, 30, 1)
+
+
+def test_continuous_stream_is_flushed_by_max_latency():
+    async def run():
+        recorder = Recorder()
+        coalescer = SignalCoalescer(recorder, window=0.05, max_latency=0.1)
+        # Never quiet for `window`, so only max_latency can flush
+        for _ in range(40):
+            coalescer.submit(WindowMoved(yabai_window_id=1))
+            await asyncio.sleep(0.01)
+        await coalescer.drain()
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert len(recorder.flushes) >= 3
+    assert all(f == [WindowMoved(yabai_window_id=1)] for f in recorder.flushes)
+
+
+def test_drain_flushes_pending_signals():
+    async def run():
+        recorder = Recorder()
+        coalescer = SignalCoalescer(recorder, window=10, max_latency=10)
+        coalescer.submit(WindowCreated(yabai_window_id=1))
+        await coalescer.drain()
+        return recorder
+
+    assert asyncio.run(run()).flushes == [[WindowCreated(yabai_window_id=1)]]
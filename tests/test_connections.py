@@ -0,0 +1,68 @@
+import asyncio
+
+from yabai_workspaces.api.connections import ConnectionManager
+from yabai_workspaces.api.messages import SpacesPatched, SpacesUpdated, Subscribe
+from yabai_workspaces.api.versions import VersionedWorkspace, workspace_hash
+from yabai_workspaces.diff import apply_patch
+from yabai_workspaces.models import Workspace
+
+from .fakes import fake_workspace
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+
+def retitle(workspace: Workspace, index: int, title: str) -> Workspace:
+    windows = list(workspace.windows)
+    windows[index] = windows[index].model_copy(update={"title": title})
+    return workspace.model_copy(update={"windows": windows})
+
+
+def test_skipped_update_is_carried_into_next_patch():
+    async def run():
+        versions = VersionedWorkspace()
+        versions.update(fake_workspace())
+        manager = ConnectionManager(versions)
+
+        def publish(workspace: Workspace, events: frozenset[str]):
+            previous = versions.workspace
+            manager.broadcast(previous, versions.update(workspace), events)
+
+        websocket = FakeWebSocket()
+        client = await manager.connect(websocket)
+        subscription = Subscribe(spaces=frozenset({1}), events=frozenset({"focus"}))
+        manager.subscribe(websocket, subscription)
+        await asyncio.sleep(0)
+        snapshot = SpacesUpdated.model_validate_json(websocket.sent[-1])
+
+        on_space_1 = [
+            i for i, w in enumerate(versions.workspace.windows) if w.space == 1
+        ]
+        # An update the subscription doesn't want, then one it does
+        publish(
+            retitle(versions.workspace, on_space_1[0], "Moved"), frozenset({"move"})
+        )
+        await asyncio.sleep(0)
+        assert len(websocket.sent) == 2
+        publish(
+            retitle(versions.workspace, on_space_1[1], "Focused"), frozenset({"focus"})
+        )
+        await asyncio.sleep(0)
+
+        patched = SpacesPatched.model_validate_json(websocket.sent[-1])
+        assert patched.base_seq == snapshot.seq
+        assert patched.seq == versions.seq == client.seq
+        view = apply_patch(snapshot.content, patched.patch)
+        assert {w.title for w in view.windows} >= {"Moved", "Focused"}
+        assert patched.hash == workspace_hash(view)
+        assert patched.hash == workspace_hash(subscription.filter(versions.workspace))
+
+    asyncio.run(run())
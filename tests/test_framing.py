@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from yabai_workspaces.framing import ResponseBuffer, ResponseTooLarge
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.yabai import Yabai
+
+RESPONSE = json.dumps({"title": "Café — ünïcödé 📋"}, ensure_ascii=False).encode()
+# Inside the two bytes of "é"
+SPLIT = RESPONSE.index("é".encode()) + 1
+
+
+def send_later(sock: socket.socket, *chunks: bytes, close: bool = True) -> None:
+    def send():
+        for chunk in chunks:
+            sock.sendall(chunk)
+            time.sleep(0.02)
+        if close:
+            sock.close()
+
+    threading.Thread(target=send, daemon=True).start()
+
+
+def test_character_split_across_reads_is_reassembled():
+    reader, writer = socket.socketpair()
+    send_later(writer, RESPONSE[:SPLIT], RESPONSE[SPLIT:])
+    # Small enough that the buffer also has to grow mid-character
+    with reader:
+        response = ResponseBuffer(initial_size=SPLIT).recv(reader)
+    assert response == RESPONSE
+    assert json.loads(response)["title"] == "Café — ünïcödé 📋"
+
+
+def test_character_split_across_async_reads_is_reassembled():
+    async def run():
+        reader, writer = socket.socketpair()
+        reader.setblocking(False)
+        send_later(writer, RESPONSE[:SPLIT], RESPONSE[SPLIT:])
+        with reader:
+            return await ResponseBuffer(initial_size=SPLIT).arecv(reader)
+
+    assert asyncio.run(run()) == RESPONSE
+
+
+def test_oversized_response_is_refused():
+    reader, writer = socket.socketpair()
+    send_later(writer, b"x" * 100)
+    with reader, pytest.raises(ResponseTooLarge):
+        ResponseBuffer(initial_size=16, max_size=64).recv(reader)
+
+
+def test_stalled_response_times_out():
+    reader, writer = socket.socketpair()
+    send_later(writer, RESPONSE[:SPLIT], close=False)
+    with reader, writer, pytest.raises(TimeoutError):
+        ResponseBuffer().recv(reader, deadline=time.monotonic() + 0.1)
+
+
+@pytest.fixture
+def fake():
+    with FakeYabai(f"/tmp/yws-test-framing-{os.getpid()}.socket") as fake:
+        yield fake
+
+
+def test_yabai_enforces_size_limit(fake):
+    # The default 20 windows are about 1KB each
+    yabai = Yabai(socket_path=fake.path, max_response_bytes=4096)
+    with pytest.raises(ResponseTooLarge):
+        yabai.call_raw(["query", "--windows"])
+    with pytest.raises(ResponseTooLarge):
+        asyncio.run(yabai.acall_raw(["query", "--windows"]))
+    assert yabai.call_raw(["query", "--displays"]).startswith(b"[")
+
+
+def test_yabai_times_out_on_a_slow_daemon(fake):
+    fake.latency = 0.5
+    yabai = Yabai(socket_path=fake.path, timeout=0.05)
+    with pytest.raises(TimeoutError):
+        yabai.call_raw(["query", "--displays"])
+    with pytest.raises(TimeoutError):
+        asyncio.run(yabai.acall_raw(["query", "--displays"]))
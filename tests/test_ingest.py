@@ -0,0 +1,67 @@
+import asyncio
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from yabai_workspaces.api.ingest import SignalListener, fifo_action, parse_record
+from yabai_workspaces.api.yabai_events import SpaceChanged, WindowMoved
+
+
+@pytest.fixture
+def path():
+    path = f"/tmp/yws-test-ingest-{os.getpid()}.fifo"
+    yield path
+    Path(path).unlink(missing_ok=True)
+
+
+def run_action(action: str, **env: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["/bin/sh", "-c", action], env=env, timeout=5)
+
+
+def test_parse_record():
+    assert parse_record(b"space_changed 3 1\n") == SpaceChanged(
+        yabai_space_id=3, yabai_recent_space_id=1
+    )
+    with pytest.raises(ValueError):
+        parse_record(b"space_changed 3\n")
+    with pytest.raises(KeyError):
+        parse_record(b"window_exploded 3\n")
+
+
+def test_listener_receives_records_from_actions(path):
+    async def run():
+        received = asyncio.Queue()
+        listener = SignalListener(received.put_nowait, path)
+        await listener.start()
+        try:
+            with open(path, "wb", 0) as pipe:
+                pipe.write(b"window_exploded 1\n")
+            for window_id in ("12", "13"):
+                action = fifo_action(WindowMoved, path)
+                await asyncio.to_thread(run_action, action, YABAI_WINDOW_ID=window_id)
+            return [
+                await asyncio.wait_for(received.get(), 1),
+                await asyncio.wait_for(received.get(), 1),
+            ]
+        finally:
+            await listener.close()
+
+    assert asyncio.run(run()) == [
+        WindowMoved(yabai_window_id=12),
+        WindowMoved(yabai_window_id=13),
+    ]
+    assert not Path(path).exists()
+
+
+def test_action_does_not_wait_without_a_listener(path):
+    action = fifo_action(WindowMoved, path)
+    # Left behind by a crashed server, so nothing reads it
+    os.mkfifo(path, 0o600)
+    assert run_action(action, YABAI_WINDOW_ID="12").returncode == 0
+
+    # No server has ever run: nothing is written and no plain file is created
+    os.unlink(path)
+    run_action(action, YABAI_WINDOW_ID="12")
+    assert not Path(path).exists()
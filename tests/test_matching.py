@@ -0,0 +1,61 @@
+from yabai_workspaces.matching import match_windows
+from yabai_workspaces.models import Window
+
+from .fakes import fake_workspace
+
+
+def windows(*titles: str, first_id: int, pid: int) -> list[Window]:
+    base = fake_workspace(windows=len(titles)).windows
+    return [
+        w.model_copy(
+            update={"id": first_id + i, "pid": pid, "app": "Code", "title": title}
+        )
+        for i, (w, title) in enumerate(zip(base, titles))
+    ]
+
+
+def saved(*titles: str) -> list[Window]:
+    return windows(*titles, first_id=100, pid=10)
+
+
+# New ids and a new pid, as after a reboot
+def live(*titles: str) -> list[Window]:
+    return windows(*titles, first_id=200, pid=20)
+
+
+def pairs(result) -> set[tuple[str, str]]:
+    return {(m.saved.title, m.live.title) for m in result.matches}
+
+
+def test_renamed_windows_match_on_shared_title_words():
+    result = match_windows(
+        saved("README.md — yabai-workspaces", "plan.py — yabai-workspaces"),
+        live("plan.py — yabai-workspaces", "● README.md — yabai-workspaces"),
+    )
+    assert pairs(result) == {
+        ("README.md — yabai-workspaces", "● README.md — yabai-workspaces"),
+        ("plan.py — yabai-workspaces", "plan.py — yabai-workspaces"),
+    }
+    assert result.unmatched_saved == result.unmatched_live == []
+
+
+def test_duplicate_titles_are_paired_one_to_one():
+    result = match_windows(
+        saved("Untitled", "Untitled", "notes.txt"),
+        live("Untitled", "notes.txt", "Untitled"),
+    )
+    assert len(result.matches) == 3
+    assert len({m.live.id for m in result.matches}) == 3
+    assert all(m.saved.title == m.live.title for m in result.matches)
+
+
+def test_windows_sharing_only_app_and_role_are_unmatched():
+    (report,) = saved("Quarterly report")
+    (unrelated,) = live("Totally unrelated thing")
+
+    result = match_windows([report], [unrelated])
+
+    assert result.matches == []
+    assert result.unmatched_saved == [report]
+    assert result.unmatched_live == [unrelated]
+    assert "not found: Code 'Quarterly report'" in str(result)
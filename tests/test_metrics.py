@@ -0,0 +1,45 @@
+from yabai_workspaces.api.metrics import Counter, Gauge, Histogram, ServerMetrics
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("yws_things_total", "Things seen", ["name"])
+    counter.inc('a "quoted"\\back\nslash')
+    counter.inc("plain", amount=2)
+    assert counter.render() == [
+        "# HELP yws_things_total Things seen",
+        "# TYPE yws_things_total counter",
+        'yws_things_total{name="a \\"quoted\\"\\\\back\\nslash"} 1.0',
+        'yws_things_total{name="plain"} 2.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("yws_wait_seconds", "Waits", ["kind"], buckets=(1, 0.1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "full")
+    assert histogram.render() == [
+        "# HELP yws_wait_seconds Waits",
+        "# TYPE yws_wait_seconds histogram",
+        'yws_wait_seconds_bucket{kind="full",le="0.1"} 2',
+        'yws_wait_seconds_bucket{kind="full",le="1.0"} 3',
+        'yws_wait_seconds_bucket{kind="full",le="+Inf"} 4',
+        'yws_wait_seconds_sum{kind="full"} 3.65',
+        'yws_wait_seconds_count{kind="full"} 4',
+    ]
+
+
+def test_gauge_is_read_when_rendered():
+    clients = [1, 2]
+    gauge = Gauge("yws_clients", "Clients", lambda: len(clients))
+    clients.append(3)
+    assert gauge.render()[-1] == "yws_clients 3.0"
+
+
+def test_server_metrics_render_every_metric():
+    metrics = ServerMetrics()
+    metrics.call_finished("query", 0.002)
+    text = metrics.render()
+    assert text.endswith("\n")
+    assert 'yws_yabai_call_seconds_bucket{verb="query",le="0.0025"} 1' in text
+    for name in ("yws_signals_total", "yws_payload_bytes", "yws_connected_clients"):
+        assert f"# TYPE {name} " in text
@@ -0,0 +1,112 @@
+import pytest
+
+from yabai_workspaces.layouts.layout_handler import WINDOW_FIELDS
+from yabai_workspaces.layouts.plan import (
+    StepKind,
+    compile_plan,
+    plan_insert,
+    plan_removal,
+)
+from yabai_workspaces.models import (
+    ColumnsLayout,
+    Layout,
+    Space,
+    StackBesideRowsLayout,
+    Window,
+)
+from yabai_workspaces.parsing import partial_model
+
+LayoutWindow = partial_model(Window, WINDOW_FIELDS)
+LayoutSpace = partial_model(Space, ("index", "windows"))
+
+LAYOUTS = [
+    *(ColumnsLayout(col_count=c) for c in (1, 2, 3)),
+    *(
+        StackBesideRowsLayout(app_stack_priority=["Code"], secondary_row_count=r)
+        for r in (1, 2, 3)
+    ),
+]
+
+
+def windows(*apps: str) -> list[Window]:
+    frame = {"x": 0, "y": 0, "w": 1, "h": 1}
+    return [
+        LayoutWindow(id=1000 + i, app=app, frame=frame, stack_index=0)
+        for i, app in enumerate(apps)
+    ]
+
+
+def space(wins: list[Window]) -> Space:
+    return LayoutSpace(index=2, windows={w.id for w in wins})
+
+
+def arrange(layout: Layout, wins: list[Window]) -> list[list[str]]:
+    plan = compile_plan(layout, space(wins), wins)
+    return [s.command for s in plan.steps if s.kind == StepKind.ARRANGE]
+
+
+def balance() -> list[str]:
+    return ["space", "2", "--balance"]
+
+
+# One stacked app window, then only row and overflow windows, so every window
+# after the first can be placed incrementally
+@pytest.mark.parametrize("layout", LAYOUTS, ids=str)
+@pytest.mark.parametrize("count", range(2, 9))
+def test_plan_insert_matches_compiled_plan(layout, count):
+    wins = windows("Code", *["Slack"] * (count - 1))
+    before, after = arrange(layout, wins[:-1]), arrange(layout, wins)
+
+    plan = plan_insert(layout, space(wins), wins, wins[-1].id)
+
+    assert plan is not None
+    commands = [s.command for s in plan.steps]
+    assert [c for c in commands if c != balance()] == [
+        c for c in after if c not in before
+    ]
+
+
+def test_plan_insert_into_overflow_stacks_onto_the_last_row():
+    layout = StackBesideRowsLayout(app_stack_priority=["Code"], secondary_row_count=1)
+    wins = windows("Code", "Slack", "Slack", "Slack")
+    plan = plan_insert(layout, space(wins), wins, wins[-1].id)
+    assert [s.command for s in plan.steps] == [["window", "1002", "--stack", "1003"]]
+
+
+@pytest.mark.parametrize("layout", LAYOUTS, ids=str)
+def test_plan_insert_needs_the_window_to_sort_last(layout):
+    wins = windows("Slack", "Slack", "Slack")
+    assert plan_insert(layout, space(wins), wins, wins[0].id) is None
+
+
+def test_plan_insert_into_the_main_stack_is_not_incremental():
+    layout = StackBesideRowsLayout(app_stack_priority=["Code"], secondary_row_count=2)
+    wins = windows("Slack", "Slack", "Code")
+    assert plan_insert(layout, space(wins), wins, wins[-1].id) is None
+
+
+@pytest.mark.parametrize("col_count", (1, 2, 3))
+def test_plan_removal_columns(col_count):
+    layout = ColumnsLayout(col_count=col_count)
+    wins = windows(*["Slack"] * 4)
+    remaining = space(wins[:-1])
+    plan = plan_removal(layout, remaining, wins[:-1], wins[-1])
+    assert [s.command for s in plan.steps] == [balance()]
+    assert plan_removal(layout, space(wins[1:]), wins[1:], wins[0]) is None
+
+
+@pytest.mark.parametrize(
+    "count, steps",
+    [
+        # Leaving a row changes the other rows' frames
+        (3, [balance()]),
+        # Leaving the overflow stack changes nothing
+        (4, []),
+    ],
+)
+def test_plan_removal_stack_beside_rows(count, steps):
+    layout = StackBesideRowsLayout(app_stack_priority=["Code"], secondary_row_count=2)
+    wins = windows("Code", *["Slack"] * (count - 1))
+    plan = plan_removal(layout, space(wins[:-1]), wins[:-1], wins[-1])
+    assert [s.command for s in plan.steps] == steps
+    assert plan_removal(layout, space(wins[1:]), wins[1:], wins[0]) is None
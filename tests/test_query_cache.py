@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+
+from yabai_workspaces.query_cache import QueryCache
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.yabai import Yabai
+
+
+@pytest.fixture
+def fake():
+    # Unix socket paths are short, so not under pytest's tmp_path
+    with FakeYabai(f"/tmp/yws-test-{os.getpid()}.socket", latency=0.02) as fake:
+        yield fake
+
+
+def queries_sent(fake: FakeYabai) -> list[list[str]]:
+    return [cmd for cmd in fake.log if cmd[0] == "query"]
+
+
+def test_repeated_queries_are_answered_from_memory(fake):
+    queries = QueryCache(Yabai(socket_path=fake.path))
+    assert queries.windows(space_idx=1) == queries.windows(space_idx=1)
+    queries.windows(space_idx=2)
+    assert (queries.hits, queries.misses) == (1, 2)
+    assert len(queries_sent(fake)) == 2
+
+
+def test_commands_drop_only_what_they_may_change(fake):
+    queries = QueryCache(Yabai(socket_path=fake.path))
+    window = queries.windows(space_idx=1)[0]
+    queries.displays()
+    queries.call(["window", str(window.id), "--space", "2"])
+
+    assert window.id in {w.id for w in queries.windows(space_idx=2)}
+    assert window.id not in {w.id for w in queries.windows(space_idx=1)}
+    queries.displays()
+    assert queries.hits == 1
+
+
+def test_concurrent_async_queries_share_one_round_trip(fake):
+    async def run():
+        queries = QueryCache(Yabai(socket_path=fake.path))
+        first, second = await asyncio.gather(
+            queries.awindows(space_idx=1), queries.awindows(space_idx=1)
+        )
+        assert first == second
+        assert len(queries_sent(fake)) == 1
+
+    asyncio.run(run())
+
+
+def test_query_in_flight_during_invalidation_is_not_cached(fake):
+    async def run():
+        queries = QueryCache(Yabai(socket_path=fake.path))
+        in_flight = asyncio.create_task(queries.awindows(space_idx=1))
+        while not fake.log:
+            await asyncio.sleep(0.001)
+        queries.invalidate(frozenset({"windows"}))
+        await in_flight
+
+        await queries.awindows(space_idx=1)
+        assert len(queries_sent(fake)) == 2
+
+    asyncio.run(run())
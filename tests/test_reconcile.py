@@ -0,0 +1,27 @@
+from yabai_workspaces.reconcile import plan_labels, plan_window_moves
+
+from .fakes import fake_workspace
+
+
+def test_spaces_on_disconnected_displays_are_skipped():
+    saved = fake_workspace(displays=2, spaces=4)
+    saved.spaces = [s.model_copy(update={"label": f"s{s.id}"}) for s in saved.spaces]
+    live = fake_workspace(displays=2, spaces=4)
+    # Every live window is on some other space than it was saved on
+    spaces = sorted(s.index for s in live.spaces)
+    live.windows = [
+        w.model_copy(update={"space": spaces[(spaces.index(w.space) + 1) % 4]})
+        for w in live.windows
+    ]
+    on_display_1 = [s for s in saved.spaces if s.display == 1]
+
+    labels, kept = plan_labels(live.spaces, saved, {1})
+    assert kept == 0
+    assert labels == [["space", str(s.index), "--label", s.label] for s in on_display_1]
+
+    id_map = {w.id: w.id for w in saved.windows}
+    moves, kept, missing = plan_window_moves(live.windows, saved, id_map, {1})
+    assert (kept, missing) == (0, 0)
+    assert sorted(int(m[1]) for m in moves) == sorted(
+        w for s in on_display_1 for w in s.windows
+    )
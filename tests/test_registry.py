@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+import pytest
+
+from yabai_workspaces.api.registry import LABEL_PREFIX, SignalRegistry
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.yabai import Yabai
+
+ACTIONS = {
+    "window_created": "echo created",
+    "window_destroyed": "echo destroyed",
+    "space_changed": "echo space",
+}
+
+
+@pytest.fixture
+def fake():
+    with FakeYabai(f"/tmp/yws-test-registry-{os.getpid()}.socket") as fake:
+        yield fake
+
+
+def signal_commands(fake: FakeYabai) -> list[list[str]]:
+    return [c for c in fake.log if c[:2] != ["signal", "--list"]]
+
+
+def labels(fake: FakeYabai) -> dict[str, str]:
+    return {s["label"]: s["action"] for s in fake.state.signals}
+
+
+def test_sync_sends_only_the_difference(fake):
+    registry = SignalRegistry(Yabai(socket_path=fake.path))
+    result = asyncio.run(registry.sync(ACTIONS))
+    assert sorted(result.added) == sorted(registry.label(e) for e in ACTIONS)
+    assert labels(fake) == {registry.label(e): a for e, a in ACTIONS.items()}
+
+    fake.log.clear()
+    changed = {**ACTIONS, "window_created": "echo created again"}
+    result = asyncio.run(registry.sync(changed))
+    label = registry.label("window_created")
+    assert (result.added, result.removed, result.failed) == ([label], [], [])
+    assert sorted(result.unchanged) == sorted(
+        registry.label(e) for e in ("window_destroyed", "space_changed")
+    )
+    assert signal_commands(fake) == [
+        [
+            "signal",
+            "--add",
+            "event=window_created",
+            "action=echo created again",
+            f"label={label}",
+        ]
+    ]
+    assert labels(fake)[label] == "echo created again"
+
+    fake.log.clear()
+    assert asyncio.run(registry.sync(changed)).added == []
+    assert signal_commands(fake) == []
+
+
+def test_sync_removes_stale_signals_and_clear_removes_all(fake):
+    yabai = Yabai(socket_path=fake.path)
+    # Left behind by a crashed server, and one that isn't ours
+    stale = f"{LABEL_PREFIX}application_hidden"
+    yabai.call_raw(
+        ["signal", "--add", "event=application_hidden", "action=true", f"label={stale}"]
+    )
+    yabai.call_raw(
+        ["signal", "--add", "event=window_moved", "action=true", "label=mine"]
+    )
+
+    registry = SignalRegistry(yabai)
+    result = asyncio.run(registry.sync(ACTIONS))
+    assert result.removed == [stale]
+    assert stale not in labels(fake)
+
+    result = asyncio.run(registry.clear())
+    assert sorted(result.removed) == sorted(registry.label(e) for e in ACTIONS)
+    assert labels(fake) == {"mine": "true"}
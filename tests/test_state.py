@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+import pytest
+
+from yabai_workspaces.api.state import WorkspaceState
+from yabai_workspaces.api.yabai_events import WindowCreated
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.yabai import Yabai
+
+
+class HeldYabai(Yabai):
+    """
+    Once hold() is called, the next full windows query is answered as yabai had
+    it when sent, but only handed back once release is set, like a slow fetch
+    that the workspace changes under.
+    """
+
+    held: asyncio.Event | None = None
+
+    def hold(self) -> None:
+        self.held, self.release = asyncio.Event(), asyncio.Event()
+
+    async def awindows(self, *args, **kwargs):
+        windows = await super().awindows(*args, **kwargs)
+        if not (args or kwargs) and self.held and not self.held.is_set():
+            self.held.set()
+            await self.release.wait()
+        return windows
+
+
+@pytest.fixture
+def fake():
+    with FakeYabai(f"/tmp/yws-test-state-{os.getpid()}.socket") as fake:
+        yield fake
+
+
+def test_resync_does_not_reuse_a_fetch_started_before_it(fake):
+    async def run():
+        yabai = HeldYabai(socket_path=fake.path)
+        state = WorkspaceState(yabai)
+        await state.resync()
+
+        yabai.hold()
+        stale = asyncio.create_task(state.current(max_age=0))
+        await yabai.held.wait()
+        window = fake.state.add_window()
+
+        await asyncio.wait_for(state.resync(), 1)
+        assert window["id"] in state.windows
+        yabai.release.set()
+        await stale
+        assert window["id"] in state.windows
+
+    asyncio.run(run())
+
+
+def test_current_does_not_undo_patches_applied_during_its_fetch(fake):
+    async def run():
+        yabai = HeldYabai(socket_path=fake.path)
+        state = WorkspaceState(yabai)
+        await state.resync()
+
+        yabai.hold()
+        stale = asyncio.create_task(state.current(max_age=0))
+        await yabai.held.wait()
+        window = fake.state.add_window()
+        await state.apply_many([WindowCreated(yabai_window_id=window["id"])])
+        assert window["id"] in state.windows
+
+        yabai.release.set()
+        await stale
+        assert window["id"] in state.windows
+        # The next fetch is started after the patch, so it's loaded
+        await state.current(max_age=0)
+        assert state.snapshot_version == state.snapshots.latest.version
+
+    asyncio.run(run())
@@ -0,0 +1,25 @@
+from yabai_workspaces.store import RecordKind, WorkspaceStore
+
+from .fakes import fake_workspace
+
+
+def retitled(n: int):
+    workspace = fake_workspace(windows=4)
+    first, *rest = workspace.windows
+    windows = [first.model_copy(update={"title": f"Snapshot {n}"}), *rest]
+    return workspace.model_copy(update={"windows": windows})
+
+
+def test_reopening_with_a_smaller_keyframe_interval(tmp_path):
+    store = WorkspaceStore(tmp_path, keyframe_interval=10)
+    for n in range(6):
+        store.append(retitled(n), at=n)
+    assert [e.kind for e in store.entries].count(RecordKind.KEYFRAME) == 1
+
+    # The last keyframe is now further back than the interval allows
+    store = WorkspaceStore(tmp_path, keyframe_interval=3)
+    entry = store.append(retitled(6), at=6)
+    assert entry.kind == RecordKind.KEYFRAME
+    entry = store.append(retitled(7), at=7)
+    assert entry.kind == RecordKind.DELTA
+    assert store.load(entry.seq) == retitled(7)
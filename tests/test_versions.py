@@ -0,0 +1,50 @@
+import asyncio
+
+from yabai_workspaces.api.versions import VersionedWorkspace
+from yabai_workspaces.models import Workspace
+
+from .fakes import fake_workspace
+
+
+def test_update_bumps_seq_on_change():
+    versions = VersionedWorkspace()
+    workspace = fake_workspace()
+    assert versions.update(workspace) is not None
+    assert versions.seq == 1
+
+    first, *rest = workspace.windows
+    retitled = first.model_copy(update={"title": "Renamed"})
+    patch = versions.update(workspace.model_copy(update={"windows": [retitled, *rest]}))
+    assert patch is not None and patch.windows.changed == [retitled]
+    assert versions.seq == 2
+
+
+def test_update_ignores_reordering():
+    versions = VersionedWorkspace()
+    workspace = fake_workspace()
+    versions.update(workspace)
+    seq, hash = versions.seq, versions.hash
+
+    reordered = Workspace(
+        displays=workspace.displays,
+        spaces=workspace.spaces[::-1],
+        windows=workspace.windows[::-1],
+    )
+    assert versions.update(reordered) is None
+    assert (versions.seq, versions.hash) == (seq, hash)
+    assert versions.workspace is workspace
+
+
+def test_wait_for_change_is_woken_by_update():
+    async def run():
+        versions = VersionedWorkspace()
+        assert not await versions.wait_for_change(0, timeout=0.01)
+
+        waiter = asyncio.create_task(versions.wait_for_change(0, timeout=5))
+        await asyncio.sleep(0)
+        versions.update(fake_workspace())
+        assert await asyncio.wait_for(waiter, 1)
+        # A since that's already stale returns straight away
+        assert await versions.wait_for_change(0, timeout=5)
+
+    asyncio.run(run())
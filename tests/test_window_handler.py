@@ -0,0 +1,85 @@
+import json
+from typing import List
+
+from yabai_workspaces.layouts.window_handler import (
+    CAPTURE_TABS,
+    RESTORE_TABS,
+    ChromeHandler,
+)
+from yabai_workspaces.models import Window
+
+from .fakes import fake_workspace
+
+
+class FakeRunner:
+    """Stands in for osascript, recording each argv and answering with output."""
+
+    def __init__(self, output: bytes = b""):
+        self.output = output
+        self.calls: List[List[str]] = []
+
+    def __call__(self, args: List[str]) -> bytes:
+        self.calls.append(args)
+        return self.output
+
+
+def windows(*titles: tuple[str, str]) -> list[Window]:
+    base = fake_workspace().windows
+    return [
+        w.model_copy(update={"app": app, "title": title})
+        for w, (app, title) in zip(base, titles)
+    ]
+
+
+def tabs(*urls: str) -> list[dict[str, str]]:
+    return [{"title": url, "url": url} for url in urls]
+
+
+def test_capture_tabs_is_one_script_run_matched_by_title():
+    chrome = [
+        {"title": "Docs", "tabs": tabs("a", "b")},
+        {"title": "Mail", "tabs": tabs("c")},
+        {"title": "Docs", "tabs": tabs("d")},
+    ]
+    run = FakeRunner(json.dumps(chrome).encode())
+    docs1, slack, mail, docs2 = wins = windows(
+        ("Google Chrome", "Docs - Google Chrome - Work"),
+        ("Slack", "general"),
+        ("Google Chrome", "Mail - Google Chrome - Work"),
+        ("Google Chrome", "Docs - Google Chrome - Personal"),
+    )
+
+    saved = ChromeHandler(run).will_save_many(wins)
+
+    assert run.calls == [["osascript", "-l", "JavaScript", "-e", CAPTURE_TABS]]
+    # Same-titled windows are handed out in the order both sides list them
+    assert saved == {
+        docs1.id: {"tabs": tabs("a", "b")},
+        mail.id: {"tabs": tabs("c")},
+        docs2.id: {"tabs": tabs("d")},
+    }
+
+
+def test_capture_tabs_skips_unmatched_and_non_chrome_windows():
+    run = FakeRunner(json.dumps([{"title": "Docs", "tabs": tabs("a")}]).encode())
+    (other,) = windows(("Google Chrome", "Other - Google Chrome - Work"))
+    assert ChromeHandler(run).will_save_many([other]) == {}
+
+    run = FakeRunner()
+    assert ChromeHandler(run).will_save_many(windows(("Slack", "general"))) == {}
+    assert run.calls == []
+
+
+def test_restore_tabs_opens_every_window_in_one_script_run():
+    run = FakeRunner()
+    handler = ChromeHandler(run)
+
+    handler.will_restore_many(
+        [{"tabs": tabs("a", "b")}, {"tabs": []}, {"tabs": tabs("c")}]
+    )
+    assert run.calls == [
+        ["osascript", "-l", "JavaScript", "-e", RESTORE_TABS, '[["a", "b"], ["c"]]']
+    ]
+
+    handler.will_restore_many([{"tabs": []}])
+    assert len(run.calls) == 1
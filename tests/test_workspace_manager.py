@@ -0,0 +1,25 @@
+import os
+
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+from yabai_workspaces.workspace_manager import WorkspaceManager
+from yabai_workspaces.yabai import Yabai
+
+from .fakes import fake_workspace
+
+
+def test_restore_reports_unmatched_windows(capsys):
+    workspace = fake_workspace(windows=4)
+    # Saved from a window that no longer exists
+    gone = workspace.windows[0].model_copy(
+        update={"id": 9999, "pid": 9999, "title": "Quarterly report"}
+    )
+    workspace.windows.append(gone)
+    workspace.spaces[0].windows.add(gone.id)
+
+    with FakeYabai(f"/tmp/yws-test-restore-{os.getpid()}.socket", windows=4) as fake:
+        summary = WorkspaceManager(Yabai(socket_path=fake.path)).restore(workspace)
+
+    assert summary.windows_missing == 1
+    out = capsys.readouterr().out
+    assert "Matched 4 of 5 saved windows" in out
+    assert f"not found: {gone.app} 'Quarterly report'" in out
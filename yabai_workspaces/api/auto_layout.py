@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Iterable, Literal, NamedTuple
+
+from ..layouts.layout_handler import WINDOW_FIELDS, LayoutHandler
+from ..layouts.plan import LayoutPlan, plan_insert, plan_removal
+from ..models import Layout, Window, WorkspaceSpace
+from ..query_cache import QueryCache
+from ..yabai import Yabai
+from .metrics import ServerMetrics
+from .state import WorkspaceState
+from .yabai_events import WindowCreated, WindowDestroyed, WindowMoved, YabaiSignal
+
+# Signals that can bring a window into a space or take one out of it. window_moved
+# also fires for plain drags and for our own warps, which change no space and are
+# ignored.
+PLACEMENT_SIGNALS = (WindowCreated, WindowDestroyed, WindowMoved)
+
+Placements = dict[int, tuple[int, Window]]
+
+
+class WindowChange(NamedTuple):
+    kind: Literal["insert", "remove"]
+    window: Window
+
+
+class LayoutUpdate(NamedTuple):
+    space_id: int
+    # Whether the space was put back in layout by placing just the changed window
+    incremental: bool
+    steps: int
+
+
+class AutoLayout:
+    """
+    Keeps spaces that have a layout in it as windows arrive and leave. Call
+    placements() before applying a batch of signals to WorkspaceState and pass the
+    result to update() afterwards.
+
+    When a single window entered or left a space and the layout allows it
+    (plan_insert, plan_removal), only that window is placed with a few commands.
+    LayoutHandler then checks the result against the layout with one query,
+    running nothing if it holds and reapplying the whole layout if it doesn't, or
+    if the incremental step wasn't possible in the first place.
+    """
+
+    def __init__(
+        self,
+        yabai: Yabai,
+        state: WorkspaceState,
+        handler: LayoutHandler | None = None,
+        metrics: ServerMetrics | None = None,
+    ):
+        self.yabai = yabai
+        self.state = state
+        self.handler = handler or LayoutHandler(yabai)
+        self.metrics = metrics
+
+    def watches(self, signals: Iterable[YabaiSignal]) -> bool:
+        return bool(self.state.layouts) and any(
+            isinstance(s, PLACEMENT_SIGNALS) for s in signals
+        )
+
+    def placements(self) -> Placements:
+        return self.state.window_placements()
+
+    async def set_layout(self, space_id: int, layout: Layout) -> WorkspaceSpace:
+        """Attach layout to a space and apply it in full."""
+        space = self.state.set_layout(space_id, layout)
+        await self.handler.aapply(layout, space, queries=QueryCache(self.yabai))
+        return space
+
+    async def update(
+        self, signals: Iterable[YabaiSignal], before: Placements
+    ) -> list[LayoutUpdate]:
+        after = self.placements()
+        changes: dict[int, list[WindowChange]] = defaultdict(list)
+        window_ids = [
+            s.yabai_window_id for s in signals if isinstance(s, PLACEMENT_SIGNALS)
+        ]
+        for window_id in dict.fromkeys(window_ids):
+            was, now = before.get(window_id), after.get(window_id)
+            if was and now and was[0] == now[0]:
+                continue
+            if was and was[0] in self.state.layouts:
+                changes[was[0]].append(WindowChange("remove", was[1]))
+            # yabai doesn't tile floating windows, so they don't disturb a layout
+            if now and now[0] in self.state.layouts and not now[1].is_floating:
+                changes[now[0]].append(WindowChange("insert", now[1]))
+
+        queries = QueryCache(self.yabai)
+        updates = await asyncio.gather(
+            *(self._update_space(s, c, queries) for s, c in changes.items())
+        )
+        return [u for u in updates if u]
+
+    async def _update_space(
+        self, space_id: int, changes: list[WindowChange], queries: QueryCache
+    ) -> LayoutUpdate | None:
+        layout = self.state.layouts[space_id]
+        if (known := self.state.spaces.get(space_id)) is None:
+            return None
+        if (space := await queries.aspace(known.index)) is None:
+            return None
+        plan = None
+        if len(changes) == 1:
+            windows = await queries.awindows(
+                space_idx=space.index, fields=WINDOW_FIELDS
+            )
+            plan = self._incremental(layout, space, windows, changes[0])
+        for step in plan.steps if plan else ():
+            await queries.acall(step.command)
+        full = await self.handler.aapply(layout, space, queries=queries)
+
+        incremental = plan is not None and not full.steps
+        steps = len(full.steps) + (len(plan.steps) if plan else 0)
+        if self.metrics:
+            self.metrics.auto_layouts_total.inc(
+                "incremental" if incremental else "full"
+            )
+        logging.info(
+            "Space %d back in %s layout with %d commands (%s)",
+            space.index,
+            layout.layout_type,
+            steps,
+            "incremental" if incremental else "full",
+        )
+        return LayoutUpdate(space_id, incremental, steps)
+
+    def _incremental(
+        self, layout: Layout, space, windows: list[Window], change: WindowChange
+    ) -> LayoutPlan | None:
+        if change.kind == "insert":
+            return plan_insert(layout, space, windows, change.window.id)
+        return plan_removal(layout, space, windows, change.window)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Hashable
+
+from pydantic import BaseModel
+
+from .yabai_events import YabaiSignal
+
+
+class CoalescerStats(BaseModel):
+    received: int = 0
+    absorbed: int = 0
+    flushes: int = 0
+
+
+class SignalCoalescer:
+    """
+    Merges bursts of signals so one flush covers all of them.
+
+    Signals for the same event and entity (e.g. 30 window_moved events for one window
+    during a drag) collapse into the latest one. A flush fires once no new signal has
+    arrived for `window` seconds, but never later than `max_latency` seconds after the
+    first signal of the burst, so a continuous stream still produces updates. Signals
+    are handed to `flush` in the order their entity first appeared in the burst.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[YabaiSignal]], Awaitable[None]],
+        window: float = 0.05,
+        max_latency: float = 0.25,
+    ):
+        self.flush = flush
+        self.window = window
+        self.max_latency = max_latency
+        self.stats = CoalescerStats()
+        self._pending: dict[Hashable, YabaiSignal] = {}
+        self._burst_started = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, signal: YabaiSignal) -> None:
+        self.stats.received += 1
+        now = time.monotonic()
+        if not self._pending:
+            self._burst_started = now
+
+        key = self._key(signal)
+        if key in self._pending:
+            self.stats.absorbed += 1
+        self._pending[key] = signal
+
+        if self._timer:
+            self._timer.cancel()
+        deadline = min(now + self.window, self._burst_started + self.max_latency)
+        self._timer = asyncio.get_running_loop().call_later(
+            max(0.0, deadline - now), self._schedule_flush
+        )
+
+    async def drain(self) -> None:
+        """Flush anything pending right away and wait for in-progress flushes."""
+        if self._timer:
+            self._timer.cancel()
+        if self._pending:
+            self._schedule_flush()
+        await asyncio.gather(*self._tasks)
+
+    def _key(self, signal: YabaiSignal) -> Hashable:
+        return tuple(signal.model_dump().values())
+
+    def _schedule_flush(self) -> None:
+        signals = list(self._pending.values())
+        self._pending.clear()
+        self._timer = None
+        task = asyncio.create_task(self._run_flush(signals))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_flush(self, signals: list[YabaiSignal]) -> None:
+        # Keep flushes in order so a slow one can't be overtaken by the next burst
+        async with self._flushing:
+            self.stats.flushes += 1
+            try:
+                await self.flush(signals)
+            except Exception:
+                logging.exception("Failed to flush %d signals", len(signals))
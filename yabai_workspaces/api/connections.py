@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from enum import Enum
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+from ..diff import WorkspacePatch, diff_workspaces
+from ..models import Workspace
+from .messages import SpacesPatched, SpacesUpdated, Subscribe
+from .metrics import ServerMetrics
+from .versions import VersionedWorkspace, workspace_hash
+
+
+class OverflowPolicy(str, Enum):
+    # Throw away everything queued and send a fresh snapshot instead, since the
+    # client can't apply patches once one in the chain has been dropped.
+    LATEST = "latest"
+    DISCONNECT = "disconnect"
+
+
+class Client:
+    """A connected WebSocket and the bounded queue of messages waiting to go out."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(max_queue)
+        self.writer: asyncio.Task | None = None
+        self.subscription: Subscribe | None = None
+        # Sequence number of the last update queued for this client. Subscribed
+        # clients skip updates that don't touch anything they see, so this can lag
+        # behind the global sequence number.
+        self.seq = 0
+        # The filtered workspace as of seq, for subscribed clients. Patches are
+        # diffed from it, so updates the client skipped are carried into the next.
+        self.view: Workspace | None = None
+        self.dropped = 0
+
+
+# https://fastapi.tiangolo.com/advanced/websockets/#handling-disconnections-and-multiple-clients
+class ConnectionManager:
+    """
+    Fans workspace updates out to every client without waiting on any of them.
+
+    Each update is serialized once per distinct subscription and put on every
+    matching client's queue, and a writer task per client drains its queue onto the
+    socket. A client that falls max_queue messages behind is handled according to
+    `overflow`.
+    """
+
+    def __init__(
+        self,
+        versions: VersionedWorkspace,
+        max_queue: int = 32,
+        overflow: OverflowPolicy = OverflowPolicy.LATEST,
+        metrics: ServerMetrics | None = None,
+    ):
+        self.versions = versions
+        self.metrics = metrics
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.clients: dict[WebSocket, Client] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket) -> Client:
+        await websocket.accept()
+        client = Client(websocket, self.max_queue)
+        client.writer = asyncio.create_task(self._write(client))
+        self.clients[websocket] = client
+        self.send_snapshot(websocket)
+        return client
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        if client := self.clients.pop(websocket, None):
+            if client.writer and client.writer is not asyncio.current_task():
+                client.writer.cancel()
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscribe) -> None:
+        """Replace a client's subscription and send it a snapshot of its new view."""
+        if client := self.clients.get(websocket):
+            client.subscription = subscription
+            self.send_snapshot(websocket)
+
+    def send_snapshot(self, websocket: WebSocket) -> None:
+        if client := self.clients.get(websocket):
+            self._enqueue(client, self._snapshot(client))
+
+    def broadcast(
+        self,
+        previous: Workspace,
+        patch: WorkspacePatch,
+        events: frozenset[str] = frozenset(),
+    ) -> None:
+        """Send the latest published update, which turned `previous` into the
+        current workspace through `patch`."""
+        # Clients with the same subscription and seq were last sent the same view
+        payloads: dict[
+            tuple[Subscribe | None, int], tuple[str, Workspace | None] | None
+        ] = {}
+        for client in list(self.clients.values()):
+            key = (client.subscription, client.seq)
+            if key not in payloads:
+                payloads[key] = self._patch(client, previous, patch, events)
+            if (update := payloads[key]) is not None:
+                payload, view = update
+                client.seq, client.view = self.versions.seq, view
+                self._enqueue(client, payload)
+
+    def _snapshot(self, client: Client) -> str:
+        """A snapshot of the client's view, which it's then considered to have."""
+        workspace, hash = self.versions.workspace, self.versions.hash
+        if (sub := client.subscription) is not None:
+            workspace = sub.filter(workspace)
+            hash = workspace_hash(workspace)
+        client.seq = self.versions.seq
+        client.view = workspace if sub is not None else None
+        payload = SpacesUpdated(
+            seq=self.versions.seq, hash=hash, content=workspace
+        ).model_dump_json(by_alias=True)
+        if self.metrics:
+            self.metrics.payload_bytes.observe(len(payload), "SPACES_UPDATED")
+        return payload
+
+    def _patch(
+        self,
+        client: Client,
+        previous: Workspace,
+        patch: WorkspacePatch,
+        events: frozenset[str],
+    ) -> tuple[str, Workspace | None] | None:
+        """
+        The patch message for client and the view it leaves the client with, or
+        None if there's nothing to send. Subscribed clients get a patch from the
+        view they last received to their view now, with that view's hash.
+        """
+        view, hash = None, self.versions.hash
+        if (sub := client.subscription) is not None:
+            if not sub.wants_events(events):
+                return None
+            # Entities moving in or out of view have to show up as added or removed,
+            # so diff the filtered views rather than filtering the patch.
+            view = sub.filter(self.versions.workspace)
+            patch = diff_workspaces(
+                sub.filter(previous) if client.view is None else client.view, view
+            )
+            if patch.is_empty():
+                return None
+            hash = workspace_hash(view)
+        payload = SpacesPatched(
+            seq=self.versions.seq,
+            base_seq=client.seq,
+            hash=hash,
+            patch=patch,
+        ).model_dump_json(by_alias=True)
+        if self.metrics:
+            self.metrics.payload_bytes.observe(len(payload), "SPACES_PATCHED")
+        return payload, view
+
+    def _enqueue(self, client: Client, payload: str) -> None:
+        try:
+            client.queue.put_nowait(payload)
+            return
+        except asyncio.QueueFull:
+            client.dropped += client.queue.qsize()
+            if self.metrics:
+                self.metrics.dropped_messages_total.inc(amount=client.queue.qsize())
+
+        match self.overflow:
+            case OverflowPolicy.LATEST:
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                client.queue.put_nowait(self._snapshot(client))
+            case OverflowPolicy.DISCONNECT:
+                logging.warning("Disconnecting client that fell too far behind")
+                self.disconnect(client.websocket)
+                task = asyncio.create_task(self._close(client.websocket))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    async def _write(self, client: Client) -> None:
+        try:
+            while True:
+                await client.websocket.send_text(await client.queue.get())
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # The receive loop normally notices first, but a socket that dies while
+            # we're writing to it has to be cleaned up from here.
+            self.disconnect(client.websocket)
+
+    async def _close(self, websocket: WebSocket) -> None:
+        if websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close(code=1013)
+            except RuntimeError:
+                pass
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shlex
+from pathlib import Path
+from typing import Callable, Type, get_args
+
+from .yabai_events import YabaiSignal
+
+SIGNAL_FIFO = "/tmp/yabai-workspaces-signals.fifo"
+
+signal_types: dict[str, Type[YabaiSignal]] = {
+    t.model_fields["event_name"].default: t for t in get_args(get_args(YabaiSignal)[0])
+}
+
+
+def http_action(signal: Type[YabaiSignal], port: int = 8000) -> str:
+    # JSON POST data (-d) will be in single-quotes, but we need to interpolate the
+    # env variable values provided by yabai at call time, so we need:
+    #
+    # -d '{"yabai_display_id": "'$YABAI_DISPLAY_ID'"}'
+    #
+    # the single quotes around $YABAI_DISPLAY_ID close the outer single quotes,
+    # causing the shell to substitute in the env variable. json.dumps automatically
+    # escapes the double quotes so they become part of the generated JSON body.
+    params = {
+        name: field.default if name == "event_name" else f"'${name.upper()}'"
+        for name, field in signal.model_fields.items()
+    }
+    return f"/usr/bin/curl -s -X POST -H 'Content-Type: application/json' -d '{json.dumps(params)}' localhost:{port}/signal"
+
+
+def fifo_action(signal: Type[YabaiSignal], path: str = SIGNAL_FIFO) -> str:
+    # Records are one line of space-separated values in field order, e.g.
+    # "window_moved 1234". [ and printf are shell builtins, so the action forks
+    # nothing beyond yabai's own sh. 1<> opens the FIFO read-write, which doesn't
+    # wait for a reader: with no server the record sits in the pipe until the
+    # shell exits, and with no FIFO at all nothing is written. Records are far
+    # shorter than PIPE_BUF, so concurrent actions' writes don't interleave.
+    record = " ".join(
+        field.default if name == "event_name" else f"${name.upper()}"
+        for name, field in signal.model_fields.items()
+    )
+    quoted = shlex.quote(path)
+    return f"[ -p {quoted} ] && printf '%s\\n' \"{record}\" 1<> {quoted}"
+
+
+def parse_record(record: bytes) -> YabaiSignal:
+    event_name, *values = record.decode().split()
+    signal = signal_types[event_name]
+    fields = [name for name in signal.model_fields if name != "event_name"]
+    if len(values) != len(fields):
+        raise ValueError(f"Expected {len(fields)} values for {event_name}")
+    # Values come straight from yabai's environment variables and are all ids, so
+    # skip validation beyond the int conversion.
+    return signal.model_construct(**{f: int(v) for f, v in zip(fields, values)})
+
+
+class SignalListener:
+    """
+    Receives signal records from yabai actions through a named pipe and hands them
+    to `handle`, bypassing HTTP entirely.
+    """
+
+    def __init__(self, handle: Callable[[YabaiSignal], None], path: str = SIGNAL_FIFO):
+        self.handle = handle
+        self.path = path
+        self.transport: asyncio.ReadTransport | None = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        # A crashed server leaves its FIFO behind, possibly with unread records
+        Path(self.path).unlink(missing_ok=True)
+        os.mkfifo(self.path, 0o600)
+        # Read-write, so the pipe doesn't hit EOF each time an action's shell exits
+        pipe = os.fdopen(os.open(self.path, os.O_RDWR | os.O_NONBLOCK), "rb", 0)
+        reader = asyncio.StreamReader(limit=1024)
+        self.transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        self.task = asyncio.create_task(self._read_records(reader))
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+        if self.transport:
+            self.transport.close()
+        Path(self.path).unlink(missing_ok=True)
+
+    async def _read_records(self, reader: asyncio.StreamReader) -> None:
+        while not reader.at_eof():
+            record = b""
+            try:
+                record = await reader.readline()
+                self.handle(parse_record(record))
+            except (ValueError, KeyError) as e:
+                logging.warning("Ignoring malformed signal record %r: %s", record, e)
@@ -1,13 +1,33 @@
 import asyncio
-import json
+import logging
+import os
 from contextlib import asynccontextmanager
-from typing import Callable, Literal, Type
+from typing import Callable, Type
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
+from fastapi import (
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import PlainTextResponse
+from pydantic import ValidationError
 
-from ..models import NoLayout, Workspace, WorkspaceDisplay, WorkspaceSpace
+from ..models import Layout, Workspace, WorkspaceSpace
 from ..yabai import Yabai
+from .auto_layout import AutoLayout
+from .coalescer import CoalescerStats, SignalCoalescer
+from .connections import ConnectionManager
+from .ingest import SignalListener, fifo_action, http_action
+from .messages import ClientMessage, RequestSnapshot, Subscribe
+from .metrics import CONTENT_TYPE, ServerMetrics
+from .registry import SignalRegistry
+from .state import WorkspaceState
+from .trace import RecordingYabai, TraceRecorder
+from .versions import VersionedWorkspace
 from .yabai_events import (
     ApplicationActivated,
     ApplicationDeactivated,
@@ -60,58 +80,56 @@ signal_handlers: dict[Type[YabaiSignal], list[Callable[..., None]]] = {
     )
 }
 
-current_workspace = Workspace(displays=[], spaces=[], windows=[])
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await initialize_signals()
     yield
     await clear_signals()
+    await listener.close()
+    await coalescer.drain()
+    if recorder:
+        recorder.close()
     return
 
 
 app = FastAPI(lifespan=lifespan)
-yabai = Yabai()
+metrics = ServerMetrics(connected_clients=lambda: len(manager.clients))
+# A file path to record incoming signals and yabai's responses to, for replaying
+# with scripts/replay_trace.py
+TRACE_PATH = os.environ.get("YWS_TRACE")
+recorder = TraceRecorder(TRACE_PATH) if TRACE_PATH else None
+yabai = (
+    RecordingYabai(recorder, observer=metrics) if recorder else Yabai(observer=metrics)
+)
+state = WorkspaceState(yabai)
+auto_layout = AutoLayout(yabai, state, metrics=metrics)
+registry = SignalRegistry(yabai)
+versions = VersionedWorkspace()
 
 
-async def refresh_workspace():
-    global current_workspace
-    current_workspace = Workspace(
-        displays=[
-            WorkspaceDisplay(**(d.model_dump()), layout=NoLayout())
-            for d in await yabai.adisplays()
-        ],
-        spaces=[
-            WorkspaceSpace(**(s.model_dump()), layout=NoLayout())
-            for s in await yabai.aspaces()
-        ],
-        windows=await yabai.awindows(),
-    )
-    return current_workspace
+async def refresh_workspace() -> Workspace:
+    with metrics.refresh_seconds.time("resync"):
+        workspace = await state.resync()
+    publish(workspace)
+    return workspace
 
 
 async def initialize_signals() -> None:
     await refresh_workspace()
-    for s in signal_handlers.keys():
-        # JSON POST data (-d) will be in single-quotes, but we need to interpolate the
-        # env variable values provided by yabai at call time, so we need:
-        #
-        # -d '{"yabai_display_id": "'$YABAI_DISPLAY_ID'"}'
-        #
-        # the single quotes around $YABAI_DISPLAY_ID close the outer single quotes,
-        # causing the shell to substitute in the env variable. json.dumps automatically
-        # escapes the double quotes so they become part of the generated JSON body.
-        params = {
-            name: field.default if name == "event_name" else f"'${name.upper()}'"
-            for name, field in s.model_fields.items()
-        }
-        action = f"/usr/bin/curl -s -X POST -H 'Content-Type: application/json' -d '{json.dumps(params)}' localhost:8000/signal"
-        await yabai.aregister_signal(
-            params["event_name"],
-            action,
-            f"yabai-spaces-server-py-{params['event_name']}",
-        )
+    if not REGISTER_SIGNALS:
+        return
+    action = http_action
+    if SIGNAL_TRANSPORT == "fifo":
+        try:
+            await listener.start()
+            action = fifo_action
+        except OSError as e:
+            logging.warning("Falling back to HTTP signals, couldn't listen: %s", e)
+    result = await registry.sync(
+        {s.model_fields["event_name"].default: action(s) for s in signal_handlers}
+    )
+    logging.info("Registered %s", result)
     proc = await asyncio.create_subprocess_exec(
         *[
             "/usr/bin/osascript",
@@ -125,59 +143,144 @@ async def initialize_signals() -> None:
 
 
 async def clear_signals() -> None:
-    for s in signal_handlers.keys():
-        await yabai.aremove_signal(
-            f"yabai-spaces-server-py-{s.model_fields['event_name'].default}"
-        )
+    if not REGISTER_SIGNALS:
+        return
+    logging.info("Removed %s", await registry.clear())
+
+
+# GET /workspace serves the current state without querying yabai if the last full
+# snapshot is at most this many seconds old
+WORKSPACE_MAX_AGE = 1.0
+
+
+# Longest a GET /workspace?since=...&wait=... long-poll is held open
+MAX_WAIT_MS = 60_000
 
 
 @app.get("/workspace", response_model=Workspace)
-async def workspace() -> Workspace:
-    return await refresh_workspace()
+async def workspace(
+    response: Response,
+    since: int | None = Query(None, ge=0),
+    wait: int = Query(0, ge=0, le=MAX_WAIT_MS),
+    if_none_match: str | None = Header(None),
+) -> Workspace | Response:
+    """
+    The workspace, with its seq in X-Workspace-Seq and an ETag. Requests with a
+    matching If-None-Match get 304 Not Modified.
+
+    With since, a seq from an earlier response, the published workspace is served
+    as signals left it, without querying yabai. If seq is still since, the request
+    is held for up to wait milliseconds for a change, then answered with 304.
+    """
+    if since is None:
+        with metrics.refresh_seconds.time("current"):
+            publish(await state.current(WORKSPACE_MAX_AGE))
+    elif not await versions.wait_for_change(since, wait / 1000):
+        return not_modified()
+    if etag_matches(if_none_match, versions.etag):
+        return not_modified()
+    response.headers.update(workspace_headers())
+    return versions.workspace
+
+
+def workspace_headers() -> dict[str, str]:
+    return {"ETag": versions.etag, "X-Workspace-Seq": str(versions.seq)}
 
 
-class SpacesUpdated(BaseModel):
-    type: Literal["SPACES_UPDATED"] = "SPACES_UPDATED"
-    content: Workspace
+def not_modified() -> Response:
+    return Response(status_code=304, headers=workspace_headers())
 
 
-# https://fastapi.tiangolo.com/advanced/websockets/#handling-disconnections-and-multiple-clients
-class ConnectionManager:
-    def __init__(self):
-        self.clients: list[WebSocket] = []
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    # A list of tags, any of which may be weak (W/"...") since this is a GET
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.clients.append(websocket)
 
-    def disconnect(self, websocket: WebSocket):
-        self.clients.remove(websocket)
+manager = ConnectionManager(versions, metrics=metrics)
 
-    async def broadcast(self, workspace: Workspace):
-        for client in self.clients:
-            await client.send_text(
-                SpacesUpdated(content=workspace).model_dump_json(by_alias=True)
-            )
 
+def publish(workspace: Workspace, events: frozenset[str] = frozenset()) -> None:
+    previous = versions.workspace
+    if (patch := versions.update(workspace)) is None:
+        return
+    with metrics.broadcast_seconds.time():
+        manager.broadcast(previous, patch, events)
 
-manager = ConnectionManager()
+
+async def apply_signals(signals: list[YabaiSignal]) -> None:
+    before = auto_layout.placements() if auto_layout.watches(signals) else None
+    with metrics.refresh_seconds.time("signals"):
+        workspace = await state.apply_many(signals)
+    publish(workspace, frozenset(s.event_name for s in signals))
+    # The commands this sends cause window_moved and window_resized signals of
+    # their own, which reach the next batch and leave every window's space as is
+    if before is not None:
+        await auto_layout.update(signals, before)
+
+
+def receive_signal(signal: YabaiSignal) -> None:
+    metrics.signals_total.inc(signal.event_name)
+    if recorder:
+        recorder.record_signal(signal)
+    coalescer.submit(signal)
+
+
+coalescer = SignalCoalescer(apply_signals)
+# "fifo" has yabai actions write to a named pipe we read, "http" has them curl
+# POST /signal. POST /signal stays available either way.
+SIGNAL_TRANSPORT = os.environ.get("YWS_SIGNAL_TRANSPORT", "fifo")
+# "0" leaves yabai's signals alone and doesn't listen for them, for running against
+# a fake yabai where signals are POSTed by hand or replayed
+REGISTER_SIGNALS = os.environ.get("YWS_REGISTER_SIGNALS", "1") != "0"
+listener = SignalListener(receive_signal)
 
 
 @app.post("/signal")
 async def signal(signal: YabaiSignal):
-    await refresh_workspace()
-    await manager.broadcast(current_workspace)
+    receive_signal(signal)
+
+
+@app.get("/signal/stats", response_model=CoalescerStats)
+async def signal_stats() -> CoalescerStats:
+    return coalescer.stats
+
+
+@app.put("/spaces/{space_id}/layout", response_model=WorkspaceSpace)
+async def set_space_layout(space_id: int, layout: Layout) -> WorkspaceSpace:
+    """
+    Attach a layout to a space and apply it. The layout is kept up as windows are
+    created on, destroyed on or moved to the space, until it's set to NoLayout.
+    """
+    if space_id not in state.spaces:
+        raise HTTPException(status_code=404, detail=f"No space with id {space_id}")
+    space = await auto_layout.set_layout(space_id, layout)
+    publish(state.workspace())
+    return space
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     print("Client connected")
-    await websocket.send_text(
-        SpacesUpdated(content=current_workspace).model_dump_json(by_alias=True)
-    )
     try:
         while True:
-            await asyncio.sleep(0)
+            try:
+                message = ClientMessage.validate_json(await websocket.receive_text())
+            except ValidationError as e:
+                logging.warning("Ignoring unknown client message: %s", e)
+                continue
+            match message:
+                case RequestSnapshot():
+                    manager.send_snapshot(websocket)
+                case Subscribe():
+                    manager.subscribe(websocket, message)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
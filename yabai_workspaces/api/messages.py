@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Annotated, Literal, Union
+
+from pydantic import BaseModel, ConfigDict, Field, PositiveInt, TypeAdapter
+
+from ..diff import WorkspacePatch
+from ..models import Display, Space, Window, Workspace
+
+
+class SpacesUpdated(BaseModel):
+    """Full snapshot, sent on connect and whenever a client asks for one."""
+
+    type: Literal["SPACES_UPDATED"] = "SPACES_UPDATED"
+    seq: int
+    hash: str
+    content: Workspace
+
+
+class SpacesPatched(BaseModel):
+    """
+    Changes since the update with sequence number base_seq. A client whose last seen
+    seq isn't base_seq has missed an update and should send REQUEST_SNAPSHOT.
+    """
+
+    type: Literal["SPACES_PATCHED"] = "SPACES_PATCHED"
+    seq: int
+    base_seq: int
+    # workspace_hash of what the client has once the patch is applied: the whole
+    # workspace, or for a subscribed client its view
+    hash: str
+    patch: WorkspacePatch
+
+
+class RequestSnapshot(BaseModel):
+    type: Literal["REQUEST_SNAPSHOT"] = "REQUEST_SNAPSHOT"
+
+
+class Subscribe(BaseModel):
+    """
+    Limits a client to the parts of the workspace it cares about. Each filter that is
+    left unset matches everything; displays and spaces are matched by index.
+    Updates caused only by events outside `events` aren't sent at all.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    type: Literal["SUBSCRIBE"] = "SUBSCRIBE"
+    displays: frozenset[PositiveInt] | None = None
+    spaces: frozenset[PositiveInt] | None = None
+    apps: frozenset[str] | None = None
+    events: frozenset[str] | None = None
+
+    def wants_events(self, events: frozenset[str]) -> bool:
+        # Updates that didn't come from a signal, like a resync, always go out
+        return self.events is None or not events or not self.events.isdisjoint(events)
+
+    def filter(self, workspace: Workspace) -> Workspace:
+        return Workspace(
+            displays=[d for d in workspace.displays if self._wants_display(d)],
+            spaces=[s for s in workspace.spaces if self._wants_space(s)],
+            windows=[w for w in workspace.windows if self._wants_window(w)],
+        )
+
+    def _wants_display(self, display: Display) -> bool:
+        return self.displays is None or display.index in self.displays
+
+    def _wants_space(self, space: Space) -> bool:
+        return (self.displays is None or space.display in self.displays) and (
+            self.spaces is None or space.index in self.spaces
+        )
+
+    def _wants_window(self, window: Window) -> bool:
+        return (
+            (self.displays is None or window.display in self.displays)
+            and (self.spaces is None or window.space in self.spaces)
+            and (self.apps is None or window.app in self.apps)
+        )
+
+
+ClientMessage: TypeAdapter[RequestSnapshot | Subscribe] = TypeAdapter(
+    Annotated[Union[RequestSnapshot, Subscribe], Field(discriminator="type")]
+)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import bisect
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds, from a fast socket round trip up to a slow full resync
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Metric(ABC):
+    kind: str
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        pass
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}"
+            for k, v in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A value read when metrics are rendered, so nothing is tracked in between."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        super().__init__(name, help)
+        self.read = read
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {_number(self.read())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (not cumulative, plus one for +Inf),
+        # the sum and the total count
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if (entry := self.values.get(labels)) is None:
+            entry = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+        counts, totals = entry
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, (total, count)) in self.values.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = _labels(self.labelnames, labels, le=_number(bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_number(total)}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class ServerMetrics:
+    """
+    Everything the API server exports on /metrics. Recording is a dict lookup and a
+    few additions, so it's cheap enough to do on every call and signal.
+    """
+
+    def __init__(self, connected_clients: Callable[[], float] = lambda: 0):
+        self.yabai_call_seconds = Histogram(
+            "yws_yabai_call_seconds",
+            "Round trip time of yabai socket commands",
+            ["verb"],
+        )
+        self.yabai_semaphore_wait_seconds = Histogram(
+            "yws_yabai_semaphore_wait_seconds",
+            "Time async yabai calls waited for a free connection slot",
+        )
+        self.signals_total = Counter(
+            "yws_signals_total", "yabai signals received", ["event"]
+        )
+        self.refresh_seconds = Histogram(
+            "yws_refresh_seconds",
+            "Time to bring the workspace up to date",
+            ["kind"],
+        )
+        self.broadcast_seconds = Histogram(
+            "yws_broadcast_seconds", "Time to fan an update out to client queues"
+        )
+        self.payload_bytes = Histogram(
+            "yws_payload_bytes",
+            "Size of serialized WebSocket messages",
+            ["type"],
+            buckets=SIZE_BUCKETS,
+        )
+        self.dropped_messages_total = Counter(
+            "yws_dropped_messages_total",
+            "Queued WebSocket messages dropped for clients that fell behind",
+        )
+        self.auto_layouts_total = Counter(
+            "yws_auto_layouts_total",
+            "Spaces put back in layout after windows arrived or left",
+            ["mode"],
+        )
+        self.connected_clients = Gauge(
+            "yws_connected_clients", "Connected WebSocket clients", connected_clients
+        )
+
+    # Yabai's observer hooks
+    def call_finished(self, verb: str, seconds: float) -> None:
+        self.yabai_call_seconds.observe(seconds, verb)
+
+    def semaphore_waited(self, seconds: float) -> None:
+        self.yabai_semaphore_wait_seconds.observe(seconds)
+
+    def render(self) -> str:
+        metrics = [m for m in vars(self).values() if isinstance(m, Metric)]
+        return "\n".join(line for m in metrics for line in m.render()) + "\n"
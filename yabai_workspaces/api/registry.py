@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+from ..yabai import FAILURE_MESSAGE, Yabai
+
+# Every signal the server registers is labelled with this prefix and its event name
+LABEL_PREFIX = "yabai-spaces-server-py-"
+
+
+class SyncResult(NamedTuple):
+    added: list[str]
+    removed: list[str]
+    unchanged: list[str]
+    # Labels whose add or remove yabai rejected
+    failed: list[str]
+
+    def __str__(self) -> str:
+        return (
+            f"signals: {len(self.added)} added, {len(self.removed)} removed,"
+            f" {len(self.unchanged)} unchanged, {len(self.failed)} failed"
+        )
+
+
+class SignalRegistry:
+    """
+    Keeps the server's yabai signals in line with the ones it wants. sync compares
+    `signal --list` against the desired event actions and sends only the
+    difference, all at once:
+
+    - missing signals, or ones whose action changed (e.g. a different transport),
+      are added; yabai replaces a signal that has the same label
+    - signals with the server's label prefix that aren't wanted, such as those
+      left behind by a crashed server for an event it no longer handles, are
+      removed
+
+    Signals that already match are left alone, so restarting after a crash costs
+    one query.
+    """
+
+    def __init__(self, yabai: Yabai, prefix: str = LABEL_PREFIX):
+        self.yabai = yabai
+        self.prefix = prefix
+
+    def label(self, event: str) -> str:
+        return f"{self.prefix}{event}"
+
+    async def sync(self, actions: dict[str, str]) -> SyncResult:
+        """Make the registered signals exactly `actions`, a map of event to action."""
+        existing = {
+            s.label: (s.event, s.action)
+            for s in await self.yabai.asignals()
+            if s.label.startswith(self.prefix)
+        }
+        wanted = {self.label(e): (e, a) for e, a in actions.items()}
+
+        add = [l for l, signal in wanted.items() if existing.get(l) != signal]
+        remove = [l for l in existing if l not in wanted]
+        commands = [
+            [
+                "signal",
+                "--add",
+                f"event={wanted[l][0]}",
+                f"action={wanted[l][1]}",
+                f"label={l}",
+            ]
+            for l in add
+        ] + [["signal", "--remove", l] for l in remove]
+        responses = await asyncio.gather(
+            *(self.yabai.acall_raw(c) for c in commands), return_exceptions=True
+        )
+
+        failed = []
+        for label, command, response in zip(add + remove, commands, responses):
+            if isinstance(response, Exception) or response.startswith(FAILURE_MESSAGE):
+                logging.warning("Yabai command %s failed: %r", command, response)
+                failed.append(label)
+        return SyncResult(
+            added=[l for l in add if l not in failed],
+            removed=[l for l in remove if l not in failed],
+            unchanged=[l for l in wanted if l not in add],
+            failed=failed,
+        )
+
+    async def clear(self) -> SyncResult:
+        """Remove every signal with the prefix, whoever registered it."""
+        return await self.sync({})
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import NamedTuple
+
+from ..models import Display, Space, Window
+from ..yabai import Yabai
+
+
+class Snapshot(NamedTuple):
+    # Versions count up in the order fetches started
+    version: int
+    taken_at: float
+    # When the fetch was started, so nothing yabai reported before then is in it
+    started_at: float
+    displays: list[Display]
+    spaces: list[Space]
+    windows: list[Window]
+
+
+class SnapshotService:
+    """
+    Full queries of yabai's displays, spaces and windows.
+
+    The three queries run concurrently and each snapshot gets a version one higher
+    than the last started. get() callers, which accept a snapshot of a certain age,
+    share a fetch that's already running. refresh() always starts its own, since
+    one started earlier may predate whatever change prompted the call.
+    """
+
+    def __init__(self, yabai: Yabai, max_age: float = 1.0):
+        self.yabai = yabai
+        self.max_age = max_age
+        self.latest: Snapshot | None = None
+        self._version = 0
+        self._inflight: asyncio.Future[Snapshot] | None = None
+
+    async def get(self, max_age: float | None = None) -> Snapshot:
+        """The latest snapshot if it's at most max_age seconds old, else a new one."""
+        max_age = self.max_age if max_age is None else max_age
+        if self.latest and time.monotonic() - self.latest.taken_at <= max_age:
+            return self.latest
+        if self._inflight is None:
+            return await self.refresh()
+        # Shielded so one caller being cancelled doesn't cancel everyone's refresh
+        return await asyncio.shield(self._inflight)
+
+    async def refresh(self) -> Snapshot:
+        """A new snapshot, from queries sent after this was called."""
+        self._version += 1
+        fetch = self._inflight = asyncio.ensure_future(self._fetch(self._version))
+        fetch.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(fetch)
+
+    def _clear_inflight(self, fetch: asyncio.Future[Snapshot]) -> None:
+        if self._inflight is fetch:
+            self._inflight = None
+
+    async def _fetch(self, version: int) -> Snapshot:
+        started_at = time.monotonic()
+        displays, spaces, windows = await asyncio.gather(
+            self.yabai.adisplays(), self.yabai.aspaces(), self.yabai.awindows()
+        )
+        snapshot = Snapshot(
+            version, time.monotonic(), started_at, displays, spaces, windows
+        )
+        # Overlapping fetches can finish out of order
+        if self.latest is None or version > self.latest.version:
+            self.latest = snapshot
+        return snapshot
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Iterable
+
+from ..models import (
+    Display,
+    Layout,
+    NoLayout,
+    Space,
+    Window,
+    Workspace,
+    WorkspaceDisplay,
+    WorkspaceSpace,
+)
+from ..yabai import Yabai
+from .snapshots import Snapshot, SnapshotService
+from .yabai_events import (
+    ApplicationActivated,
+    ApplicationDeactivated,
+    ApplicationFrontSwitched,
+    ApplicationHidden,
+    ApplicationLaunched,
+    ApplicationTerminated,
+    ApplicationVisible,
+    DisplayAdded,
+    DisplayChanged,
+    DisplayMoved,
+    DisplayRemoved,
+    DisplayResized,
+    SpaceChanged,
+    WindowCreated,
+    WindowDeminimized,
+    WindowDestroyed,
+    WindowFocused,
+    WindowMinimized,
+    WindowMoved,
+    WindowResized,
+    WindowTitleChanged,
+    YabaiSignal,
+)
+
+# Signals whose effects are too broad to patch in place
+STRUCTURAL_SIGNALS = (
+    DisplayAdded,
+    DisplayMoved,
+    DisplayRemoved,
+    DisplayResized,
+    ApplicationLaunched,
+    ApplicationTerminated,
+)
+
+
+def to_workspace_display(display: Display) -> WorkspaceDisplay:
+    return WorkspaceDisplay(**(display.model_dump()), layout=NoLayout())
+
+
+def to_workspace_space(space: Space, layout: Layout | None = None) -> WorkspaceSpace:
+    return WorkspaceSpace(
+        **(space.model_dump()), layout=NoLayout() if layout is None else layout
+    )
+
+
+class WorkspaceState:
+    """
+    In-memory copy of yabai's displays, spaces and windows that is kept current by
+    patching only the entities a signal touches.
+
+    Signals that change the overall structure (displays coming and going, apps
+    launching or quitting) trigger a full resync, as does any signal arriving more
+    than resync_interval seconds after the last one, so drift from missed events
+    can't accumulate.
+
+    Layouts set on spaces are kept by space id and carried over every refresh, so
+    they stay attached to WorkspaceSpace.layout until the space is destroyed.
+    """
+
+    def __init__(
+        self,
+        yabai: Yabai,
+        resync_interval: float = 60.0,
+        snapshots: SnapshotService | None = None,
+    ):
+        self.yabai = yabai
+        self.resync_interval = resync_interval
+        self.snapshots = snapshots or SnapshotService(yabai)
+        # All keyed by yabai id. Space indexes shift as spaces are created and
+        # destroyed, but ids are stable.
+        self.displays: dict[int, WorkspaceDisplay] = {}
+        self.spaces: dict[int, WorkspaceSpace] = {}
+        self.windows: dict[int, Window] = {}
+        self.layouts: dict[int, Layout] = {}
+        self.last_resync = float("-inf")
+        # When signals last started patching the state. A snapshot started before
+        # then could undo their changes.
+        self.patched_at = float("-inf")
+        self.snapshot_version = 0
+
+    def workspace(self) -> Workspace:
+        return Workspace(
+            displays=sorted(self.displays.values(), key=lambda d: d.index),
+            spaces=sorted(self.spaces.values(), key=lambda s: s.index),
+            windows=list(self.windows.values()),
+        )
+
+    def set_layout(self, space_id: int, layout: Layout) -> WorkspaceSpace:
+        """Attach layout to a space, raising KeyError for an unknown space id."""
+        space = self.spaces[space_id]
+        if isinstance(layout, NoLayout):
+            self.layouts.pop(space_id, None)
+        else:
+            self.layouts[space_id] = layout
+        # A new object, since the published workspace may hold the old one
+        space = self.spaces[space_id] = space.model_copy(update={"layout": layout})
+        return space
+
+    def window_placements(self) -> dict[int, tuple[int, Window]]:
+        """Each window's space id, and the window, by window id."""
+        space_ids = {s.index: s.id for s in self.spaces.values()}
+        return {
+            w.id: (space_ids[w.space], w)
+            for w in self.windows.values()
+            if w.space in space_ids
+        }
+
+    async def resync(self) -> Workspace:
+        """
+        The workspace, from a snapshot started after this was called (or a newer
+        one that's already loaded).
+        """
+        if (snapshot := await self.snapshots.refresh()).version > self.snapshot_version:
+            self._load(snapshot)
+        return self.workspace()
+
+    async def current(self, max_age: float | None = None) -> Workspace:
+        """
+        The workspace, resynced first if the last full snapshot is older than
+        max_age seconds. Patches since that snapshot are kept when it's fresh enough.
+        A snapshot that was already being taken when signals were last applied is
+        older than their patches, so it's left for the next resync.
+        """
+        snapshot = await self.snapshots.get(max_age)
+        if (
+            snapshot.version > self.snapshot_version
+            and snapshot.started_at >= self.patched_at
+        ):
+            self._load(snapshot)
+        return self.workspace()
+
+    def _load(self, snapshot: Snapshot) -> None:
+        self.displays = {d.id: to_workspace_display(d) for d in snapshot.displays}
+        self.spaces = {s.id: self._workspace_space(s) for s in snapshot.spaces}
+        self.windows = {w.id: w for w in snapshot.windows}
+        # Space ids aren't reused, so layouts of destroyed spaces can go
+        self.layouts = {k: v for k, v in self.layouts.items() if k in self.spaces}
+        self.last_resync = snapshot.taken_at
+        self.snapshot_version = snapshot.version
+
+    async def apply(self, signal: YabaiSignal) -> Workspace:
+        return await self.apply_many([signal])
+
+    async def apply_many(self, signals: Iterable[YabaiSignal]) -> Workspace:
+        """Apply signals in order, resyncing at most once for the whole batch."""
+        signals = list(signals)
+        if time.monotonic() - self.last_resync > self.resync_interval or any(
+            isinstance(s, STRUCTURAL_SIGNALS) for s in signals
+        ):
+            return await self.resync()
+        self.patched_at = time.monotonic()
+        for signal in signals:
+            await self._patch(signal)
+        return self.workspace()
+
+    async def _patch(self, signal: YabaiSignal) -> None:
+        match signal:
+            case DisplayChanged():
+                await self._refresh_all_spaces()
+            case SpaceChanged():
+                await self._refresh_spaces_by_id(
+                    signal.yabai_space_id, signal.yabai_recent_space_id
+                )
+            case WindowCreated() | WindowMinimized() | WindowDeminimized():
+                await self._refresh_windows([signal.yabai_window_id], with_spaces=True)
+            case WindowDestroyed():
+                await self._refresh_windows([signal.yabai_window_id])
+            case WindowFocused():
+                await self._refresh_windows(
+                    [signal.yabai_window_id, *self._focused_window_ids()]
+                )
+            case WindowMoved() | WindowResized() | WindowTitleChanged():
+                await self._refresh_windows([signal.yabai_window_id])
+            case ApplicationHidden() | ApplicationVisible():
+                await self._refresh_windows(
+                    self._window_ids_for(signal.yabai_process_id)
+                )
+            case ApplicationActivated() | ApplicationDeactivated():
+                await self._refresh_windows(
+                    [
+                        *self._window_ids_for(signal.yabai_process_id),
+                        *self._focused_window_ids(),
+                    ]
+                )
+            case ApplicationFrontSwitched():
+                await self._refresh_windows(
+                    [
+                        *self._window_ids_for(signal.yabai_process_id),
+                        *self._window_ids_for(signal.yabai_recent_process_id),
+                    ]
+                )
+
+    def _focused_window_ids(self) -> list[int]:
+        return [w.id for w in self.windows.values() if w.has_focus]
+
+    def _window_ids_for(self, pid: int) -> list[int]:
+        return [w.id for w in self.windows.values() if w.pid == pid]
+
+    async def _refresh_windows(
+        self, window_ids: Iterable[int], with_spaces: bool = False
+    ) -> None:
+        """
+        Requery windows by id. Their spaces are requeried too when with_spaces is set
+        or when a window turns out to have changed spaces or disappeared, since that
+        changes the spaces' window sets.
+        """
+        window_ids = list(dict.fromkeys(window_ids))
+        windows = await asyncio.gather(*(self.yabai.awindow(w) for w in window_ids))
+        touched_spaces: list[int] = []
+        for window_id, window in zip(window_ids, windows):
+            previous = self.windows.get(window_id)
+            if window is None:
+                self.windows.pop(window_id, None)
+            else:
+                self.windows[window_id] = window
+            if previous and (window is None or window.space != previous.space):
+                touched_spaces.append(previous.space)
+            if window and (
+                with_spaces or previous is None or window.space != previous.space
+            ):
+                touched_spaces.append(window.space)
+        if touched_spaces:
+            await self._refresh_spaces_by_index(*touched_spaces)
+
+    async def _refresh_spaces_by_id(self, *space_ids: int) -> None:
+        # yabai only selects spaces by index, so an unknown id means our index mapping
+        # is out of date and only a resync will fix it.
+        if any(s not in self.spaces for s in space_ids):
+            await self.resync()
+            return
+        space_idxs = [self.spaces[s].index for s in space_ids]
+        await self._refresh_spaces_by_index(*space_idxs)
+        # Switching spaces flips is-visible on every window in both of them
+        for windows in await asyncio.gather(
+            *(self.yabai.awindows(space_idx=s) for s in space_idxs)
+        ):
+            self.windows.update((w.id, w) for w in windows)
+
+    async def _refresh_spaces_by_index(self, *space_idxs: int) -> None:
+        space_idxs = tuple(dict.fromkeys(space_idxs))
+        spaces = await asyncio.gather(*(self.yabai.aspace(s) for s in space_idxs))
+        if any(s is None for s in spaces):
+            return await self._refresh_all_spaces()
+        for space in spaces:
+            self.spaces[space.id] = self._workspace_space(space)
+
+    async def _refresh_all_spaces(self) -> None:
+        self.spaces = {
+            s.id: self._workspace_space(s) for s in await self.yabai.aspaces()
+        }
+
+    def _workspace_space(self, space: Space) -> WorkspaceSpace:
+        return to_workspace_space(space, self.layouts.get(space.id))
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from pathlib import Path
+from typing import IO, List, NamedTuple
+
+from pydantic import TypeAdapter
+
+from ..yabai import Yabai
+from .yabai_events import YabaiSignal
+
+TRACE_VERSION = 1
+
+_signal_adapter: TypeAdapter[YabaiSignal] = TypeAdapter(YabaiSignal)
+
+
+class TraceRecorder:
+    """
+    Writes the signals the server receives and the yabai responses it gets back to a
+    JSON lines file, each stamped with seconds since recording started:
+
+        {"version": 1, "started_at": 1700000000.0}
+        {"t": 0.0012, "signal": {"event_name": "window_moved", ...}}
+        {"t": 0.0513, "command": ["query", "--windows"], "response": "[...]"}
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: IO[str] = self.path.open("w")
+        # Sync yabai calls can come from YabaiBatch's threads
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._write({"version": TRACE_VERSION, "started_at": time.time()})
+
+    def record_signal(self, signal: YabaiSignal) -> None:
+        self._write({"t": self._now(), "signal": signal.model_dump()})
+
+    def record_call(self, command: List[str], response: bytes) -> None:
+        self._write(
+            {
+                "t": self._now(),
+                "command": command,
+                "response": response.decode(errors="replace"),
+            }
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _now(self) -> float:
+        return round(time.monotonic() - self._started, 6)
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+
+class RecordingYabai(Yabai):
+    """Yabai that also hands every command and raw response to a TraceRecorder."""
+
+    def __init__(self, recorder: TraceRecorder, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorder = recorder
+
+    def using_socket_raw(self, command: List[str]) -> bytes:
+        response = super().using_socket_raw(command)
+        self.recorder.record_call(command, response)
+        return response
+
+    async def ausing_socket_raw(self, command: List[str]) -> bytes:
+        response = await super().ausing_socket_raw(command)
+        self.recorder.record_call(command, response)
+        return response
+
+
+class TracedSignal(NamedTuple):
+    t: float
+    signal: YabaiSignal
+
+
+class Trace:
+    """A recorded trace: its signals in order, and every response per command."""
+
+    def __init__(self, path: str | Path):
+        self.signals: list[TracedSignal] = []
+        self.responses: dict[tuple[str, ...], list[tuple[float, bytes]]] = {}
+        with Path(path).open() as f:
+            header = json.loads(next(f))
+            if header.get("version") != TRACE_VERSION:
+                raise ValueError(f"Unsupported trace version {header.get('version')}")
+            for line in f:
+                record = json.loads(line)
+                if "signal" in record:
+                    signal = _signal_adapter.validate_python(record["signal"])
+                    self.signals.append(TracedSignal(record["t"], signal))
+                else:
+                    self.responses.setdefault(tuple(record["command"]), []).append(
+                        (record["t"], record["response"].encode())
+                    )
+
+    @property
+    def duration(self) -> float:
+        return self.signals[-1].t if self.signals else 0.0
+
+
+class ReplayState:
+    """
+    Answers yabai commands the way they were answered at a point in a Trace, for use
+    as a FakeYabai's state. The replayer moves `now` forward as it sends signals.
+
+    Each command gets the last response recorded for it before `now`, or the first
+    one recorded if it hadn't been sent yet by then. Commands the trace never saw
+    get an empty (successful) response.
+    """
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self.now = 0.0
+        self._times = {k: [t for t, _ in v] for k, v in trace.responses.items()}
+
+    def handle(self, args: list[str]) -> bytes:
+        key = tuple(args)
+        if key not in self.trace.responses:
+            return b""
+        i = bisect.bisect_left(self._times[key], self.now)
+        return self.trace.responses[key][max(i - 1, 0)][1]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+
+from ..diff import WorkspacePatch, diff_workspaces
+from ..models import Workspace
+
+
+def workspace_hash(workspace: Workspace) -> str:
+    """
+    Hashes entities in id order, so only content counts: reordering alone doesn't
+    change it, and clients that rebuild the workspace from patches (which can't
+    keep the server's order) get the same hash.
+    """
+    canonical = Workspace(
+        displays=sorted(workspace.displays, key=lambda d: d.id),
+        spaces=sorted(workspace.spaces, key=lambda s: s.id),
+        windows=sorted(workspace.windows, key=lambda w: w.id),
+    )
+    return hashlib.blake2b(
+        canonical.model_dump_json(by_alias=True).encode(), digest_size=8
+    ).hexdigest()
+
+
+class VersionedWorkspace:
+    """
+    The last published workspace, with a sequence number that increases by one for
+    every change, so clients applying patches can tell when they missed one.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.workspace = Workspace(displays=[], spaces=[], windows=[])
+        self.hash = workspace_hash(self.workspace)
+        # Set and replaced by each new seq, waking everything in wait_for_change.
+        # update() is synchronous, so it can't take a Condition's lock to notify.
+        self._changed = asyncio.Event()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.hash}"'
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for a seq other than since, returning whether
+        there is one. A since from before a server restart can be ahead of seq,
+        which counts as changed.
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                while self.seq == since:
+                    await self._changed.wait()
+        except TimeoutError:
+            pass
+        return self.seq != since
+
+    def update(self, workspace: Workspace) -> WorkspacePatch | None:
+        """Publish a new workspace, returning the patch from the previous one or None
+        if nothing changed."""
+        new_hash = workspace_hash(workspace)
+        if new_hash == self.hash:
+            return None
+        patch = diff_workspaces(self.workspace, workspace)
+        if patch.is_empty():
+            return None
+        self.workspace, self.hash = workspace, new_hash
+        self.seq += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return patch
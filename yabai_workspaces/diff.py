@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Generic, Iterable, TypeVar
+
+from pydantic import BaseModel, Field
+
+from .models import Window, Workspace, WorkspaceDisplay, WorkspaceSpace
+
+_M = TypeVar("_M", WorkspaceDisplay, WorkspaceSpace, Window)
+
+
+class CollectionPatch(BaseModel, Generic[_M]):
+    added: list[_M] = Field(default_factory=list)
+    changed: list[_M] = Field(default_factory=list)
+    removed: list[int] = Field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+class WorkspacePatch(BaseModel):
+    """Difference between two workspaces. Entities are matched by yabai id."""
+
+    displays: CollectionPatch[WorkspaceDisplay] = Field(default_factory=CollectionPatch)
+    spaces: CollectionPatch[WorkspaceSpace] = Field(default_factory=CollectionPatch)
+    windows: CollectionPatch[Window] = Field(default_factory=CollectionPatch)
+
+    def is_empty(self) -> bool:
+        return all(p.is_empty() for p in (self.displays, self.spaces, self.windows))
+
+
+def diff_collection(old: Iterable[_M], new: Iterable[_M]) -> CollectionPatch[_M]:
+    old_by_id = {e.id: e for e in old}
+    patch: CollectionPatch[_M] = CollectionPatch()
+    for entity in new:
+        match old_by_id.pop(entity.id, None):
+            case None:
+                patch.added.append(entity)
+            case previous if previous != entity:
+                patch.changed.append(entity)
+    patch.removed = list(old_by_id)
+    return patch
+
+
+def diff_workspaces(old: Workspace, new: Workspace) -> WorkspacePatch:
+    return WorkspacePatch(
+        displays=diff_collection(old.displays, new.displays),
+        spaces=diff_collection(old.spaces, new.spaces),
+        windows=diff_collection(old.windows, new.windows),
+    )
+
+
+def apply_collection(entities: Iterable[_M], patch: CollectionPatch[_M]) -> list[_M]:
+    by_id = {e.id: e for e in entities}
+    for entity_id in patch.removed:
+        by_id.pop(entity_id, None)
+    for entity in (*patch.changed, *patch.added):
+        by_id[entity.id] = entity
+    return list(by_id.values())
+
+
+def apply_patch(workspace: Workspace, patch: WorkspacePatch) -> Workspace:
+    return Workspace(
+        displays=sorted(
+            apply_collection(workspace.displays, patch.displays), key=lambda d: d.index
+        ),
+        spaces=sorted(
+            apply_collection(workspace.spaces, patch.spaces), key=lambda s: s.index
+        ),
+        windows=apply_collection(workspace.windows, patch.windows),
+    )
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+import time
+from typing import List
+
+# Yabai message format: https://github.com/koekeishiya/yabai/issues/1372
+# The length of the message that follows as 4 little endian bytes, then the message
+# with a NUL byte between terms and two trailing NUL bytes.
+_LENGTH = struct.Struct("<I")
+
+# Big enough for most query responses in one go; buffers grow from here as needed
+INITIAL_BUFFER_BYTES = 64 * 1024
+# A `query --windows` response is about 1KB per window, so this is far beyond any
+# real response and only stops a runaway one from eating memory
+MAX_RESPONSE_BYTES = 32 * 1024 * 1024
+
+
+class ResponseTooLarge(RuntimeError):
+    pass
+
+
+def encode_command(command: List[str]) -> bytes:
+    message = ("\0".join(command) + "\0\0").encode()
+    return _LENGTH.pack(len(message)) + message
+
+
+class ResponseBuffer:
+    """
+    Reads a whole yabai response, which ends when yabai closes the connection, into
+    a buffer that's kept between reads. recv_into fills it in place, so the only
+    copy is the final bytes handed to the caller, and UTF-8 is never decoded until
+    the JSON parser sees the complete response.
+
+    A buffer serves one read at a time: give each thread, or each concurrent
+    coroutine, its own.
+    """
+
+    def __init__(
+        self,
+        initial_size: int = INITIAL_BUFFER_BYTES,
+        max_size: int = MAX_RESPONSE_BYTES,
+    ):
+        self._buf = bytearray(min(initial_size, max_size))
+        self.max_size = max_size
+
+    def recv(self, sock: socket.socket, deadline: float | None = None) -> bytes:
+        """
+        Read from a blocking socket until EOF. Raises TimeoutError if the response
+        isn't complete by deadline (a time.monotonic() value).
+        """
+        size = 0
+        while True:
+            self._make_room(size)
+            if deadline is not None:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    raise TimeoutError("Timed out reading yabai response")
+                sock.settimeout(remaining)
+            with memoryview(self._buf) as view:
+                if not (n := sock.recv_into(view[size:])):
+                    return bytes(view[:size])
+            size += n
+
+    async def arecv(self, sock: socket.socket) -> bytes:
+        """
+        Read from a non-blocking socket until EOF. Wrap in asyncio.timeout to bound
+        the wait.
+        """
+        loop = asyncio.get_running_loop()
+        size = 0
+        while True:
+            self._make_room(size)
+            with memoryview(self._buf) as view:
+                if not (n := await loop.sock_recv_into(sock, view[size:])):
+                    return bytes(view[:size])
+            size += n
+
+    def _make_room(self, size: int) -> None:
+        if size < len(self._buf):
+            return
+        if size >= self.max_size:
+            raise ResponseTooLarge(f"yabai response exceeded {self.max_size} bytes")
+        self._buf.extend(bytes(min(len(self._buf), self.max_size - size)))
@@ -1,94 +1,101 @@
-import logging
-from itertools import pairwise, zip_longest
+import asyncio
+from itertools import takewhile
 
-from ..models import (
-    ColumnsLayout,
-    Layout,
-    NoLayout,
-    Space,
-    StackBesideRowsLayout,
-    YabaiManagedLayout,
-)
-from ..utils import partition
-from ..yabai import DirSel, Yabai
+from ..models import Layout, NoLayout, Space, Window
+from ..query_cache import QueryCache
+from ..yabai import Yabai
+from .plan import LayoutCache, LayoutPlan, StepKind, compile_plan, prune_plan
+
+# The Window fields plans and LayoutCache read, so only those are queried
+WINDOW_FIELDS = ("id", "app", "frame", "stack_index")
 
 
 class LayoutHandler:
-    def __init__(self, yabai: Yabai):
+    def __init__(self, yabai: Yabai, cache: LayoutCache | None = None):
         self.yabai = yabai
-
-    def apply(self, layout: Layout, space: Space):
-        # TODO: is this better style or is functools.singledispatch?
-        match layout:
-            case ColumnsLayout():
-                self._apply_columns(layout, space)
-            case NoLayout():
-                pass
-            case StackBesideRowsLayout():
-                self._apply_stack_beside_rows(layout, space)
-            case YabaiManagedLayout():
-                self._apply_yabai_managed(layout, space)
-
-    def _apply_columns(self, layout: ColumnsLayout, space: Space):
-        # TODO: this unstacks stuff. Maybe we shouldn't do this? Maybe have a ColumnsStacks
-        # layout?
-        self.yabai.call(["-m", "config", "--space", str(space.index), "layout", "bsp"])
-        self.yabai.call(
-            ["-m", "config", "--space", str(space.index), "split_type", "vertical"]
-        )
-
-        rows = list(zip_longest(*[iter(space.windows)] * layout.col_count))
-
-        for west, east in pairwise(rows[0]):
-            if not east:
-                continue
-            self.yabai.set_insert_dir(west, DirSel.EAST)
-            self.yabai.warp_window(east, west)
-        for r1, r2 in pairwise(rows):
-            for north, south in zip(r1, r2):
-                if not south:
-                    continue
-                self.yabai.set_insert_dir(north, DirSel.SOUTH)
-                self.yabai.warp_window(south, north)
-
-        self.yabai.balance(space.index)
-
-    def _apply_stack_beside_rows(self, layout: StackBesideRowsLayout, space: Space):
-        self.yabai.call(["-m", "config", "--space", str(space.index), "layout", "bsp"])
-
-        windows = [w for w in self.yabai.windows() if w.id in space.windows]
-        other_ws, main_ws = partition(
-            lambda x: x.app in layout.app_stack_priority, windows
+        self.cache = LayoutCache() if cache is None else cache
+
+    def apply(
+        self,
+        layout: Layout,
+        space: Space,
+        dry_run: bool = False,
+        queries: QueryCache | None = None,
+    ) -> LayoutPlan:
+        """
+        Put space into layout, skipping whatever the space already satisfies. With
+        dry_run, print the plan instead of running it.
+
+        Queries and commands go through queries, the cache of the operation this is
+        part of, or else a cache of its own.
+        """
+        if isinstance(layout, NoLayout):
+            return LayoutPlan([])
+
+        queries = QueryCache(self.yabai) if queries is None else queries
+        windows = self._windows(space, queries)
+        plan = self._plan(layout, space, windows)
+        if dry_run:
+            print(f"# space {space.index}: {layout.layout_type}\n{plan}")
+            return plan
+
+        # Steps build on each other (warps depend on the preceding --insert), so
+        # they have to run in order.
+        for step in plan.steps:
+            queries.call(step.command)
+        self.cache.remember(
+            layout, space, self._windows(space, queries) if plan.steps else windows
         )
-
-        if not main_ws:
-            logging.warn("No matching windows for stack")
-            main_ws, *other_ws = other_ws
-            main_ws = [main_ws]
-
-        main_ws.sort(key=lambda x: layout.app_stack_priority.index(x.app))
-        main_ws, other_ws = ([w.id for w in ws] for ws in (main_ws, other_ws))
-
-        self.yabai.stack_windows(main_ws)
-        self.yabai.call(["-m", "window", str(main_ws[-1]), "--swap", "first"])
-
-        if not other_ws:
-            return
-        self.yabai.set_insert_dir(main_ws[-1], DirSel.EAST)
-
-        rows, overflow = (
-            other_ws[0 : layout.secondary_row_count],
-            other_ws[layout.secondary_row_count :],
+        return plan
+
+    async def aapply(
+        self,
+        layout: Layout,
+        space: Space,
+        dry_run: bool = False,
+        queries: QueryCache | None = None,
+    ) -> LayoutPlan:
+        """
+        Async variant of apply, so layouts for several spaces can be applied
+        concurrently with asyncio.gather.
+        """
+        if isinstance(layout, NoLayout):
+            return LayoutPlan([])
+
+        queries = QueryCache(self.yabai) if queries is None else queries
+        windows = await self._awindows(space, queries)
+        plan = self._plan(layout, space, windows)
+        if dry_run:
+            print(f"# space {space.index}: {layout.layout_type}\n{plan}")
+            return plan
+
+        # Leading config steps only set space options and don't depend on each other
+        config = list(takewhile(lambda s: s.kind == StepKind.CONFIG, plan.steps))
+        await asyncio.gather(*(queries.acall(step.command) for step in config))
+        for step in plan.steps[len(config) :]:
+            await queries.acall(step.command)
+        self.cache.remember(
+            layout,
+            space,
+            await self._awindows(space, queries) if plan.steps else windows,
         )
-        if rows:
-            self.yabai.warp_window(rows[0], main_ws[-1])
-        for north, south in pairwise(rows):
-            self.yabai.set_insert_dir(north, DirSel.SOUTH)
-            self.yabai.warp_window(south, north)
-        self.yabai.stack_windows([w for w in (rows[-1], *overflow)])
-
-        self.yabai.balance(space.index)
-
-    def _apply_yabai_managed(self, layout: YabaiManagedLayout, space: Space):
-        for l in ("float", "bsp"):
-            self.yabai.call(["-m", "config", "--space", str(space.index), "layout", l])
+        return plan
+
+    def _plan(self, layout: Layout, space: Space, windows: list[Window]) -> LayoutPlan:
+        if self.cache.is_applied(layout, space, windows):
+            return LayoutPlan([], tuple(compile_plan(layout, space, windows).steps))
+        return prune_plan(compile_plan(layout, space, windows), layout, space, windows)
+
+    def _windows(self, space: Space, queries: QueryCache) -> list[Window]:
+        return [
+            w
+            for w in queries.windows(space_idx=space.index, fields=WINDOW_FIELDS)
+            if w.id in space.windows
+        ]
+
+    async def _awindows(self, space: Space, queries: QueryCache) -> list[Window]:
+        return [
+            w
+            for w in await queries.awindows(space_idx=space.index, fields=WINDOW_FIELDS)
+            if w.id in space.windows
+        ]
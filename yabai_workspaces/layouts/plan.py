@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import logging
+import shlex
+from enum import Enum
+from itertools import pairwise, zip_longest
+from typing import Iterable, NamedTuple
+
+from ..models import (
+    ColumnsLayout,
+    Layout,
+    NoLayout,
+    Space,
+    SpaceType,
+    StackBesideRowsLayout,
+    Window,
+    YabaiManagedLayout,
+)
+from ..utils import partition
+from ..yabai import DirSel
+
+# Frames yabai reports are in points and can be off by one after balancing an odd
+# width, so treat anything within this as equal.
+FRAME_TOLERANCE = 2.0
+
+
+class StepKind(str, Enum):
+    CONFIG = "config"
+    ARRANGE = "arrange"
+    BALANCE = "balance"
+
+
+class PlanStep(NamedTuple):
+    kind: StepKind
+    command: list[str]
+
+    def __str__(self) -> str:
+        return shlex.join(["yabai", "-m", *self.command])
+
+
+class LayoutPlan(NamedTuple):
+    steps: list[PlanStep]
+    skipped: tuple[PlanStep, ...] = ()
+
+    def __str__(self) -> str:
+        lines = [str(s) for s in self.steps]
+        lines += [f"# already satisfied: {s}" for s in self.skipped]
+        return "\n".join(lines)
+
+
+def compile_plan(layout: Layout, space: Space, windows: Iterable[Window]) -> LayoutPlan:
+    """
+    The yabai commands that put the windows of space into layout, in order. Depends
+    only on its arguments; nothing is queried or run.
+    """
+    windows = [w for w in windows if w.id in space.windows]
+    match layout:
+        case ColumnsLayout():
+            steps = _columns(layout, space, windows)
+        case NoLayout():
+            steps = []
+        case StackBesideRowsLayout():
+            steps = _stack_beside_rows(layout, space, windows)
+        case YabaiManagedLayout():
+            steps = _yabai_managed(space)
+    return LayoutPlan(steps)
+
+
+def prune_plan(
+    plan: LayoutPlan, layout: Layout, space: Space, windows: Iterable[Window]
+) -> LayoutPlan:
+    """Drop the steps whose effect the live space and window frames already show."""
+    windows = {w.id: w for w in windows if w.id in space.windows}
+    satisfied: set[StepKind] = set()
+    match layout:
+        case ColumnsLayout():
+            if space.type == SpaceType.bsp and _columns_arranged(layout, windows):
+                satisfied.update((StepKind.CONFIG, StepKind.ARRANGE))
+            if _columns_balanced(layout, windows):
+                satisfied.add(StepKind.BALANCE)
+        case StackBesideRowsLayout():
+            if space.type == SpaceType.bsp and _stack_beside_rows_arranged(
+                layout, windows
+            ):
+                satisfied.update((StepKind.CONFIG, StepKind.ARRANGE))
+            if _stack_beside_rows_balanced(layout, windows):
+                satisfied.add(StepKind.BALANCE)
+    steps, skipped = partition(lambda s: s.kind in satisfied, plan.steps)
+    return LayoutPlan(steps, (*plan.skipped, *skipped))
+
+
+def plan_insert(
+    layout: Layout, space: Space, windows: Iterable[Window], window_id: int
+) -> LayoutPlan | None:
+    """
+    The steps that move window_id, newly on space, to where layout puts it,
+    assuming the rest of space is already in layout. That takes a fixed handful of
+    steps when the window sorts last (as new windows' ids usually do) and so only
+    extends the arrangement. Otherwise returns None, and the whole layout should be
+    reapplied.
+    """
+    windows = [w for w in windows if w.id in space.windows]
+    match layout:
+        case ColumnsLayout():
+            ids = sorted(w.id for w in windows)
+            if not ids or ids[-1] != window_id:
+                return None
+            if len(ids) == 1:
+                return LayoutPlan([])
+            row, _ = divmod(len(ids) - 1, layout.col_count)
+            # The first row is built west to east, each later row under the one above
+            onto, direction = (
+                (ids[-2], DirSel.EAST)
+                if row == 0
+                else (ids[-1 - layout.col_count], DirSel.SOUTH)
+            )
+            return LayoutPlan(
+                [*_insert_and_warp(onto, window_id, direction), _balance(space)]
+            )
+        case StackBesideRowsLayout():
+            main_ws, other_ws = _split_stack(layout, windows)
+            if not other_ws or other_ws[-1] != window_id:
+                return None
+            rows, overflow = _split_rows(layout, other_ws)
+            if overflow:
+                # Onto the top of the stack that the last row and overflow share
+                return LayoutPlan(_stack([*rows[-1:], *overflow][-2:]))
+            onto, direction = (
+                (main_ws[-1], DirSel.EAST)
+                if len(rows) == 1
+                else (rows[-2], DirSel.SOUTH)
+            )
+            return LayoutPlan(
+                [*_insert_and_warp(onto, window_id, direction), _balance(space)]
+            )
+        case NoLayout() | YabaiManagedLayout():
+            return LayoutPlan([])
+    return None
+
+
+def plan_removal(
+    layout: Layout, space: Space, windows: Iterable[Window], removed: Window
+) -> LayoutPlan | None:
+    """
+    The steps that close the gap removed left in space, assuming space was in
+    layout with it. As with plan_insert, only the window that sorts last can go
+    without rearranging others; for anything else this returns None.
+    """
+    windows = [w for w in windows if w.id in space.windows and w.id != removed.id]
+    match layout:
+        case ColumnsLayout():
+            if any(w.id > removed.id for w in windows):
+                return None
+            # yabai gives the space to the window it was split from, which is where
+            # the layout wants it anyway
+            return LayoutPlan([_balance(space)] if windows else [])
+        case StackBesideRowsLayout():
+            main_ws, other_ws = _split_stack(layout, [*windows, removed])
+            if not other_ws or other_ws[-1] != removed.id:
+                return None
+            _, overflow = _split_rows(layout, other_ws)
+            # Leaving a stack doesn't change any frames; leaving a row does
+            return LayoutPlan([] if overflow else [_balance(space)])
+        case NoLayout() | YabaiManagedLayout():
+            return LayoutPlan([])
+    return None
+
+
+def _columns(
+    layout: ColumnsLayout, space: Space, windows: list[Window]
+) -> list[PlanStep]:
+    idx = str(space.index)
+    steps = [
+        PlanStep(StepKind.CONFIG, ["config", "--space", idx, "layout", "bsp"]),
+        PlanStep(StepKind.CONFIG, ["config", "--space", idx, "split_type", "vertical"]),
+    ]
+    rows = _column_rows(layout, (w.id for w in windows))
+    for west, east in pairwise(rows[0] if rows else ()):
+        if not east:
+            continue
+        steps += _insert_and_warp(west, east, DirSel.EAST)
+    for r1, r2 in pairwise(rows):
+        for north, south in zip(r1, r2):
+            if not south:
+                continue
+            steps += _insert_and_warp(north, south, DirSel.SOUTH)
+    steps.append(PlanStep(StepKind.BALANCE, ["space", idx, "--balance"]))
+    return steps
+
+
+def _stack_beside_rows(
+    layout: StackBesideRowsLayout, space: Space, windows: list[Window]
+) -> list[PlanStep]:
+    idx = str(space.index)
+    steps = [PlanStep(StepKind.CONFIG, ["config", "--space", idx, "layout", "bsp"])]
+    if not windows:
+        return steps
+
+    if not any(w.app in layout.app_stack_priority for w in windows):
+        logging.warn("No matching windows for stack")
+    main_ws, other_ws = _split_stack(layout, windows)
+    steps += _stack(main_ws)
+    steps.append(
+        PlanStep(StepKind.ARRANGE, ["window", str(main_ws[-1]), "--swap", "first"])
+    )
+    if not other_ws:
+        return steps
+
+    rows, overflow = _split_rows(layout, other_ws)
+    steps += _insert_and_warp(main_ws[-1], rows[0], DirSel.EAST)
+    for north, south in pairwise(rows):
+        steps += _insert_and_warp(north, south, DirSel.SOUTH)
+    steps += _stack([rows[-1], *overflow])
+    steps.append(PlanStep(StepKind.BALANCE, ["space", idx, "--balance"]))
+    return steps
+
+
+def _yabai_managed(space: Space) -> list[PlanStep]:
+    # Toggling through float throws away the tree so yabai rebuilds it from scratch
+    return [
+        PlanStep(StepKind.ARRANGE, ["config", "--space", str(space.index), "layout", l])
+        for l in ("float", "bsp")
+    ]
+
+
+def _column_rows(
+    layout: ColumnsLayout, window_ids: Iterable[int]
+) -> list[tuple[int | None, ...]]:
+    return list(zip_longest(*[iter(sorted(window_ids))] * layout.col_count))
+
+
+def _split_stack(
+    layout: StackBesideRowsLayout, windows: list[Window]
+) -> tuple[list[int], list[int]]:
+    """Window ids of the main stack, bottom to top, and of everything else."""
+    windows = sorted(windows, key=lambda w: w.id)
+    other_ws, main_ws = partition(lambda x: x.app in layout.app_stack_priority, windows)
+    if not main_ws:
+        main_ws, other_ws = other_ws[:1], other_ws[1:]
+    else:
+        main_ws.sort(key=lambda x: layout.app_stack_priority.index(x.app))
+    return [w.id for w in main_ws], [w.id for w in other_ws]
+
+
+def _split_rows(
+    layout: StackBesideRowsLayout, other_ws: list[int]
+) -> tuple[list[int], list[int]]:
+    return (
+        other_ws[: layout.secondary_row_count],
+        other_ws[layout.secondary_row_count :],
+    )
+
+
+def _insert_and_warp(onto: int, warp: int, direction: DirSel) -> list[PlanStep]:
+    return [
+        PlanStep(StepKind.ARRANGE, ["window", str(onto), "--insert", direction.value]),
+        PlanStep(StepKind.ARRANGE, ["window", str(warp), "--warp", str(onto)]),
+    ]
+
+
+def _balance(space: Space) -> PlanStep:
+    return PlanStep(StepKind.BALANCE, ["space", str(space.index), "--balance"])
+
+
+def _stack(window_ids: list[int]) -> list[PlanStep]:
+    return [
+        PlanStep(StepKind.ARRANGE, ["window", str(w1), "--stack", str(w2)])
+        for w1, w2 in pairwise(window_ids)
+    ]
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= FRAME_TOLERANCE
+
+
+def _same_frame(a: Window, b: Window) -> bool:
+    return all(
+        _close(getattr(a.frame, f), getattr(b.frame, f)) for f in ("x", "y", "w", "h")
+    )
+
+
+def _columns_arranged(layout: ColumnsLayout, windows: dict[int, Window]) -> bool:
+    rows = _column_rows(layout, windows)
+    if not rows:
+        return True
+    first_row = [windows[w] for w in rows[0] if w]
+    if any(a.frame.x >= b.frame.x for a, b in pairwise(first_row)):
+        return False
+    for column in zip(*rows):
+        column = [windows[w] for w in column if w]
+        if any(not _close(c.frame.x, column[0].frame.x) for c in column):
+            return False
+        if any(a.frame.y >= b.frame.y for a, b in pairwise(column)):
+            return False
+    return True
+
+
+def _columns_balanced(layout: ColumnsLayout, windows: dict[int, Window]) -> bool:
+    rows = _column_rows(layout, windows)
+    if not rows:
+        return True
+    widths = [windows[w].frame.w for w in rows[0] if w]
+    if any(not _close(w, widths[0]) for w in widths):
+        return False
+    for column in zip(*rows):
+        heights = [windows[w].frame.h for w in column if w]
+        if any(not _close(h, heights[0]) for h in heights):
+            return False
+    return True
+
+
+def _stack_beside_rows_arranged(
+    layout: StackBesideRowsLayout, windows: dict[int, Window]
+) -> bool:
+    if not windows:
+        return True
+    main_ws, other_ws = _split_stack(layout, list(windows.values()))
+    main = [windows[w] for w in main_ws]
+    if any(not _same_frame(w, main[0]) for w in main):
+        return False
+    # Stack indexes count up in the order windows were stacked
+    if (
+        len(main) > 1
+        and [w.id for w in sorted(main, key=lambda w: w.stack_index)] != main_ws
+    ):
+        return False
+    if not other_ws:
+        return True
+
+    rows, overflow = _split_rows(layout, other_ws)
+    row_ws = [windows[w] for w in rows]
+    if any(r.frame.x <= main[0].frame.x for r in row_ws):
+        return False
+    if any(not _close(r.frame.x, row_ws[0].frame.x) for r in row_ws):
+        return False
+    if any(a.frame.y >= b.frame.y for a, b in pairwise(row_ws)):
+        return False
+    return all(_same_frame(windows[w], row_ws[-1]) for w in overflow)
+
+
+def _stack_beside_rows_balanced(
+    layout: StackBesideRowsLayout, windows: dict[int, Window]
+) -> bool:
+    main_ws, other_ws = _split_stack(layout, list(windows.values()))
+    if not other_ws:
+        return True
+    rows, _ = _split_rows(layout, other_ws)
+    main, row_ws = windows[main_ws[-1]], [windows[w] for w in rows]
+    return _close(main.frame.w, row_ws[0].frame.w) and all(
+        _close(r.frame.h, row_ws[0].frame.h) for r in row_ws
+    )
+
+
+class LayoutCache:
+    """
+    Remembers the window frames a layout left a space in, so applying the same
+    layout to the same windows again is a no-op until something moves them.
+    """
+
+    def __init__(self):
+        self._applied: dict[tuple, tuple] = {}
+
+    def is_applied(self, layout: Layout, space: Space, windows: list[Window]) -> bool:
+        return self._applied.get(self._key(layout, space, windows)) == (
+            self._fingerprint(windows)
+        )
+
+    def remember(self, layout: Layout, space: Space, windows: list[Window]) -> None:
+        self._applied[self._key(layout, space, windows)] = self._fingerprint(windows)
+
+    def _key(self, layout: Layout, space: Space, windows: list[Window]) -> tuple:
+        return (space.id, frozenset(w.id for w in windows), layout.model_dump_json())
+
+    def _fingerprint(self, windows: list[Window]) -> tuple:
+        return tuple(
+            sorted(
+                (w.id, w.frame.x, w.frame.y, w.frame.w, w.frame.h, w.stack_index)
+                for w in windows
+            )
+        )
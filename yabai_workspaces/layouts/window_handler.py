@@ -3,10 +3,14 @@ import os
 import re
 import subprocess
 from abc import ABC, abstractmethod
-from typing import Any
+from collections import defaultdict
+from typing import Any, Callable, Iterable, List
 
 from ..models import Window
 
+# Takes an argv list and returns the process's stdout, raising if it fails
+Runner = Callable[[List[str]], bytes]
+
 
 class WindowHandler(ABC):
     name: str
@@ -22,49 +26,103 @@ class WindowHandler(ABC):
     def will_restore(self, saved: dict[str, Any]) -> None:
         pass
 
+    def will_save_many(self, wins: Iterable[Window]) -> dict[int, dict[str, Any]]:
+        """will_save for several windows, keyed by window id. Override to batch."""
+        return {w.id: data for w in wins if (data := self.will_save(w))}
+
+    def will_restore_many(self, saved: Iterable[dict[str, Any]]) -> None:
+        """will_restore for several windows. Override to batch."""
+        for data in saved:
+            self.will_restore(data)
+
+
+# Bulk property reads (windows.tabs.url() etc.) are one Apple Event each, rather
+# than one per window or tab.
+CAPTURE_TABS = """\
+function run() {
+    const windows = Application("Google Chrome").windows;
+    const titles = windows.title();
+    const tabTitles = windows.tabs.title();
+    const tabUrls = windows.tabs.url();
+    return JSON.stringify(titles.map((title, i) => ({
+        title,
+        tabs: tabUrls[i].map((url, j) => ({title: tabTitles[i][j], url})),
+    })));
+}
+"""
+
+# argv[0] is a JSON list with one list of URLs per window to open
+RESTORE_TABS = """\
+function run(argv) {
+    const chrome = Application("Google Chrome");
+    for (const urls of JSON.parse(argv[0])) {
+        const win = chrome.Window().make();
+        urls.forEach((url, i) => {
+            if (i === 0) {
+                win.tabs[0].url = url;
+            } else {
+                win.tabs.push(chrome.Tab({url}));
+            }
+        });
+    }
+    chrome.activate();
+}
+"""
+
 
 class ChromeHandler(WindowHandler):
     # TODO: don't set up shell stuff in multiple places
-    def __init__(self):
+    def __init__(self, run: Runner | None = None):
         self.name = "ChromeHandler"
         self.env = {
             **os.environ,
             "PATH": f"/bin:/usr/bin:/usr/local/bin:/opt/homebrew/bin",
         }
+        self.run = run or self._check_output
 
     def will_save(self, win: Window) -> dict[str, Any] | None:
-        if win.app != "Google Chrome":
-            return None
-        return {"tabs": self.capture_tabs(win)}
+        return self.will_save_many([win]).get(win.id)
+
+    def will_save_many(self, wins: Iterable[Window]) -> dict[int, dict[str, Any]]:
+        wins = [w for w in wins if w.app == "Google Chrome"]
+        if not wins:
+            return {}
+        return {
+            win_id: {"tabs": tabs} for win_id, tabs in self.capture_tabs(wins).items()
+        }
 
     def will_restore(self, saved: dict[str, Any]) -> None:
+        self.will_restore_many([saved])
+
+    def will_restore_many(self, saved: Iterable[dict[str, Any]]) -> None:
         # TODO: handle case where window already has open tabs. Need to first
         # determine what contract between handler and layout is regarding
         # reusing existing windows.
-        open_commands = "\n".join([f'open location "{t}"' for t in saved["tabs"]])
-        restore_tabs = f"""\
-            tell application "Google Chrome"
-                make new window
-                activate
-                {open_commands}
-            end tell
-        """
-        subprocess.check_call(["osascript", "-e", restore_tabs], env=self.env)
-
-    def capture_tabs(self, win: Window):
-        # Window titles are <Title> — Google Chrome — <Profile|(Incognito)>
-        # but Chrome reports them without the app and profile in osacript.
-        win_title = re.sub(r" - Google Chrome.+$", "", win.title)
-        fetch_tabs = f"""\
-            JSON.stringify(Application("Google Chrome")
-                .windows()
-                .find(w => w.title() === "{win_title}")
-                .tabs()
-                .map(t => ({{title: t.title(), url: t.url()}})));
-        """
-        return json.loads(
-            subprocess.check_output(
-                ["osascript", "-l", "JavaScript", "-e", fetch_tabs],
-                env=self.env,
-            )
+        windows = [[t["url"] for t in s["tabs"]] for s in saved if s["tabs"]]
+        if not windows:
+            return
+        self.run(
+            ["osascript", "-l", "JavaScript", "-e", RESTORE_TABS, json.dumps(windows)]
         )
+
+    def capture_tabs(self, wins: Iterable[Window]) -> dict[int, list[dict[str, str]]]:
+        """Tabs of each Chrome window, keyed by yabai window id, from one script run."""
+        chrome_windows = json.loads(
+            self.run(["osascript", "-l", "JavaScript", "-e", CAPTURE_TABS])
+        )
+        # Titles are all yabai and Chrome have in common. Several windows can share
+        # one, so hand out same-titled windows in the order each side lists them.
+        by_title: dict[str, list[list[dict[str, str]]]] = defaultdict(list)
+        for w in chrome_windows:
+            by_title[w["title"]].append(w["tabs"])
+        tabs = {}
+        for win in wins:
+            # Window titles are <Title> — Google Chrome — <Profile|(Incognito)>
+            # but Chrome reports them without the app and profile in osacript.
+            win_title = re.sub(r" - Google Chrome.+$", "", win.title)
+            if by_title[win_title]:
+                tabs[win.id] = by_title[win_title].pop(0)
+        return tabs
+
+    def _check_output(self, args: List[str]) -> bytes:
+        return subprocess.check_output(args, env=self.env)
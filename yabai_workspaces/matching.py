@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Iterable, List, NamedTuple, Sequence
+
+from .models import Window
+
+# Matches scoring below this are reported as unmatched rather than guessed at. Same
+# app, role and subrole alone score 0.3 (see _confidence), so a match also needs
+# something the two windows share: title words, the exact title or the pid.
+MIN_CONFIDENCE = 0.35
+# Matches scoring below this are still used, but called out in the report
+LOW_CONFIDENCE = 0.6
+
+# The Window fields matching reads, for querying live windows with fields=
+MATCH_FIELDS = ("id", "pid", "app", "title", "role", "subrole")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def title_tokens(title: str, app: str = "") -> frozenset[str]:
+    """
+    Lowercased words of a window title, minus the words of its app name, which many
+    apps append to every title ("README.md — Visual Studio Code").
+    """
+
+    def words(s: str) -> set[str]:
+        return set(_TOKEN.findall(unicodedata.normalize("NFKC", s).casefold()))
+
+    return frozenset(words(title) - words(app))
+
+
+class WindowMatch(NamedTuple):
+    saved: Window
+    live: Window
+    confidence: float
+
+
+class MatchResult(NamedTuple):
+    matches: List[WindowMatch]
+    unmatched_saved: List[Window]
+    unmatched_live: List[Window]
+
+    def id_map(self) -> dict[int, int]:
+        """Saved window id -> live window id."""
+        return {m.saved.id: m.live.id for m in self.matches}
+
+    def __str__(self) -> str:
+        total = len(self.matches) + len(self.unmatched_saved)
+        lines = [f"Matched {len(self.matches)} of {total} saved windows"]
+        for m in sorted(self.matches, key=lambda m: m.confidence):
+            if m.confidence >= LOW_CONFIDENCE:
+                break
+            lines.append(
+                f"  low confidence ({m.confidence:.2f}): {m.saved.app} {m.saved.title!r}"
+                f" -> {m.live.title!r}"
+            )
+        for w in self.unmatched_saved:
+            lines.append(f"  not found: {w.app} {w.title!r}")
+        return "\n".join(lines)
+
+
+class WindowIndex:
+    """
+    Live windows bucketed by app, with an inverted index from title tokens to the
+    windows whose titles contain them, so scoring a saved window only touches live
+    windows of the same app and only counts tokens they actually share.
+    """
+
+    def __init__(self, windows: Iterable[Window]):
+        self.by_app: dict[str, List[Window]] = defaultdict(list)
+        self.tokens: dict[int, frozenset[str]] = {}
+        self._postings: dict[tuple[str, str], List[int]] = defaultdict(list)
+        for window in windows:
+            self.by_app[window.app].append(window)
+            self.tokens[window.id] = title_tokens(window.title, window.app)
+            for token in self.tokens[window.id]:
+                self._postings[(window.app, token)].append(window.id)
+
+    def shared_tokens(self, saved: Window) -> Counter[int]:
+        """Live window id -> how many title tokens it shares with saved."""
+        shared: Counter[int] = Counter()
+        for token in title_tokens(saved.title, saved.app):
+            shared.update(self._postings.get((saved.app, token), ()))
+        return shared
+
+    def scores(self, saved: Sequence[Window]) -> List[List[float]]:
+        """Confidence of each saved window against each live window of its app."""
+        live = self.by_app[saved[0].app]
+        column = {w.id: j for j, w in enumerate(live)}
+        rows = []
+        for s in saved:
+            tokens = title_tokens(s.title, s.app)
+            shared = self.shared_tokens(s)
+            row = []
+            for w in live:
+                overlap = shared.get(w.id, 0)
+                union = len(tokens) + len(self.tokens[w.id]) - overlap
+                row.append(_confidence(s, w, overlap / union if union else 1.0))
+            # A window that kept its id is the same window, within one login at least
+            if s.id in column:
+                row[column[s.id]] = 1.0
+            rows.append(row)
+        return rows
+
+
+def _confidence(saved: Window, live: Window, title_similarity: float) -> float:
+    """
+    Same app is a given by the time this is called, and worth the base 0.2. Titles
+    carry the most weight since they're the only thing likely to survive a restart.
+    """
+    score = 0.2 + 0.5 * title_similarity
+    score += 0.05 * (saved.role == live.role) + 0.05 * (saved.subrole == live.subrole)
+    score += 0.1 * (saved.title == live.title)
+    score += 0.1 * (saved.pid == live.pid)
+    return round(score, 4)
+
+
+def match_windows(
+    saved: Iterable[Window],
+    live: Iterable[Window],
+    min_confidence: float = MIN_CONFIDENCE,
+) -> MatchResult:
+    """
+    Pair saved windows with live ones, maximizing total confidence across each app's
+    windows at once rather than greedily, so one window taking another's best match
+    can't cascade into worse pairings for the rest.
+    """
+    live = list(live)
+    index = WindowIndex(live)
+    matches: List[WindowMatch] = []
+    unmatched_saved: List[Window] = []
+
+    by_app: dict[str, List[Window]] = defaultdict(list)
+    for window in saved:
+        by_app[window.app].append(window)
+    for app, app_saved in by_app.items():
+        app_live = index.by_app.get(app, [])
+        if not app_live:
+            unmatched_saved += app_saved
+            continue
+        scores = index.scores(app_saved)
+        paired = set()
+        for i, j in assign(scores):
+            if scores[i][j] >= min_confidence:
+                matches.append(WindowMatch(app_saved[i], app_live[j], scores[i][j]))
+                paired.add(i)
+        unmatched_saved += [w for i, w in enumerate(app_saved) if i not in paired]
+
+    matched_live = {m.live.id for m in matches}
+    unmatched_live = [w for w in live if w.id not in matched_live]
+    return MatchResult(matches, unmatched_saved, unmatched_live)
+
+
+def assign(scores: List[List[float]]) -> List[tuple[int, int]]:
+    """
+    The (row, column) pairs that maximize the total score, each row and column used
+    at most once. Hungarian algorithm with potentials, O(n²m) for n ≤ m; the matrix
+    is transposed when it has more rows than columns.
+    """
+    if not scores or not scores[0]:
+        return []
+    if len(scores) > len(scores[0]):
+        return [(i, j) for j, i in assign([list(c) for c in zip(*scores)])]
+
+    n, m = len(scores), len(scores[0])
+    inf = float("inf")
+    # 1-indexed, with row/column 0 as the virtual start of each augmenting path
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    row_of = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        row_of[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while row_of[j0]:
+            used[j0] = True
+            i0, delta, j1 = row_of[j0], inf, 0
+            cost_row = scores[i0 - 1]
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                # Minimizing the negated score maximizes the score
+                cur = -cost_row[j - 1] - u[i0] - v[j]
+                if cur < minv[j]:
+                    minv[j], way[j] = cur, j0
+                if minv[j] < delta:
+                    delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[row_of[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+        while j0:
+            j1 = way[j0]
+            row_of[j0] = row_of[j1]
+            j0 = j1
+    return [(row_of[j] - 1, j - 1) for j in range(1, m + 1) if row_of[j]]
@@ -113,6 +113,19 @@ class Window(BaseModel):
         populate_by_name = True
 
 
+class RegisteredSignal(BaseModel):
+    """An entry in `yabai -m signal --list`."""
+
+    index: NonNegativeInt
+    label: str
+    event: str
+    action: str
+    # Filters the signal was added with, if any
+    app: str = ""
+    title: str = ""
+    active: bool | None = None
+
+
 class WorkspaceDisplay(Display):
     layout: Layout | None = None
 
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from functools import cache
+from typing import Iterable, Type, TypeVar
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+from .models import Display, RegisteredSignal, Space, Window
+
+_M = TypeVar("_M", Display, RegisteredSignal, Space, Window)
+
+# Building a TypeAdapter compiles a validator, so do it once per model
+_list_adapters: dict[type, TypeAdapter] = {
+    m: TypeAdapter(list[m]) for m in (Display, RegisteredSignal, Space, Window)
+}
+
+
+def parse_many(model: Type[_M], data: bytes) -> list[_M]:
+    """
+    Parse a yabai query response straight from the socket bytes, letting
+    pydantic-core validate the JSON without building intermediate dicts.
+    """
+    if not data:
+        return []
+    if (adapter := _list_adapters.get(model)) is None:
+        # A partial model; there's one per distinct projection, so few of these
+        adapter = _list_adapters[model] = TypeAdapter(list[model])
+    return adapter.validate_json(data)
+
+
+def parse_one(model: Type[_M], data: bytes) -> _M | None:
+    if not data:
+        return None
+    return model.model_validate_json(data)
+
+
+def partial_model(model: Type[_M], fields: Iterable[str]) -> Type[_M]:
+    """
+    A model with just the given fields of model (by attribute name), validated the
+    same way, for parsing projected queries such as `query --windows id,app`.
+    Instances only have those attributes, so pass them only to code that reads
+    nothing else. Each distinct set of fields builds its model once.
+    """
+    return _partial_model(model, tuple(sorted(set(fields))))
+
+
+@cache
+def _partial_model(model: Type[BaseModel], fields: tuple[str, ...]) -> Type[BaseModel]:
+    if unknown := [f for f in fields if f not in model.model_fields]:
+        raise ValueError(f"{model.__name__} has no fields {unknown}")
+    return create_model(
+        f"Partial{model.__name__}",
+        __config__=ConfigDict(populate_by_name=True),
+        **{
+            f: (model.model_fields[f].annotation, model.model_fields[f]) for f in fields
+        },
+    )
+
+
+def projection(model: Type[BaseModel]) -> str:
+    """The comma-separated yabai property list that selects model's fields."""
+    return ",".join(f.alias or name for name, f in model.model_fields.items())
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Sequence
+
+from .yabai import CallResult, Queries, Yabai
+
+ENTITIES = frozenset({"displays", "spaces", "windows", "signals"})
+
+
+def query_entity(cmd: List[str]) -> str:
+    """Which kind of entity a query command reads."""
+    return "signals" if cmd[0] == "signal" else cmd[1].removeprefix("--")
+
+
+def affected_entities(cmd: List[str]) -> frozenset[str]:
+    """
+    The kinds of entity whose query results a command may change. Commands this
+    doesn't recognise are assumed to change everything.
+    """
+    match cmd:
+        case ["query", *_] | ["signal", "--list"]:
+            return frozenset()
+        case ["signal", *_]:
+            return frozenset({"signals"})
+        # Moving a window changes its space's window list (and the display's)
+        case ["window", _, "--space" | "--display", *_]:
+            return frozenset({"windows", "spaces"})
+        # Focus changes has-focus on a space and a display as well
+        case ["window", _, "--focus", *_]:
+            return frozenset({"windows", "spaces", "displays"})
+        # Stacking, warping, resizing and the rest only move frames around
+        case ["window", *_]:
+            return frozenset({"windows"})
+        case ["space", _, "--label", *_]:
+            return frozenset({"spaces"})
+        case ["space", _, "--balance" | "--rotate" | "--mirror", *_]:
+            return frozenset({"windows"})
+        # Layout, padding and gaps change the space and rearrange its windows
+        case ["config", "--space", *_]:
+            return frozenset({"spaces", "windows"})
+    return ENTITIES
+
+
+class QueryCache(Queries):
+    """
+    Query results for the length of one operation, such as applying a layout or
+    restoring a workspace. Repeated queries are answered from memory, and
+    concurrent identical async queries share one round trip. Commands sent through
+    the cache drop the results they may have changed (see affected_entities), so
+    send an operation's commands through it too:
+
+        queries = QueryCache(yabai)
+        windows = queries.windows(space_idx=2)
+        queries.call(["window", str(windows[0].id), "--space", "3"])
+        queries.windows(space_idx=2)  # queried again
+
+    Raw responses are cached, so every caller gets freshly parsed models it can
+    change freely. Changes made by anything other than this cache, the user
+    included, aren't seen, which is why a cache shouldn't outlive the operation it
+    was made for.
+    """
+
+    def __init__(self, yabai: Yabai):
+        self.yabai = yabai
+        self._results: dict[str, dict[tuple[str, ...], bytes]] = {}
+        self._pending: dict[str, dict[tuple[str, ...], asyncio.Future[bytes]]] = {}
+        # Bumped by every invalidation, so a query that was in flight at the time
+        # isn't cached
+        self._generations: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def query_raw(self, cmd: List[str]) -> bytes:
+        results = self._results.setdefault(query_entity(cmd), {})
+        if (resp := results.get(key := tuple(cmd))) is None:
+            self.misses += 1
+            resp = results[key] = self.yabai.query_raw(cmd)
+        else:
+            self.hits += 1
+        return resp
+
+    async def aquery_raw(self, cmd: List[str]) -> bytes:
+        entity, key = query_entity(cmd), tuple(cmd)
+        if (resp := self._results.get(entity, {}).get(key)) is not None:
+            self.hits += 1
+            return resp
+        pending = self._pending.setdefault(entity, {})
+        if (future := pending.get(key)) is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        generation = self._generations.get(entity, 0)
+        future = pending[key] = asyncio.ensure_future(self.yabai.aquery_raw(cmd))
+        try:
+            resp = await asyncio.shield(future)
+        finally:
+            if pending.get(key) is future:
+                del pending[key]
+        if self._generations.get(entity, 0) == generation:
+            self._results.setdefault(entity, {})[key] = resp
+        return resp
+
+    def invalidate(self, entities: frozenset[str] = ENTITIES) -> None:
+        for entity in entities:
+            self._results.pop(entity, None)
+            self._pending.pop(entity, None)
+            self._generations[entity] = self._generations.get(entity, 0) + 1
+
+    def call(self, cmd: List[str], ignore_error: bool = True):
+        try:
+            return self.yabai.call(cmd, ignore_error=ignore_error)
+        finally:
+            self.invalidate(affected_entities(cmd))
+
+    async def acall(self, cmd: List[str]):
+        try:
+            return await self.yabai.acall(cmd)
+        finally:
+            self.invalidate(affected_entities(cmd))
+
+    def call_many(
+        self, commands: Sequence[List[str]], max_in_flight: int = 10
+    ) -> List[CallResult]:
+        try:
+            return self.yabai.call_many(commands, max_in_flight)
+        finally:
+            self.invalidate(frozenset().union(*map(affected_entities, commands)))
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Iterable, List, Literal, NamedTuple
+
+from .models import Space, Window, Workspace
+from .utils import ordered_groupby
+
+# The Space fields space reconciliation and labelling read from live spaces, for
+# querying them with fields=
+SPACE_FIELDS = ("index", "display", "label")
+
+
+class RestoreSummary(NamedTuple):
+    spaces_created: int = 0
+    spaces_moved: int = 0
+    spaces_destroyed: int = 0
+    spaces_kept: int = 0
+    labels_set: int = 0
+    labels_kept: int = 0
+    windows_moved: int = 0
+    windows_kept: int = 0
+    windows_missing: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"Spaces: {self.spaces_kept} kept, {self.spaces_created} created,"
+            f" {self.spaces_moved} moved, {self.spaces_destroyed} destroyed\n"
+            f"Labels: {self.labels_kept} kept, {self.labels_set} set\n"
+            f"Windows: {self.windows_kept} already in place, {self.windows_moved} moved,"
+            f" {self.windows_missing} not found"
+        )
+
+
+class SpaceOp(NamedTuple):
+    # The RestoreSummary counter this op adds to
+    kind: Literal["spaces_created", "spaces_moved", "spaces_destroyed"]
+    commands: List[List[str]]
+
+
+def space_counts(spaces: Iterable[Space]) -> Counter[int]:
+    return Counter(s.display for s in spaces)
+
+
+def next_space_op(
+    live_spaces: List[Space], workspace: Workspace, displays: set[int]
+) -> SpaceOp | None:
+    """
+    The next commands that bring the number of spaces on each display closer to the
+    workspace's, or None once they match. Space indexes shift after every change, so
+    callers should requery spaces between commands.
+
+    Spaces move from displays with too many to displays with too few before any are
+    created or destroyed, and only the last space on a display is ever moved or
+    destroyed. Displays the workspace doesn't mention are left alone.
+    """
+    wanted = {d: c for d, c in space_counts(workspace.spaces).items() if d in displays}
+    live = space_counts(live_spaces)
+    surplus = [d for d, c in wanted.items() if live[d] > c]
+    deficit = [d for d, c in wanted.items() if live[d] < c]
+    by_display = ordered_groupby(
+        live_spaces, sortkeyby=lambda s: s.display, sortvaluesby=lambda s: s.index
+    )
+
+    if surplus and deficit:
+        last = by_display[surplus[0]][-1]
+        return SpaceOp(
+            "spaces_moved", [["space", str(last.index), "--display", str(deficit[0])]]
+        )
+    if deficit:
+        # Spaces are created on the focused display
+        return SpaceOp(
+            "spaces_created",
+            [["display", "--focus", str(deficit[0])], ["space", "--create"]],
+        )
+    if surplus:
+        last = by_display[surplus[0]][-1]
+        return SpaceOp("spaces_destroyed", [["space", str(last.index), "--destroy"]])
+    return None
+
+
+def kept_space_count(
+    live_spaces: List[Space], workspace: Workspace, displays: set[int]
+) -> int:
+    live = space_counts(live_spaces)
+    return sum(
+        min(live[d], c)
+        for d, c in space_counts(workspace.spaces).items()
+        if d in displays
+    )
+
+
+def plan_labels(
+    live_spaces: List[Space], workspace: Workspace, displays: set[int]
+) -> tuple[List[List[str]], int]:
+    """
+    Label commands for spaces whose label differs, and how many already match.
+    Spaces saved on displays that aren't connected are skipped, since whatever
+    space now has their index isn't theirs.
+    """
+    live = {s.index: s for s in live_spaces}
+    commands: List[List[str]] = []
+    kept = 0
+    for space in workspace.spaces:
+        if space.display not in displays or space.index not in live:
+            continue
+        if live[space.index].label == space.label:
+            kept += 1
+        else:
+            commands.append(["space", str(space.index), "--label", space.label])
+    return commands, kept
+
+
+def plan_window_moves(
+    live_windows: List[Window],
+    workspace: Workspace,
+    id_map: dict[int, int],
+    displays: set[int],
+) -> tuple[List[List[str]], int, int]:
+    """
+    Move commands for saved windows that aren't on their saved space, how many
+    already are, and how many have no live match. id_map maps saved window ids to
+    the live windows they were matched with. As with plan_labels, windows saved on
+    spaces of displays that aren't connected are skipped.
+    """
+    live = {w.id: w for w in live_windows}
+    commands: List[List[str]] = []
+    kept = missing = 0
+    for space in workspace.spaces:
+        if space.display not in displays:
+            continue
+        for window_id in sorted(space.windows):
+            if (live_id := id_map.get(window_id)) not in live:
+                missing += 1
+            elif live[live_id].space == space.index:
+                kept += 1
+            else:
+                commands.append(["window", str(live_id), "--space", str(space.index)])
+    return commands, kept, missing
@@ -1,9 +1,13 @@
+import argparse
+import asyncio
 import sys
+import time
 
 from pydantic import BaseModel, PositiveInt
 from yabai_workspaces.models import Layout
 from yabai_workspaces.yabai import Yabai
 from yabai_workspaces.layouts.layout_handler import LayoutHandler
+from yabai_workspaces.query_cache import QueryCache
 
 import logging
 
@@ -15,6 +19,7 @@ class ApplyLayoutArgs(BaseModel):
 def main():
     """
     Given a single argument of a JSON string mapping space indexes to layouts, applies the layouts.
+    Pass --dry-run to print the yabai commands instead of running them.
 
     Example:
 
@@ -35,20 +40,48 @@ def main():
           }
         }'
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("layouts")
+    parser.add_argument("--dry-run", action="store_true")
+    cli_args = parser.parse_args()
     try:
-        args = ApplyLayoutArgs.parse_raw(sys.argv[1])
+        args = ApplyLayoutArgs.parse_raw(cli_args.layouts)
     except Exception as e:
-        raise ValueError(f"Unparseable input json: {sys.argv[1]}") from e
+        raise ValueError(f"Unparseable input json: {cli_args.layouts}") from e
 
-    yabai = Yabai()
-    spaces = {space.index: space for space in yabai.spaces()}
-    layout_handler = LayoutHandler(yabai)
+    asyncio.run(apply_layouts(args, cli_args.dry_run))
 
-    for space_idx, layout in args.spaces.items():
-        try:
-            layout_handler.apply(layout, spaces[space_idx])
-        except IndexError:
+
+async def apply_layouts(
+    args: ApplyLayoutArgs,
+    dry_run: bool = False,
+    yabai: Yabai | None = None,
+    layout_handler: LayoutHandler | None = None,
+) -> None:
+    """
+    Apply each layout to its space. scripts/layout_daemon.py passes in a long-lived
+    yabai and layout_handler, so its cache of applied layouts carries over. Queries
+    are only cached for the length of this call.
+    """
+    yabai = yabai or Yabai()
+    layout_handler = layout_handler or LayoutHandler(yabai)
+    queries = QueryCache(yabai)
+
+    async def apply(space_idx: int, layout: Layout) -> None:
+        # Only the spaces being laid out are queried, not every space
+        if (space := await queries.aspace(space_idx)) is None:
             logging.warn(f"No space with index {space_idx} found")
+            return
+        start = time.perf_counter()
+        plan = await layout_handler.aapply(layout, space, dry_run, queries)
+        print(
+            f"space {space_idx}: {len(plan.steps)} commands, {len(plan.skipped)} skipped"
+            f" in {(time.perf_counter() - start) * 1000:.1f}ms",
+            file=sys.stderr,
+        )
+
+    # Spaces don't share windows, so their layouts can be applied at the same time
+    await asyncio.gather(*(apply(i, l) for i, l in args.spaces.items()))
 
 
 if __name__ == "__main__":
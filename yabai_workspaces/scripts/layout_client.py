@@ -0,0 +1,69 @@
+"""
+Sends a layout request to scripts/layout_daemon.py and prints its output. Meant to be
+bound to hotkeys, so it only imports the standard library and skips argparse; with
+`python3 -S` it starts in a few milliseconds.
+
+Takes the same arguments as scripts/apply_layout.py. If the daemon isn't running, it
+runs apply_layout.py instead, so hotkeys keep working, just slower.
+
+$ python3 -S yabai_workspaces/scripts/layout_client.py '{"spaces": {"3": {"layout_type": "columns", "col_count": 3}}}'
+"""
+
+import json
+import os
+import socket
+import sys
+
+LAYOUT_SOCKET = "/tmp/yabai-workspaces-layouts.socket"
+
+# Long enough for yabai to lay out a crowded space, short enough that a wedged
+# daemon doesn't leave a hotkey hanging
+TIMEOUT = 10.0
+
+USAGE = "usage: layout_client.py [--dry-run] layouts"
+
+
+def socket_path() -> str:
+    return os.environ.get("YWS_LAYOUT_SOCKET", LAYOUT_SOCKET)
+
+
+def request(layouts: str, dry_run: bool = False, path: str | None = None) -> dict:
+    """Send one request and return the daemon's reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT)
+        sock.connect(path or socket_path())
+        message = json.dumps({"layouts": layouts, "dry_run": dry_run}) + "\n"
+        sock.sendall(message.encode())
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+def main():
+    argv = sys.argv[1:]
+    dry_run = "--dry-run" in argv
+    positional = [a for a in argv if a != "--dry-run"]
+    if len(positional) != 1:
+        sys.exit(USAGE)
+
+    try:
+        reply = request(positional[0], dry_run)
+    except (FileNotFoundError, ConnectionRefusedError):
+        script = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "apply_layout.py"
+        )
+        print(
+            "Layout daemon not running, falling back to apply_layout.py",
+            file=sys.stderr,
+        )
+        os.execv(sys.executable, [sys.executable, script, *argv])
+
+    sys.stdout.write(reply.get("stdout", ""))
+    sys.stderr.write(reply.get("stderr", ""))
+    if not reply["ok"]:
+        sys.exit(reply["error"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+
+from yabai_workspaces.layouts.layout_handler import LayoutHandler
+from yabai_workspaces.scripts.apply_layout import ApplyLayoutArgs, apply_layouts
+from yabai_workspaces.scripts.layout_client import socket_path
+from yabai_workspaces.yabai import Yabai
+
+
+class LayoutRequest(BaseModel):
+    # The same JSON apply_layout.py takes, passed through as-is
+    layouts: str
+    dry_run: bool = False
+
+
+class LayoutReply(BaseModel):
+    ok: bool
+    stdout: str = ""
+    stderr: str = ""
+    error: str = ""
+
+
+class LayoutDaemon:
+    """
+    Applies layouts sent by scripts/layout_client.py over a Unix socket. Python,
+    pydantic and the models are loaded once, the yabai socket is found once, and the
+    LayoutHandler's cache lives as long as the daemon, so re-applying a layout
+    nothing has disturbed costs only the queries that confirm it.
+
+    Each request is one JSON line:
+
+        {"layouts": "{\\"spaces\\": {...}}", "dry_run": false}
+
+    answered with one JSON line before the connection is closed:
+
+        {"ok": true, "stdout": "", "stderr": "space 3: 4 commands, 0 skipped ...", ...}
+        {"ok": false, "error": "Unparseable input json: ...", ...}
+    """
+
+    def __init__(self, yabai: Yabai, path: str):
+        self.yabai = yabai
+        self.layout_handler = LayoutHandler(yabai)
+        self.path = path
+        self.server: asyncio.Server | None = None
+        # Requests run one at a time: two presses laying out the same space at once
+        # would fight over its windows, and output is captured by swapping
+        # sys.stdout and sys.stderr, which only one request can do at a time
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        # A crashed daemon leaves its socket file behind, which would make bind fail
+        Path(self.path).unlink(missing_ok=True)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        Path(self.path).unlink(missing_ok=True)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            reply = await self._reply(await reader.readline())
+            writer.write(reply.model_dump_json().encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _reply(self, line: bytes) -> LayoutReply:
+        try:
+            request = LayoutRequest.model_validate_json(line)
+            args = ApplyLayoutArgs.model_validate_json(request.layouts)
+        except ValidationError as e:
+            return LayoutReply(ok=False, error=f"Unparseable input json: {e}")
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        reply = LayoutReply(ok=True)
+        async with self._lock:
+            try:
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(
+                    stderr
+                ):
+                    await apply_layouts(
+                        args, request.dry_run, self.yabai, self.layout_handler
+                    )
+            except Exception as e:
+                logging.exception("Failed to apply layouts")
+                reply = LayoutReply(ok=False, error=f"{type(e).__name__}: {e}")
+        reply.stdout, reply.stderr = stdout.getvalue(), stderr.getvalue()
+        return reply
+
+
+async def serve(path: str) -> None:
+    daemon = LayoutDaemon(Yabai(), path)
+    await daemon.start()
+    print(f"Layout daemon listening on {path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await daemon.close()
+
+
+def main():
+    """
+    Runs the layout daemon for scripts/layout_client.py.
+
+    $ python yabai_workspaces/scripts/layout_daemon.py
+    $ python3 -S yabai_workspaces/scripts/layout_client.py '{"spaces": {...}}'
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--path",
+        default=socket_path(),
+        help="Socket to listen on (default: $YWS_LAYOUT_SOCKET or %(default)s)",
+    )
+    args = parser.parse_args()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.path))
+
+
+if __name__ == "__main__":
+    main()
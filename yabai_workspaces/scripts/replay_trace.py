@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.testclient import WebSocketTestSession
+from starlette.websockets import WebSocketDisconnect
+
+from yabai_workspaces.api.metrics import ServerMetrics
+from yabai_workspaces.api.trace import ReplayState, Trace
+from yabai_workspaces.testing.fake_yabai import FakeYabai
+
+
+class ReplayReport(NamedTuple):
+    signals: int
+    seconds: float
+    clients: int
+    updates: int
+    latencies_ms: list[float]
+    # Patches clients received whose base_seq wasn't the last seq they saw
+    gaps: int
+    # Queued messages the server threw away for clients that fell behind
+    dropped: int
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies_ms:
+            return math.nan
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def __str__(self) -> str:
+        return (
+            f"Replayed {self.signals} signals in {self.seconds:.2f}s"
+            f" to {self.clients} clients, {self.updates} updates received\n"
+            f"Signal to update latency: p50 {self.percentile(0.5):.1f}ms,"
+            f" p90 {self.percentile(0.9):.1f}ms, p99 {self.percentile(0.99):.1f}ms,"
+            f" max {self.percentile(1.0):.1f}ms\n"
+            f"Dropped: {self.dropped} queued messages, {self.gaps} gaps seen by clients"
+        )
+
+
+class ReplayClient:
+    """
+    A simulated WebSocket client reading updates on its own thread. Each update is
+    credited to every signal sent since the previous one, so latency is measured
+    from a signal to the first update after it.
+    """
+
+    def __init__(self, session: WebSocketTestSession, sent: list[float], seq: int):
+        self.session = session
+        self.sent = sent
+        self.latencies_ms: list[float] = []
+        self.updates = 0
+        self.gaps = 0
+        self._seq = seq
+        self._credited = 0
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # Closing a test session doesn't wake a thread waiting in receive_text(), so
+        # give it a moment to finish handling a last message and leave it be
+        self._thread.join(timeout=0.1)
+
+    def _read(self) -> None:
+        with contextlib.suppress(WebSocketDisconnect, RuntimeError):
+            while True:
+                message = json.loads(self.session.receive_text())
+                received = time.monotonic()
+                if message["type"] == "SPACES_PATCHED" and (
+                    message["base_seq"] != self._seq
+                ):
+                    self.gaps += 1
+                    self.session.send_text('{"type": "REQUEST_SNAPSHOT"}')
+                self._seq = message["seq"]
+                self.updates += 1
+                sent = self.sent[self._credited :]
+                self._credited += len(sent)
+                self.latencies_ms += [(received - s) * 1000 for s in sent]
+
+
+def replay(
+    app: FastAPI,
+    metrics: ServerMetrics,
+    trace: Trace,
+    state: ReplayState,
+    speed: float,
+    clients: int,
+    settle: float,
+) -> ReplayReport:
+    sent: list[float] = []
+    with TestClient(app) as http, contextlib.ExitStack() as sessions:
+        readers = []
+        for _ in range(clients):
+            session = sessions.enter_context(http.websocket_connect("/ws"))
+            # The snapshot every client gets on connect isn't a response to a signal
+            snapshot = json.loads(session.receive_text())
+            readers.append(ReplayClient(session, sent, snapshot["seq"]))
+
+        start = time.monotonic()
+        for i, traced in enumerate(trace.signals):
+            if speed and (delay := start + traced.t / speed - time.monotonic()) > 0:
+                time.sleep(delay)
+            # yabai answers with how things stood after this signal, until the next
+            next_signal = trace.signals[i + 1].t if i + 1 < len(trace.signals) else None
+            state.now = math.inf if next_signal is None else next_signal
+            sent.append(time.monotonic())
+            http.post("/signal", json=traced.signal.model_dump())
+        seconds = time.monotonic() - start
+        time.sleep(settle)
+        dropped = int(metrics.dropped_messages_total.values.get((), 0))
+
+    for reader in readers:
+        reader.stop()
+    return ReplayReport(
+        signals=len(trace.signals),
+        seconds=seconds,
+        clients=clients,
+        updates=sum(r.updates for r in readers),
+        latencies_ms=[l for r in readers for l in r.latencies_ms],
+        gaps=sum(r.gaps for r in readers),
+        dropped=dropped,
+    )
+
+
+def main():
+    """
+    Replays a trace recorded with YWS_TRACE against the API server, with yabai
+    answering from the trace, and reports how quickly updates reached clients.
+
+    Example:
+
+    $ YWS_TRACE=storm.jsonl uvicorn yabai_workspaces.api.main:app
+    $ python yabai_workspaces/scripts/replay_trace.py storm.jsonl --speed 10 --clients 20
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Multiple of recorded speed, or 0 to send signals as fast as possible",
+    )
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=1.0,
+        help="Seconds to keep listening after the last signal",
+    )
+    args = parser.parse_args()
+
+    trace = Trace(args.trace)
+    state = ReplayState(trace)
+    socket_path = os.path.join(tempfile.mkdtemp(), "yabai-replay.socket")
+    with FakeYabai(socket_path, state=state):
+        # Point the server at the fake and keep it away from the real yabai's
+        # signals, before its module-level setup runs
+        os.environ.update(
+            YWS_YABAI_SOCKET=socket_path,
+            YWS_REGISTER_SIGNALS="0",
+            YWS_SIGNAL_TRANSPORT="http",
+        )
+        os.environ.pop("YWS_TRACE", None)
+        from yabai_workspaces.api.main import app, metrics
+
+        report = replay(
+            app, metrics, trace, state, args.speed, args.clients, args.settle
+        )
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from yabai_workspaces.api.state import to_workspace_display, to_workspace_space
+from yabai_workspaces.layouts.window_handler import ChromeHandler
+from yabai_workspaces.models import Workspace
+from yabai_workspaces.store import SnapshotEntry, WorkspaceStore
+from yabai_workspaces.workspace_manager import WorkspaceManager
+from yabai_workspaces.yabai import Yabai
+
+DEFAULT_STORE = Path(
+    os.environ.get("YWS_STORE", "~/.local/share/yabai-workspaces/history")
+).expanduser()
+
+
+def main():
+    """
+    Records, lists, exports, restores and compacts the workspace snapshot history.
+
+    Example:
+
+    $ python yabai_workspaces/scripts/workspace_history.py record --name coding
+    $ python yabai_workspaces/scripts/workspace_history.py list
+    $ python yabai_workspaces/scripts/workspace_history.py export --at 2024-01-05T09:00 out.json
+    $ python yabai_workspaces/scripts/workspace_history.py restore --name coding
+    $ python yabai_workspaces/scripts/workspace_history.py compact --keep-last 100
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE)
+    parser.add_argument(
+        "--no-compress", action="store_true", help="Write uncompressed records"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Append the current workspace")
+    record.add_argument("--name", default="")
+
+    commands.add_parser("list", help="List snapshots")
+
+    export = commands.add_parser("export", help="Write a snapshot as JSON")
+    add_selector(export)
+    export.add_argument("path", type=Path)
+
+    restore = commands.add_parser("restore", help="Restore a snapshot")
+    add_selector(restore)
+
+    compact = commands.add_parser("compact", help="Rewrite the log")
+    compact.add_argument(
+        "--keep-last",
+        type=int,
+        default=None,
+        help="Drop unnamed snapshots older than the last N",
+    )
+
+    args = parser.parse_args()
+    store = WorkspaceStore(args.store, compress=not args.no_compress)
+
+    match args.command:
+        case "record":
+            yabai = Yabai()
+            workspace = Workspace(
+                displays=[to_workspace_display(d) for d in yabai.displays()],
+                spaces=[to_workspace_space(s) for s in yabai.spaces()],
+                windows=yabai.windows(),
+            )
+            manager = WorkspaceManager(yabai, [ChromeHandler()])
+            print_entry(manager.record(workspace, store, args.name))
+        case "list":
+            for entry in store.entries:
+                print_entry(entry)
+        case "export":
+            store.export(select(store, args).seq, args.path)
+        case "restore":
+            manager = WorkspaceManager(Yabai(), [ChromeHandler()])
+            manager.restore(store.load(select(store, args).seq))
+        case "compact":
+            print(store.compact(args.keep_last))
+
+
+def add_selector(parser: argparse.ArgumentParser) -> None:
+    """Which snapshot to act on; the latest if none of these are given."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--seq", type=int)
+    group.add_argument("--name")
+    group.add_argument(
+        "--at", type=datetime.fromisoformat, help="ISO time, e.g. 2024-01-05T09:00"
+    )
+
+
+def select(store: WorkspaceStore, args: argparse.Namespace) -> SnapshotEntry:
+    try:
+        if args.seq is not None:
+            return next(e for e in store.entries if e.seq == args.seq)
+        if args.name is not None:
+            return store.entry_named(args.name)
+        if args.at is not None:
+            return store.entry_at(args.at.timestamp())
+        return store.entries[-1]
+    except (LookupError, StopIteration, IndexError):
+        sys.exit("No matching snapshot")
+
+
+def print_entry(entry: SnapshotEntry) -> None:
+    taken = datetime.fromtimestamp(entry.time).isoformat(timespec="seconds")
+    print(f"{entry.seq:>6}  {taken}  {entry.kind.name.lower():<8}  {entry.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import bisect
+import json
+import shutil
+import struct
+import time
+import zlib
+from enum import Enum
+from pathlib import Path
+from typing import IO, Iterator, NamedTuple
+
+from .diff import WorkspacePatch, apply_patch, diff_workspaces
+from .models import Workspace
+
+# Every this many snapshots is stored whole, bounding how many deltas a load replays
+KEYFRAME_INTERVAL = 32
+
+# kind, flags, seq, unix time, payload length, name length. Followed by the name,
+# then the payload: a Workspace for keyframes, a WorkspacePatch for deltas.
+_HEADER = struct.Struct("<cBIdIH")
+_COMPRESSED = 0x01
+
+
+class RecordKind(str, Enum):
+    KEYFRAME = "K"
+    DELTA = "D"
+
+
+class SnapshotEntry(NamedTuple):
+    seq: int
+    time: float
+    name: str
+    kind: RecordKind
+    # Byte range of the record in the log
+    offset: int
+    length: int
+    # seq of the keyframe that replaying this snapshot starts from
+    keyframe: int
+
+
+class CompactionResult(NamedTuple):
+    snapshots_before: int
+    snapshots_after: int
+    bytes_before: int
+    bytes_after: int
+
+    def __str__(self) -> str:
+        return (
+            f"Snapshots: {self.snapshots_before} -> {self.snapshots_after}\n"
+            f"Bytes: {self.bytes_before} -> {self.bytes_after}"
+        )
+
+
+def write_json(workspace: Workspace, path: str | Path) -> None:
+    """Write a single workspace as an indented JSON file."""
+    outfile = Path(path)
+    outfile.parent.mkdir(exist_ok=True, parents=True)
+    # model_dump_json can't sort keys, which keeps these files diffable
+    outfile.write_text(
+        json.dumps(
+            workspace.model_dump(mode="json", by_alias=True),
+            ensure_ascii=False,
+            indent=2,
+            sort_keys=True,
+        )
+    )
+
+
+class WorkspaceStore:
+    """
+    Append-only history of workspace snapshots in a directory holding two files:
+
+    - `log.bin`, where each snapshot is a record holding either the whole workspace
+      (a keyframe) or a WorkspacePatch against the snapshot before it, optionally
+      zlib-compressed.
+    - `index.jsonl`, one line per record with its seq, time, name and byte range,
+      so finding a snapshot by seq, time or name never reads the log. Loading one
+      reads only the records from its keyframe onwards.
+
+    The index can always be rebuilt from the log's record headers, and is whenever
+    it's missing or doesn't account for the whole log.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+        compress: bool = True,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.path / "log.bin"
+        self.index_path = self.path / "index.jsonl"
+        self.keyframe_interval = keyframe_interval
+        self.compress = compress
+        self.entries: list[SnapshotEntry] = []
+        self._by_seq: dict[int, SnapshotEntry] = {}
+        self._by_name: dict[str, SnapshotEntry] = {}
+        # The latest snapshot, which the next append is diffed against
+        self._last: Workspace | None = None
+        self._load_index()
+
+    def append(
+        self, workspace: Workspace, name: str = "", at: float | None = None
+    ) -> SnapshotEntry:
+        at = time.time() if at is None else at
+        if self.entries and at < self.entries[-1].time:
+            raise ValueError(
+                f"Snapshot time {at} is before the latest {self.entries[-1].time}"
+            )
+        seq = self.entries[-1].seq + 1 if self.entries else 1
+        return self._write(workspace, seq, name, at)
+
+    def latest(self) -> Workspace:
+        if self._last is None:
+            if not self.entries:
+                raise LookupError("The store has no snapshots")
+            self._last = self.load(self.entries[-1].seq)
+        return self._last
+
+    def load(self, seq: int) -> Workspace:
+        if (entry := self._by_seq.get(seq)) is None:
+            raise LookupError(f"No snapshot with seq {seq}")
+        start = self._by_seq[entry.keyframe]
+        with self.log_path.open("rb") as log:
+            log.seek(start.offset)
+            data = log.read(entry.offset + entry.length - start.offset)
+        workspace: Workspace | None = None
+        for kind, _, _, payload in self._decode_all(data):
+            if kind == RecordKind.KEYFRAME:
+                workspace = Workspace.model_validate_json(payload)
+            else:
+                patch = WorkspacePatch.model_validate_json(payload)
+                workspace = apply_patch(workspace, patch)
+        return workspace
+
+    def entry_at(self, at: float) -> SnapshotEntry:
+        """The latest snapshot taken at or before the unix time at."""
+        i = bisect.bisect_right(self.entries, at, key=lambda e: e.time)
+        if i == 0:
+            raise LookupError(f"No snapshot at or before {at}")
+        return self.entries[i - 1]
+
+    def entry_named(self, name: str) -> SnapshotEntry:
+        """The latest snapshot saved with name."""
+        if (entry := self._by_name.get(name)) is None:
+            raise LookupError(f"No snapshot named {name!r}")
+        return entry
+
+    def load_at(self, at: float) -> Workspace:
+        return self.load(self.entry_at(at).seq)
+
+    def load_named(self, name: str) -> Workspace:
+        return self.load(self.entry_named(name).seq)
+
+    def export(self, seq: int, path: str | Path) -> None:
+        write_json(self.load(seq), path)
+
+    def compact(self, keep_last: int | None = None) -> CompactionResult:
+        """
+        Rewrite the log with the current keyframe interval and compression, keeping
+        every named snapshot plus the last keep_last (all of them if None). Seqs,
+        times and names are preserved; kept snapshots are re-diffed against each
+        other.
+        """
+        snapshots_before, bytes_before = len(self.entries), self._log_size()
+        keep = {e.seq for e in self.entries if e.name}
+        if keep_last is None:
+            keep.update(e.seq for e in self.entries)
+        elif keep_last > 0:
+            keep.update(e.seq for e in self.entries[-keep_last:])
+
+        tmp_path = self.path / "compacting"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp = WorkspaceStore(
+            tmp_path, keyframe_interval=self.keyframe_interval, compress=self.compress
+        )
+        for entry, workspace in self._replay():
+            if entry.seq in keep:
+                tmp._write(workspace, entry.seq, entry.name, entry.time)
+
+        # Without an index the log is rescanned on open, so dropping the index first
+        # means a crash anywhere in here leaves the old or new log, never a mismatch
+        self.index_path.unlink(missing_ok=True)
+        if tmp.log_path.exists():
+            tmp.log_path.replace(self.log_path)
+        else:
+            self.log_path.unlink(missing_ok=True)
+        shutil.rmtree(tmp_path)
+        self._last = None
+        self._load_index()
+        return CompactionResult(
+            snapshots_before, len(self.entries), bytes_before, self._log_size()
+        )
+
+    def _write(
+        self, workspace: Workspace, seq: int, name: str, at: float
+    ) -> SnapshotEntry:
+        previous = self.entries[-1] if self.entries else None
+        if previous is None or self._since_keyframe() >= self.keyframe_interval:
+            kind, payload = RecordKind.KEYFRAME, workspace.model_dump_json(
+                by_alias=True
+            )
+        else:
+            patch = diff_workspaces(self.latest(), workspace)
+            kind, payload = RecordKind.DELTA, patch.model_dump_json(by_alias=True)
+
+        record = self._encode(kind, seq, at, name, payload.encode())
+        offset = self._log_size()
+        with self.log_path.open("ab") as log:
+            log.write(record)
+        entry = SnapshotEntry(
+            seq=seq,
+            time=at,
+            name=name,
+            kind=kind,
+            offset=offset,
+            length=len(record),
+            keyframe=seq if kind == RecordKind.KEYFRAME else previous.keyframe,
+        )
+        with self.index_path.open("a") as index:
+            index.write(json.dumps(entry._asdict()) + "\n")
+        self._add_entry(entry)
+        self._last = workspace
+        return entry
+
+    def _since_keyframe(self) -> int:
+        """How many snapshots, counting the keyframe itself, since the last keyframe."""
+        # Entries are in seq order. The keyframe can be further back than
+        # keyframe_interval, e.g. after reopening with a smaller interval.
+        position = bisect.bisect_left(
+            self.entries, self.entries[-1].keyframe, key=lambda e: e.seq
+        )
+        return len(self.entries) - position
+
+    def _replay(self) -> Iterator[tuple[SnapshotEntry, Workspace]]:
+        """Every snapshot in order, reading the log once."""
+        with self.log_path.open("rb") as log:
+            workspace: Workspace | None = None
+            for entry, (kind, _, _, payload) in zip(self.entries, self._read(log)):
+                if kind == RecordKind.KEYFRAME:
+                    workspace = Workspace.model_validate_json(payload)
+                else:
+                    patch = WorkspacePatch.model_validate_json(payload)
+                    workspace = apply_patch(workspace, patch)
+                yield entry, workspace
+
+    def _encode(
+        self, kind: RecordKind, seq: int, at: float, name: str, payload: bytes
+    ) -> bytes:
+        flags = 0
+        if self.compress:
+            payload, flags = zlib.compress(payload), flags | _COMPRESSED
+        encoded_name = name.encode()
+        header = _HEADER.pack(
+            kind.value.encode(), flags, seq, at, len(payload), len(encoded_name)
+        )
+        return header + encoded_name + payload
+
+    def _decode_all(
+        self, data: bytes
+    ) -> Iterator[tuple[RecordKind, float, str, bytes]]:
+        offset = 0
+        while offset < len(data):
+            kind, flags, _, at, payload_len, name_len = _HEADER.unpack_from(
+                data, offset
+            )
+            offset += _HEADER.size
+            name = data[offset : offset + name_len].decode()
+            offset += name_len
+            payload = data[offset : offset + payload_len]
+            offset += payload_len
+            if flags & _COMPRESSED:
+                payload = zlib.decompress(payload)
+            yield RecordKind(kind.decode()), at, name, payload
+
+    def _read(self, log: IO[bytes]) -> Iterator[tuple[RecordKind, float, str, bytes]]:
+        while header := log.read(_HEADER.size):
+            *_, payload_len, name_len = _HEADER.unpack(header)
+            yield from self._decode_all(header + log.read(name_len + payload_len))
+
+    def _load_index(self) -> None:
+        self.entries, self._by_seq, self._by_name = [], {}, {}
+        if self.index_path.exists():
+            with self.index_path.open() as index:
+                for line in index:
+                    entry = SnapshotEntry(**json.loads(line))
+                    self._add_entry(entry._replace(kind=RecordKind(entry.kind)))
+        last = self.entries[-1] if self.entries else None
+        if (last.offset + last.length if last else 0) != self._log_size():
+            self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        """Recover the index from the record headers, skipping over payloads."""
+        self.entries, self._by_seq, self._by_name = [], {}, {}
+        size, offset, keyframe = self._log_size(), 0, 0
+        if not size:
+            self.index_path.unlink(missing_ok=True)
+            return
+        with self.log_path.open("r+b") as log:
+            while len(header := log.read(_HEADER.size)) == _HEADER.size:
+                kind, _, seq, at, payload_len, name_len = _HEADER.unpack(header)
+                length = _HEADER.size + name_len + payload_len
+                if offset + length > size:
+                    break
+                name = log.read(name_len).decode()
+                log.seek(payload_len, 1)
+                kind = RecordKind(kind.decode())
+                if kind == RecordKind.KEYFRAME:
+                    keyframe = seq
+                self._add_entry(
+                    SnapshotEntry(seq, at, name, kind, offset, length, keyframe)
+                )
+                offset += length
+            # Drop a record cut short by a crash mid-append
+            log.truncate(offset)
+        with self.index_path.open("w") as index:
+            index.writelines(json.dumps(e._asdict()) + "\n" for e in self.entries)
+
+    def _add_entry(self, entry: SnapshotEntry) -> None:
+        self.entries.append(entry)
+        self._by_seq[entry.seq] = entry
+        if entry.name:
+            self._by_name[entry.name] = entry
+
+    def _log_size(self) -> int:
+        return self.log_path.stat().st_size if self.log_path.exists() else 0
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+# Deliberately doesn't match the /tmp/yabai_*.socket glob Yabai falls back on, so a
+# fake left running is never mistaken for the real daemon
+DEFAULT_PATH = "/tmp/yabai-fake.socket"
+
+# yabai prefixes error responses with this byte
+FAILURE_MESSAGE = b"\x07"
+
+APPS = ("Code", "Google Chrome", "iTerm2", "Slack", "Finder")
+
+
+class CommandError(Exception):
+    pass
+
+
+class FakeYabaiState:
+    """
+    yabai's displays, spaces and windows, in the JSON shape its queries return,
+    plus just enough command handling to keep them consistent.
+    """
+
+    def __init__(self, displays: int = 1, spaces: int = 4, windows: int = 20):
+        self.displays: list[dict[str, Any]] = []
+        self.spaces: list[dict[str, Any]] = []
+        self.windows: list[dict[str, Any]] = []
+        self.signals: list[dict[str, Any]] = []
+        self._next_space_id = 1
+        self.focused_display = 1
+        for d in range(1, displays + 1):
+            self.displays.append(
+                {
+                    "id": d,
+                    "uuid": f"FAKE-DISPLAY-{d}",
+                    "index": d,
+                    "frame": {
+                        "x": 1920.0 * (d - 1),
+                        "y": 0.0,
+                        "w": 1920.0,
+                        "h": 1080.0,
+                    },
+                    "spaces": [],
+                }
+            )
+        for s in range(spaces):
+            self._add_space(1 + s % displays)
+        for w in range(windows):
+            self._add_window(w)
+        self._renumber()
+
+    def add_window(self, space: str | None = None) -> dict[str, Any]:
+        """
+        Open a window as an app would, on the space selected by space or else the
+        next in turn, and return it. Its id is one higher than any other's.
+        """
+        self._add_window(max((w["id"] for w in self.windows), default=999) - 999)
+        window = self.windows[-1]
+        if space is not None:
+            window["_space_id"] = self.space(space)["id"]
+        self._renumber()
+        return window
+
+    def _add_space(self, display: int) -> dict[str, Any]:
+        space = {
+            "id": self._next_space_id,
+            "uuid": f"FAKE-SPACE-{self._next_space_id}",
+            "index": 0,
+            "label": "",
+            "type": "bsp",
+            "display": display,
+            "windows": [],
+            "first-window": 0,
+            "last-window": 0,
+            "has-focus": False,
+            "is-visible": False,
+            "is-native-fullscreen": False,
+        }
+        self._next_space_id += 1
+        self.spaces.append(space)
+        return space
+
+    def _add_window(self, n: int) -> None:
+        space = self.spaces[n % len(self.spaces)]
+        self.windows.append(
+            {
+                "id": 1000 + n,
+                "pid": 500 + n % len(APPS),
+                "app": APPS[n % len(APPS)],
+                "title": f"Window {n} — ünïcödé",
+                "frame": {"x": 0.0, "y": 0.0, "w": 960.0, "h": 1080.0},
+                "role": "AXWindow",
+                "subrole": "AXStandardWindow",
+                "display": space["display"],
+                "space": 0,
+                "level": 0,
+                "layer": "normal",
+                "opacity": 1.0,
+                "split-type": "none",
+                "stack-index": 0,
+                "can-move": True,
+                "can-resize": True,
+                "has-focus": n == 0,
+                "has-shadow": True,
+                "has-parent-zoom": False,
+                "has-fullscreen-zoom": False,
+                "is-native-fullscreen": False,
+                "is-visible": True,
+                "is-minimized": False,
+                "is-hidden": False,
+                "is-floating": False,
+                "is-sticky": False,
+                "is-grabbed": False,
+                "_space_id": space["id"],
+            }
+        )
+
+    def _renumber(self) -> None:
+        """Recompute everything yabai derives from which space is on which display."""
+        self.spaces.sort(key=lambda s: s["display"])
+        for i, space in enumerate(self.spaces, start=1):
+            space["index"] = i
+        by_id = {s["id"]: s for s in self.spaces}
+        for display in self.displays:
+            display["spaces"] = [
+                s["index"] for s in self.spaces if s["display"] == display["index"]
+            ]
+        for space in self.spaces:
+            space["windows"] = []
+        for window in self.windows:
+            space = by_id[window["_space_id"]]
+            window["space"], window["display"] = space["index"], space["display"]
+            space["windows"].append(window["id"])
+        for space in self.spaces:
+            space["first-window"] = space["windows"][0] if space["windows"] else 0
+            space["last-window"] = space["windows"][-1] if space["windows"] else 0
+            space["is-visible"] = False
+        for display in self.displays:
+            if display["spaces"]:
+                self.space(str(display["spaces"][0]))["is-visible"] = True
+        for space in self.spaces:
+            space["has-focus"] = (
+                space["is-visible"] and space["display"] == self.focused_display
+            )
+
+    def space(self, sel: str) -> dict[str, Any]:
+        for space in self.spaces:
+            if str(space["index"]) == sel or (space["label"] and space["label"] == sel):
+                return space
+        raise CommandError(
+            f"could not locate space with mission-control index '{sel}'."
+        )
+
+    def window(self, sel: str) -> dict[str, Any]:
+        for window in self.windows:
+            if str(window["id"]) == sel:
+                return window
+        raise CommandError(f"could not locate window with the specified id '{sel}'.")
+
+    def display(self, sel: str) -> dict[str, Any]:
+        for display in self.displays:
+            if str(display["index"]) == sel:
+                return display
+        raise CommandError(f"could not locate display with arrangement index '{sel}'.")
+
+    def handle(self, args: list[str]) -> bytes:
+        try:
+            match args:
+                case ["query", *rest]:
+                    return json.dumps(self._query(rest), ensure_ascii=False).encode()
+                case ["space", "--create", *_]:
+                    self._add_space(self.focused_display)
+                case ["space", sel, "--destroy"]:
+                    self._destroy_space(self.space(sel))
+                case ["space", sel, "--label", *label]:
+                    space = self.space(sel)
+                    space["label"] = label[0] if label else ""
+                case ["space", sel, "--display", display]:
+                    self.space(sel)["display"] = self.display(display)["index"]
+                case ["space", sel, *_]:
+                    self.space(sel)
+                case ["display", "--focus", sel]:
+                    self.focused_display = self.display(sel)["index"]
+                case ["window", sel, "--space", space_sel]:
+                    self.window(sel)["_space_id"] = self.space(space_sel)["id"]
+                case ["window", sel, "--stack", other]:
+                    top = self.window(other)
+                    top["frame"] = dict(self.window(sel)["frame"])
+                    top["stack-index"] = self.window(sel)["stack-index"] + 1
+                case ["window", sel, *_]:
+                    self.window(sel)
+                case ["config", "--space", sel, "layout", layout]:
+                    self.space(sel)["type"] = layout
+                case ["config", *_]:
+                    pass
+                case ["signal", "--add", *props]:
+                    signal = dict(p.split("=", 1) for p in props)
+                    self.signals = [
+                        s for s in self.signals if s.get("label") != signal.get("label")
+                    ]
+                    self.signals.append(signal)
+                case ["signal", "--remove", label]:
+                    before = len(self.signals)
+                    self.signals = [s for s in self.signals if s.get("label") != label]
+                    if len(self.signals) == before:
+                        raise CommandError(f"signal with label '{label}' not found.")
+                case ["signal", "--list"]:
+                    return json.dumps(
+                        [{"index": i, **s} for i, s in enumerate(self.signals)]
+                    ).encode()
+                case _:
+                    raise CommandError(f"unknown command '{' '.join(args)}'")
+        except CommandError as e:
+            return FAILURE_MESSAGE + str(e).encode() + b"\n"
+        self._renumber()
+        return b""
+
+    def _destroy_space(self, space: dict[str, Any]) -> None:
+        siblings = [s for s in self.spaces if s["display"] == space["display"]]
+        if len(siblings) == 1:
+            raise CommandError("cannot destroy the last space of a display.")
+        fallback = next(s for s in siblings if s is not space)
+        for window in self.windows:
+            if window["_space_id"] == space["id"]:
+                window["_space_id"] = fallback["id"]
+        self.spaces.remove(space)
+
+    def _query(self, args: list[str]) -> Any:
+        match args:
+            case ["--displays", *rest]:
+                entities, rest = self.displays, rest
+            case ["--spaces", *rest]:
+                entities, rest = self.spaces, rest
+            case ["--windows", *rest]:
+                entities, rest = self.windows, rest
+            case _:
+                raise CommandError(f"unknown query '{' '.join(args)}'")
+        # An optional property list comes first, as in query --windows id,app
+        fields = None
+        if rest and not rest[0].startswith("--"):
+            fields, rest = rest[0].split(","), rest[1:]
+            if unknown := [f for f in fields if entities and f not in entities[0]]:
+                raise CommandError(f"unknown property '{unknown[0]}'")
+        found = self._select(entities, rest)
+        if isinstance(found, list):
+            return [self._public(e, fields) for e in found]
+        return self._public(found, fields)
+
+    def _select(
+        self, entities: list[dict[str, Any]], scope: list[str]
+    ) -> list[dict[str, Any]] | dict[str, Any]:
+        match scope:
+            case []:
+                return entities
+            case ["--window", sel] if entities is self.windows:
+                return self.window(sel)
+            case ["--space", sel] if entities is self.spaces:
+                return self.space(sel)
+            case ["--display", sel] if entities is self.displays:
+                return self.display(sel)
+            case ["--space", sel]:
+                index = self.space(sel)["index"]
+                return [e for e in entities if e["space"] == index]
+            case ["--display", sel]:
+                index = self.display(sel)["index"]
+                return [e for e in entities if e["display"] == index]
+        raise CommandError(f"unsupported query scope '{' '.join(scope)}'")
+
+    def _public(
+        self, entity: dict[str, Any], fields: list[str] | None = None
+    ) -> dict[str, Any]:
+        if fields is not None:
+            return {k: entity[k] for k in fields}
+        return {k: v for k, v in entity.items() if not k.startswith("_")}
+
+
+class CommandHandler(Protocol):
+    def handle(self, args: list[str]) -> bytes: ...
+
+
+class FakeYabai:
+    """
+    Serves FakeYabaiState over a Unix socket using yabai's message format, so Yabai
+    can talk to it exactly as it does to the real thing.
+
+        with FakeYabai(windows=200, latency=0.001) as fake:
+            Yabai(socket_path=fake.path).windows()
+
+    `latency` seconds are slept before answering each command. Every command
+    received is appended to `log`. Pass `state` to answer commands some other way,
+    e.g. api.trace.ReplayState; displays, spaces and windows are ignored then.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        displays: int = 1,
+        spaces: int = 4,
+        windows: int = 20,
+        latency: float = 0.0,
+        state: CommandHandler | None = None,
+    ):
+        self.path = path
+        self.state = state or FakeYabaiState(displays, spaces, windows)
+        self.latency = latency
+        self.log: list[list[str]] = []
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> FakeYabai:
+        Path(self.path).unlink(missing_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(128)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        Path(self.path).unlink(missing_ok=True)
+
+    def __enter__(self) -> FakeYabai:
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def _serve(self) -> None:
+        while self._sock:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            header = self._recv_exactly(conn, 4)
+            (length,) = struct.unpack("<I", header)
+            args = self._recv_exactly(conn, length).decode().rstrip("\0").split("\0")
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.log.append(args)
+                response = self.state.handle(args)
+            # Clients may hang up early, e.g. after a timeout or on an oversized
+            # response, which is no concern of the daemon's
+            with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                conn.sendall(response)
+
+    def _recv_exactly(self, conn: socket.socket, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            if not (chunk := conn.recv(n - len(buf))):
+                raise ConnectionError("Client closed connection mid-message")
+            buf += chunk
+        return bytes(buf)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake yabai socket daemon")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--displays", type=int, default=1)
+    parser.add_argument("--spaces", type=int, default=4)
+    parser.add_argument("--windows", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeYabai(
+        args.path, args.displays, args.spaces, args.windows, args.latency
+    ) as fake:
+        print(f"Fake yabai listening on {fake.path}")
+        print(f"export YWS_YABAI_SOCKET={fake.path}")
+        threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
 import logging
-from pathlib import Path
 from typing import List
 
 from .layouts.window_handler import WindowHandler
+from .matching import MATCH_FIELDS, match_windows
 from .models import Window, Workspace
-from .utils import ordered_groupby
+from .reconcile import (
+    SPACE_FIELDS,
+    RestoreSummary,
+    kept_space_count,
+    next_space_op,
+    plan_labels,
+    plan_window_moves,
+)
+from .query_cache import QueryCache
+from .store import SnapshotEntry, WorkspaceStore, write_json
 from .yabai import Yabai
 
 
@@ -18,35 +27,76 @@ class WorkspaceManager:
             self.register_handler(handler)
 
     def save(self, workspace: Workspace, path: str) -> None:
-        outfile = Path(path)
-        outfile.parent.mkdir(exist_ok=True, parents=True)
+        """Export workspace as a single JSON file."""
+        self.will_save_many(workspace.windows)
+        write_json(workspace, path)
 
-        for win in workspace.windows:
-            self.will_save(win)
-
-        outfile.write_text(
-            workspace.json(by_alias=True, ensure_ascii=False, indent=2, sort_keys=True)
-        )
+    def record(
+        self, workspace: Workspace, store: WorkspaceStore, name: str = ""
+    ) -> SnapshotEntry:
+        """Append workspace to store's history."""
+        self.will_save_many(workspace.windows)
+        return store.append(workspace, name)
 
     # TODO: options to not reuse windows, to close stuff beforehand, to hide or minimize, etc
-    def restore(self, workspace: Workspace) -> None:
-        self.yabai.clean_slate()
-        connected_displays = {d.index for d in self.yabai.displays()}
+    def restore(
+        self, workspace: Workspace, queries: QueryCache | None = None
+    ) -> RestoreSummary:
+        """
+        Reconcile the live spaces and windows with workspace, only issuing the space
+        creates, moves, destroys, relabels and window moves that are actually needed.
+        Queries and commands go through queries, or a cache made for this restore.
+        """
+        queries = QueryCache(self.yabai) if queries is None else queries
+        connected_displays = {d.index for d in queries.displays(fields=["index"])}
+        for display in {s.display for s in workspace.spaces} - connected_displays:
+            logging.warn("Workspace defines unknown display index %d", display)
 
-        for display, spaces in ordered_groupby(
-            workspace.spaces,
-            sortkeyby=lambda x: x.display,
-            sortvaluesby=lambda x: x.index,
-        ).items():
-            missing_display = display not in connected_displays
-            if missing_display:
-                logging.warn("Workspace defines unknown display index %d", display)
+        spaces = queries.spaces(fields=SPACE_FIELDS)
+        summary = RestoreSummary(
+            spaces_kept=kept_space_count(spaces, workspace, connected_displays)
+        )
+        # Every structural change shifts space indexes, so these go one at a time with
+        # a fresh query in between. Bounded in case yabai refuses an operation.
+        for _ in range(len(spaces) + len(workspace.spaces)):
+            if (op := next_space_op(spaces, workspace, connected_displays)) is None:
+                break
+            try:
+                for cmd in op.commands:
+                    queries.call(cmd, ignore_error=False)
+            except RuntimeError as e:
+                logging.warn("Stopping space reconciliation: %s", e)
+                break
+            summary = summary._replace(**{op.kind: getattr(summary, op.kind) + 1})
+            spaces = queries.spaces(fields=SPACE_FIELDS)
 
-            for i, space in enumerate(spaces):
-                if i > 0 or missing_display:
-                    self.yabai.create_space(display)
-                for window in space.windows:
-                    self.yabai.move_window_to_space(window, space.index)
+        labels, labels_kept = plan_labels(spaces, workspace, connected_displays)
+        # Window ids don't survive app or OS restarts, so find each saved window's
+        # live counterpart by app and title instead
+        live_windows = queries.windows(fields=[*MATCH_FIELDS, "space"])
+        matched = match_windows(workspace.windows, live_windows)
+        moves, windows_kept, windows_missing = plan_window_moves(
+            live_windows, workspace, matched.id_map(), connected_displays
+        )
+        # Once the spaces exist, relabeling them and moving windows are all
+        # independent of each other.
+        results = queries.call_many([*labels, *moves])
+        for result in results:
+            if not result.ok:
+                logging.warn("Failed to restore: %s", result.error)
+
+        label_results, move_results = results[: len(labels)], results[len(labels) :]
+        summary = summary._replace(
+            labels_set=sum(r.ok for r in label_results),
+            labels_kept=labels_kept,
+            windows_moved=sum(r.ok for r in move_results),
+            windows_kept=windows_kept,
+            windows_missing=windows_missing,
+        )
+        # Which saved windows matched with low confidence or not at all
+        print(matched)
+        print(summary)
+        return summary
 
     def register_handler(self, handler: WindowHandler):
         if handler.name in self.handlers:
@@ -59,9 +109,25 @@ class WorkspaceManager:
         for name, handler in self.handlers.items():
             handler.will_restore(win.yws_data[name])
 
+    def will_restore_many(self, wins: List[Window]) -> None:
+        for name, handler in self.handlers.items():
+            handler.will_restore_many(
+                w.yws_data[name] for w in wins if w.yws_data and name in w.yws_data
+            )
+
     def will_save(self, win: Window) -> None:
         for name, handler in self.handlers.items():
             if data := handler.will_save(win):
                 if not win.yws_data:
                     win.yws_data = {}
                 win.yws_data[name] = data
+
+    def will_save_many(self, wins: List[Window]) -> None:
+        """will_save for every window, letting each handler batch its work."""
+        by_id = {w.id: w for w in wins}
+        for name, handler in self.handlers.items():
+            for win_id, data in handler.will_save_many(wins).items():
+                win = by_id[win_id]
+                if not win.yws_data:
+                    win.yws_data = {}
+                win.yws_data[name] = data
@@ -2,14 +2,45 @@ from __future__ import annotations
 
 import asyncio
 import json
+import os
 import socket
-import struct
 import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import List
+from types import TracebackType
+from typing import Any, List, Protocol, Sequence, TypeVar
 
-from .models import Display, Space, Window
+from .framing import MAX_RESPONSE_BYTES, ResponseBuffer, encode_command
+from .models import Display, RegisteredSignal, Space, Window
+from .parsing import parse_many, parse_one, partial_model, projection
+
+# yabai prefixes the response to a command that failed with this byte
+FAILURE_MESSAGE = b"\x07"
+
+# Seconds to wait for yabai to answer a command, connecting included
+DEFAULT_TIMEOUT = 5.0
+
+
+_M = TypeVar("_M", Display, RegisteredSignal, Space, Window)
+
+
+# Attribute names of the model fields a query should fetch, or None for all of them
+Fields = Sequence[str] | None
+
+
+def _project(
+    model: type[_M], cmd: List[str], fields: Fields
+) -> tuple[type[_M], List[str]]:
+    if fields is None:
+        return model, cmd
+    # yabai takes the property list right after the entity: query --windows id,app
+    partial = partial_model(model, fields)
+    return partial, [*cmd[:2], projection(partial), *cmd[2:]]
 
 
 class DirSel(str, Enum):
@@ -19,58 +50,330 @@ class DirSel(str, Enum):
     WEST = "west"
 
 
+class YabaiObserver(Protocol):
+    """Hooks for timing yabai calls, e.g. api.metrics.ServerMetrics."""
+
+    def call_finished(self, verb: str, seconds: float) -> None: ...
+
+    def semaphore_waited(self, seconds: float) -> None: ...
+
+
+class YabaiError(RuntimeError):
+    """yabai answered a command with an error message."""
+
+    def __init__(self, command: List[str], message: str):
+        super().__init__(f"Yabai command {command} failed: {message}")
+        self.command = command
+        self.message = message
+
+
+def check_response(command: List[str], response: bytes) -> bytes:
+    """The response, unless it's yabai's error text, which is raised as YabaiError."""
+    if response.startswith(FAILURE_MESSAGE):
+        message = response[len(FAILURE_MESSAGE) :].decode(errors="replace").strip()
+        raise YabaiError(command, message)
+    return response
+
+
+def command_verb(command: List[str]) -> str:
+    """The command and its first option ("window --space"), without the ids."""
+    option = next((c for c in command[1:] if c.startswith("--")), None)
+    return f"{command[0]} {option}" if option else command[0]
+
+
+@dataclass
+class CallResult:
+    command: List[str]
+    value: Any = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class YabaiBatch:
+    """
+    Sends independent yabai commands concurrently from synchronous code.
+
+    Every yabai message needs its own socket connection, so commands are handed to a
+    thread pool with at most max_in_flight connections open at once. Commands in a
+    batch must not depend on each other's side effects since yabai may receive them
+    in any order.
+
+    with yabai.batch() as batch:
+        for w in window_ids:
+            batch.call(["window", str(w), "--space", "2"])
+    results = batch.results()
+    """
+
+    def __init__(self, yabai: Yabai, max_in_flight: int = 10):
+        self.yabai = yabai
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._pending: list[tuple[List[str], Future]] = []
+
+    def call(self, command: List[str]) -> Future:
+        future = self._executor.submit(self.yabai.call, command, ignore_error=False)
+        self._pending.append((command, future))
+        return future
+
+    def results(self) -> List[CallResult]:
+        """Wait for every queued command and return their results in call order."""
+        results = []
+        for command, future in self._pending:
+            try:
+                results.append(CallResult(command, value=future.result()))
+            except Exception as e:
+                results.append(CallResult(command, error=e))
+        return results
+
+    def __enter__(self) -> YabaiBatch:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=exc is not None)
+
+
+class Queries(ABC):
+    """
+    Query helpers, built on the raw query methods subclasses provide: Yabai sends
+    every query, query_cache.QueryCache answers repeats from memory.
+
+    With fields (model attribute names), only those properties are requested and
+    results are parsing.partial_model instances holding just them. Helpers that
+    take a scope (space_idx, display_idx, window_id) ask yabai for just that slice
+    rather than filtering everything. Optional scopes are keyword-only.
+    """
+
+    @abstractmethod
+    def query_raw(self, cmd: List[str]) -> bytes:
+        pass
+
+    @abstractmethod
+    async def aquery_raw(self, cmd: List[str]) -> bytes:
+        pass
+
+    def query(self, model: type[_M], cmd: List[str], fields: Fields = None) -> List[_M]:
+        """Run a query command, parsing the response as a list of model."""
+        model, cmd = _project(model, cmd, fields)
+        return parse_many(model, check_response(cmd, self.query_raw(cmd)))
+
+    async def aquery(
+        self, model: type[_M], cmd: List[str], fields: Fields = None
+    ) -> List[_M]:
+        model, cmd = _project(model, cmd, fields)
+        return parse_many(model, check_response(cmd, await self.aquery_raw(cmd)))
+
+    def query_one(
+        self, model: type[_M], cmd: List[str], fields: Fields = None
+    ) -> _M | None:
+        """A single-entity query, or None if yabai doesn't know the entity."""
+        model, cmd = _project(model, cmd, fields)
+        resp = self.query_raw(cmd)
+        return parse_one(model, resp) if resp.startswith(b"{") else None
+
+    async def aquery_one(
+        self, model: type[_M], cmd: List[str], fields: Fields = None
+    ) -> _M | None:
+        model, cmd = _project(model, cmd, fields)
+        resp = await self.aquery_raw(cmd)
+        return parse_one(model, resp) if resp.startswith(b"{") else None
+
+    def displays(self, fields: Fields = None) -> List[Display]:
+        return self.query(Display, ["query", "--displays"], fields)
+
+    async def adisplays(self, fields: Fields = None) -> List[Display]:
+        return await self.aquery(Display, ["query", "--displays"], fields)
+
+    def display(self, display_idx: int, fields: Fields = None) -> Display | None:
+        return self.query_one(Display, _display(display_idx), fields)
+
+    async def adisplay(self, display_idx: int, fields: Fields = None) -> Display | None:
+        return await self.aquery_one(Display, _display(display_idx), fields)
+
+    def spaces(
+        self, fields: Fields = None, *, display_idx: int | None = None
+    ) -> List[Space]:
+        return self.query(Space, _spaces(display_idx), fields)
+
+    async def aspaces(
+        self, fields: Fields = None, *, display_idx: int | None = None
+    ) -> List[Space]:
+        return await self.aquery(Space, _spaces(display_idx), fields)
+
+    def space(self, space_idx: int, fields: Fields = None) -> Space | None:
+        return self.query_one(Space, _space(space_idx), fields)
+
+    async def aspace(self, space_idx: int, fields: Fields = None) -> Space | None:
+        return await self.aquery_one(Space, _space(space_idx), fields)
+
+    def windows(
+        self,
+        fields: Fields = None,
+        *,
+        space_idx: int | None = None,
+        display_idx: int | None = None,
+    ) -> List[Window]:
+        return self.query(Window, _windows(space_idx, display_idx), fields)
+
+    async def awindows(
+        self,
+        fields: Fields = None,
+        *,
+        space_idx: int | None = None,
+        display_idx: int | None = None,
+    ) -> List[Window]:
+        return await self.aquery(Window, _windows(space_idx, display_idx), fields)
+
+    def window(self, window_id: int, fields: Fields = None) -> Window | None:
+        """Query a single window, or None if yabai no longer knows about it."""
+        return self.query_one(Window, _window(window_id), fields)
+
+    async def awindow(self, window_id: int, fields: Fields = None) -> Window | None:
+        return await self.aquery_one(Window, _window(window_id), fields)
+
+    def signals(self) -> List[RegisteredSignal]:
+        return self.query(RegisteredSignal, ["signal", "--list"])
+
+    async def asignals(self) -> List[RegisteredSignal]:
+        return await self.aquery(RegisteredSignal, ["signal", "--list"])
+
+
+def _display(display_idx: int) -> List[str]:
+    return ["query", "--displays", "--display", str(display_idx)]
+
+
+def _spaces(display_idx: int | None) -> List[str]:
+    cmd = ["query", "--spaces"]
+    return cmd if display_idx is None else [*cmd, "--display", str(display_idx)]
+
+
+def _space(space_idx: int) -> List[str]:
+    return ["query", "--spaces", "--space", str(space_idx)]
+
+
+def _windows(space_idx: int | None, display_idx: int | None) -> List[str]:
+    if space_idx is not None and display_idx is not None:
+        raise ValueError("Windows can be scoped to a space or a display, not both")
+    cmd = ["query", "--windows"]
+    if space_idx is not None:
+        return [*cmd, "--space", str(space_idx)]
+    if display_idx is not None:
+        return [*cmd, "--display", str(display_idx)]
+    return cmd
+
+
+def _window(window_id: int) -> List[str]:
+    return ["query", "--windows", "--window", str(window_id)]
+
+
 # It would be cool to have an ABC and subclasses that use socket, subprocess and just delegate
 # to self.call, but the sync vs async is mega-annoying so I think we'd need both a SyncYabai and AsyncYabai
 # because the method signature is different, so instead just have one class that exposes async variants
 # of its methods. Could subclass this for socket vs subprocess.
-class Yabai:
-    def __init__(self, max_connections: int = 10):
+class Yabai(Queries):
+    def __init__(
+        self,
+        max_connections: int = 10,
+        socket_path: str | None = None,
+        observer: YabaiObserver | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_response_bytes: int = MAX_RESPONSE_BYTES,
+    ):
+        """
+        Talks to the yabai socket at socket_path, or $YWS_YABAI_SOCKET, or else the
+        first /tmp/yabai_*.socket. observer, if given, is told how long every
+        command took and how long async calls waited on the semaphore.
+
+        Commands raise TimeoutError if yabai hasn't answered within timeout seconds,
+        and framing.ResponseTooLarge if the answer exceeds max_response_bytes.
+        """
+        self.observer = observer
+        self.timeout = timeout
+        self.max_response_bytes = max_response_bytes
+        # Response buffers are reused between commands: one per thread for sync
+        # calls, which YabaiBatch makes from several threads, and a pool for async
+        # calls, which holds at most max_connections since the semaphore caps how
+        # many read at once
+        self._local = threading.local()
+        self._abuffers: list[ResponseBuffer] = []
+        # Not sure if this helps with too many open files errors in the web app
+        # because WindowTitleChanged events fire very often in apps like vs code.
+        self.sem = asyncio.Semaphore(max_connections)
+        if socket_path := socket_path or os.environ.get("YWS_YABAI_SOCKET"):
+            self.socket = socket_path
+            return
         try:
             self.socket, *_ = map(str, Path("/tmp").glob("yabai_*.socket"))
-            # Not sure if this helps with too many open files errors in the web app
-            # because WindowTitleChanged events fire very often in apps like vs code.
-            self.sem = asyncio.Semaphore(max_connections)
         except ValueError as e:
             raise RuntimeError(
                 f"No yabai socket found in /tmp. Is yabai running?"
             ) from e
 
-    def call(self, cmd: List[str]):
-        return self.using_socket(cmd)
+    def call(self, cmd: List[str], ignore_error: bool = True):
+        return self.using_socket(cmd, ignore_error=ignore_error)
+
+    def batch(self, max_in_flight: int = 10) -> YabaiBatch:
+        return YabaiBatch(self, max_in_flight)
+
+    def call_many(
+        self, commands: Sequence[List[str]], max_in_flight: int = 10
+    ) -> List[CallResult]:
+        """Run independent commands concurrently, returning results in input order."""
+        with self.batch(max_in_flight) as batch:
+            for cmd in commands:
+                batch.call(cmd)
+        return batch.results()
 
     async def acall(self, cmd: List[str]):
+        start = time.perf_counter()
         async with self.sem:
+            if self.observer:
+                self.observer.semaphore_waited(time.perf_counter() - start)
             return await self.ausing_socket(cmd)
 
+    def call_raw(self, cmd: List[str]) -> bytes:
+        """The undecoded response, for handing straight to parsing.parse_many."""
+        return self.using_socket_raw(cmd)
+
+    def query_raw(self, cmd: List[str]) -> bytes:
+        return self.call_raw(cmd)
+
+    async def aquery_raw(self, cmd: List[str]) -> bytes:
+        return await self.acall_raw(cmd)
+
+    async def acall_raw(self, cmd: List[str]) -> bytes:
+        start = time.perf_counter()
+        async with self.sem:
+            if self.observer:
+                self.observer.semaphore_waited(time.perf_counter() - start)
+            return await self.ausing_socket_raw(cmd)
+
     # TODO: opts to minimize vs close
     def clean_slate(self):
-        for s in self.spaces():
-            if len(s.label) > 0:
-                self.call(["space", f"{s.index}", "--label"])
-            self.call(["space", f"{s.index}", "--destroy"])
+        # Destroying a space shifts the index of every space after it, so label each
+        # space uniquely first and destroy by label, which lets all of them go at once.
+        # yabai refuses to destroy the last space on a display; those keep their
+        # temporary label until the final pass clears it.
+        spaces = self.spaces(fields=["id", "index"])
+        labels = [f"yws-clean-slate-{s.id}" for s in spaces]
+        self.call_many(
+            [["space", str(s.index), "--label", l] for s, l in zip(spaces, labels)]
+        )
+        destroyed = self.call_many([["space", l, "--destroy"] for l in labels])
+        self.call_many(
+            [["space", l, "--label"] for l, r in zip(labels, destroyed) if not r.ok]
+        )
         self.call(["display", "--focus", "1"])
 
     def balance(self, space_idx: int) -> None:
         self.call(["space", str(space_idx), "--balance"])
 
-    def displays(self) -> List[Display]:
-        return [Display.parse_obj(d) for d in self.call(["query", "--displays"])]
-
-    async def adisplays(self) -> List[Display]:
-        return [Display.parse_obj(d) for d in await self.acall(["query", "--displays"])]
-
-    def spaces(self) -> List[Space]:
-        return [Space.parse_obj(s) for s in self.call(["query", "--spaces"])]
-
-    async def aspaces(self) -> List[Space]:
-        return [Space.parse_obj(s) for s in await self.acall(["query", "--spaces"])]
-
-    def windows(self) -> List[Window]:
-        return [Window.parse_obj(w) for w in self.call(["query", "--windows"])]
-
-    async def awindows(self) -> List[Window]:
-        return [Window.parse_obj(w) for w in await self.acall(["query", "--windows"])]
-
     def create_space(self, display_idx: int | None = None):
         if display_idx is not None:
             self.call(["display", "--focus", str(display_idx)])
@@ -114,6 +417,8 @@ class Yabai:
         self.call(["window", str(window_id), "--insert", direction.value])
 
     def stack_windows(self, window_ids: List[int]) -> None:
+        # Stays sequential: the order windows are stacked in decides which one ends
+        # up on top, so these can't go through call_many.
         for w1, w2 in zip(window_ids[:-1], window_ids[1:]):
             self.call(["window", str(w1), "--stack", str(w2)])
 
@@ -121,39 +426,55 @@ class Yabai:
         self.call(["window", str(warp), "--warp", str(onto)])
 
     def using_socket(self, command: List[str], ignore_error: bool = True):
-        # Yabai message format: https://github.com/koekeishiya/yabai/issues/1372
-        # A byte array where the first 4 bytes are the length of the message
-        # that follows in big endian, then the message is sent with a NUL byte
-        # between terms, and two trailing NUL bytes.
-        command_bytes = ("\0".join(command) + "\0\0").encode()
-        sock_msg = struct.pack("<I", len(command_bytes)) + command_bytes
+        return self._decode(command, self.using_socket_raw(command), ignore_error)
+
+    def using_socket_raw(self, command: List[str]) -> bytes:
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
         with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
             sock.connect(self.socket)
-            sock.send(sock_msg)
+            sock.sendall(encode_command(command))
             sock.shutdown(socket.SHUT_WR)
-
-            resp: List[str] = []
-            while len(recv := str(sock.recv(4096), "utf-8")) > 0:
-                resp.append(recv)
-        if not resp:
-            return
-        try:
-            return json.loads("".join(resp))
-        except json.JSONDecodeError as e:
-            if not ignore_error:
-                raise RuntimeError(f"Yabai command {command} failed: {resp}") from e
-            pass
+            resp = self._buffer().recv(sock, deadline)
+        if self.observer:
+            self.observer.call_finished(
+                command_verb(command), time.perf_counter() - start
+            )
+        return resp
 
     async def ausing_socket(self, command: List[str], ignore_error: bool = True):
-        command_bytes = ("\0".join(command) + "\0\0").encode()
-        sock_msg = struct.pack("<I", len(command_bytes)) + command_bytes
-
-        reader, writer = await asyncio.open_unix_connection(path=self.socket)
-        writer.write(sock_msg)
-        await writer.drain()
-        resp = await reader.read(-1)
-        writer.close()
+        return self._decode(
+            command, await self.ausing_socket_raw(command), ignore_error
+        )
 
+    async def ausing_socket_raw(self, command: List[str]) -> bytes:
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        buffer = self._abuffers.pop() if self._abuffers else self._new_buffer()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                async with asyncio.timeout(self.timeout):
+                    await loop.sock_connect(sock, self.socket)
+                    await loop.sock_sendall(sock, encode_command(command))
+                    sock.shutdown(socket.SHUT_WR)
+                    resp = await buffer.arecv(sock)
+        finally:
+            self._abuffers.append(buffer)
+        if self.observer:
+            self.observer.call_finished(
+                command_verb(command), time.perf_counter() - start
+            )
+        return resp
+
+    def _decode(self, command: List[str], resp: bytes, ignore_error: bool):
+        try:
+            check_response(command, resp)
+        except YabaiError:
+            if not ignore_error:
+                raise
+            return
         if not resp:
             return
         try:
@@ -163,6 +484,14 @@ class Yabai:
                 raise RuntimeError(f"Yabai command {command} failed: {resp}") from e
             pass
 
+    def _buffer(self) -> ResponseBuffer:
+        if (buffer := getattr(self._local, "buffer", None)) is None:
+            buffer = self._local.buffer = self._new_buffer()
+        return buffer
+
+    def _new_buffer(self) -> ResponseBuffer:
+        return ResponseBuffer(max_size=self.max_response_bytes)
+
     def using_subprocess(self, command: List[str]):
         resp = subprocess.check_output(["/opt/homebrew/bin/yabai", "-m", *command])
         if not resp: